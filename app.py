@@ -1,6 +1,16 @@
 from app import create_app
+from app.health import warm_up as warm_up_app
 
 app = create_app("development")
 
+
+def warm_up(event=None, context=None):
+    """
+    Scheduled Lambda event (see "events" in zappa_settings.json): keeps the
+    container warm like keep_warm, and also opens the database connections,
+    so the next real request doesn't pay for them.
+    """
+    return warm_up_app(app)
+
 if __name__ == "__main__":
     app.run(debug=True)
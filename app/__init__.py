@@ -3,23 +3,39 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 from .config import config
+from .routing import RoutingSession, init_replica_router
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
-def create_app(config_name="default"):
+def create_app(config_name="default", config_overrides=None):
     app = Flask(__name__)
 
     # Load default configuration
     app.config.from_object(config[config_name])
 
+    # Allow callers (tests, benchmarks) to point the app at another database
+    if config_overrides:
+        app.config.update(config_overrides)
+
     db.init_app(app)
+    init_replica_router(app)
+
+    from .columnar import init_columnar_store
+    from .singleflight import init_single_flight
+
+    init_columnar_store(app)
+    init_single_flight(app)
     migrate = Migrate(app, db)
 
     from .routes import bp
 
     app.register_blueprint(bp)
 
+    from .commands import register_commands
+
+    register_commands(app)
+
     CORS(app)
 
     return app
@@ -0,0 +1,140 @@
+import logging
+import time
+
+from sqlalchemy import delete, func, insert, select, tuple_
+
+from app import db
+from app.models import AdGroup, AdGroupStats, StatsDailyRollup
+from app.prefix_sums import (
+    fresh_watermark_steps,
+    lock_watermark,
+    refresh_prefix_sums,
+    set_watermark,
+    stats_to_refresh,
+)
+from app.steps import run_steps
+
+logger = logging.getLogger(__name__)
+
+DAILY_ROLLUP = "daily_rollup"
+
+ROLLUP_COLUMNS = [
+    "date",
+    "ad_group_id",
+    "campaign_id",
+    "row_count",
+    "cost_micros",
+    "clicks",
+    "conversions",
+    "impressions",
+    "cost_per_click_sum",
+    "cost_per_click_count",
+    "cost_per_conversion_sum",
+    "cost_per_conversion_count",
+]
+
+
+def daily_rollup_statement(keys=None):
+    """
+    ad_group_stats summed per (date, ad_group_id), in ROLLUP_COLUMNS order;
+    only for the keys selected by ``keys`` (a select of date, ad_group_id).
+    """
+    cost_per_click = AdGroupStats.cost / func.nullif(AdGroupStats.clicks, 0)
+    cost_per_conversion = AdGroupStats.cost / func.nullif(AdGroupStats.conversions, 0)
+    query = (
+        select(
+            AdGroupStats.date,
+            AdGroupStats.ad_group_id,
+            AdGroup.campaign_id,
+            func.count(),
+            func.sum(AdGroupStats.cost_micros),
+            func.sum(AdGroupStats.clicks),
+            func.sum(AdGroupStats.conversions),
+            func.sum(AdGroupStats.impressions),
+            func.coalesce(func.sum(cost_per_click), 0),
+            func.count(cost_per_click),
+            func.coalesce(func.sum(cost_per_conversion), 0),
+            func.count(cost_per_conversion),
+        )
+        .join(AdGroup)
+        .group_by(AdGroupStats.date, AdGroupStats.ad_group_id, AdGroup.campaign_id)
+    )
+    if keys is not None:
+        query = query.where(
+            tuple_(AdGroupStats.date, AdGroupStats.ad_group_id).in_(keys)
+        )
+    return query
+
+
+def refresh_daily_rollup(full=False):
+    """
+    Bring stats_daily_rollup up to date with ad_group_stats and commit.
+
+    Only the (date, ad_group_id) keys that have rows above the watermark are
+    deleted and summed again, so the cost follows the number of new rows, not
+    the size of the table. As with the prefix sums, rows updated or deleted in
+    place need ``full=True``. Returns the number of rollup rows written.
+    """
+    watermark = lock_watermark(DAILY_ROLLUP)
+    latest_id, window_rows, after = stats_to_refresh(None if full else watermark)
+
+    if after is None:
+        keys = None
+        db.session.execute(delete(StatsDailyRollup))
+    elif after >= latest_id:
+        db.session.commit()
+        return 0
+    else:
+        keys = (
+            select(AdGroupStats.date, AdGroupStats.ad_group_id)
+            .where(AdGroupStats.id > after, AdGroupStats.id <= latest_id)
+            .distinct()
+        )
+        db.session.execute(
+            delete(StatsDailyRollup).where(
+                tuple_(StatsDailyRollup.date, StatsDailyRollup.ad_group_id).in_(keys)
+            )
+        )
+
+    written = db.session.execute(
+        insert(StatsDailyRollup).from_select(
+            ROLLUP_COLUMNS, daily_rollup_statement(keys)
+        )
+    ).rowcount
+    set_watermark(DAILY_ROLLUP, latest_id, window_rows)
+    db.session.commit()
+
+    logger.info(f"Refreshed {written} daily rollup rows up to stats id {latest_id}")
+    return written
+
+
+def daily_rollup_fresh():
+    """True when stats_daily_rollup includes every ad_group_stats row."""
+    return run_steps(fresh_watermark_steps(DAILY_ROLLUP)) is not None
+
+
+# Derived tables of ad_group_stats, each with its own watermark, in the order
+# they are refreshed
+AGGREGATES = {
+    "prefix_sums": refresh_prefix_sums,
+    DAILY_ROLLUP: refresh_daily_rollup,
+}
+
+
+def refresh_aggregates(names=None, full=False):
+    """
+    Refresh the derived aggregates (all of them, or ``names``) and return
+    {name: (rows written, seconds)}.
+    """
+    unknown = set(names or ()) - set(AGGREGATES)
+    if unknown:
+        raise ValueError(f"Unknown aggregates: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name, refresh in AGGREGATES.items():
+        if names and name not in names:
+            continue
+        started = time.perf_counter()
+        written = refresh(full=full)
+        results[name] = (written, time.perf_counter() - started)
+    return results
@@ -0,0 +1,242 @@
+import logging
+from datetime import timedelta
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import Date, Integer, cast, func, literal, select
+
+from app import db
+from app.aggregates import DAILY_ROLLUP
+from app.models import AdGroup, AdGroupStats, StatsDailyRollup
+from app.models.ad_group_stats import MICROS
+from app.prefix_sums import fresh_watermark_steps
+from app.steps import Query, run_steps
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_METRICS = ["cost", "cpa"]
+ANOMALY_METHODS = ["robust", "ewma"]
+# Scale that makes the MAD comparable to a standard deviation
+MAD_SCALE = 0.6745
+# Days with data an ad group needs before its days can be scored
+MIN_DAYS = 7
+
+
+def day_offset(column, start, dialect_name):
+    """Days from ``start`` to a date column, as an integer computed in the db."""
+    if dialect_name == "sqlite":
+        return cast(func.julianday(column) - func.julianday(start), Integer)
+    return cast(column - literal(start, Date), Integer)
+
+
+def daily_statement(start, end, dialect_name, campaign_id=None, rollup=False):
+    """
+    Ad group id, campaign id, day (offset from ``start``), cost (micros) and
+    conversions per ad group and day between two dates, in one pass: from the
+    daily rollup with ``rollup`` (pass whether it is fresh), else from
+    ad_group_stats. Days come as integers so no dates need to be parsed.
+    """
+    if rollup:
+        query = select(
+            StatsDailyRollup.ad_group_id,
+            StatsDailyRollup.campaign_id,
+            day_offset(StatsDailyRollup.date, start, dialect_name),
+            StatsDailyRollup.cost_micros,
+            StatsDailyRollup.conversions,
+        ).where(StatsDailyRollup.date >= start, StatsDailyRollup.date <= end)
+        if campaign_id is not None:
+            query = query.where(StatsDailyRollup.campaign_id == campaign_id)
+        return query
+
+    query = (
+        select(
+            AdGroupStats.ad_group_id,
+            AdGroup.campaign_id,
+            day_offset(AdGroupStats.date, start, dialect_name),
+            func.sum(AdGroupStats.cost_micros),
+            func.sum(AdGroupStats.conversions),
+        )
+        .join(AdGroup)
+        .where(AdGroupStats.date >= start, AdGroupStats.date <= end)
+        .group_by(AdGroupStats.ad_group_id, AdGroup.campaign_id, AdGroupStats.date)
+    )
+    if campaign_id is not None:
+        query = query.where(AdGroup.campaign_id == campaign_id)
+    return query
+
+
+def daily_matrices(rows, days):
+    """
+    daily_statement() rows -> (ad group ids, their campaign ids, {metric: a
+    float matrix of one row per ad group and one column per day}). Days
+    without rows are NaN, as is the CPA of days without conversions.
+    """
+    if not rows:
+        empty = np.empty((0, days))
+        none = np.empty(0, np.int64)
+        return none, none, {"cost": empty, "cpa": empty}
+
+    # One flat float array straight from the row tuples, much faster than
+    # building an array per column (ids and micros stay exact below 2**53)
+    values = np.fromiter(
+        chain.from_iterable(rows), dtype=np.float64, count=5 * len(rows)
+    ).reshape(-1, 5)
+    ids, first, group = np.unique(
+        values[:, 0].astype(np.int64), return_index=True, return_inverse=True
+    )
+    campaigns = values[first, 1].astype(np.int64)
+    day = values[:, 2].astype(np.int64)
+
+    cost = np.full((len(ids), days), np.nan)
+    cost[group, day] = values[:, 3] / MICROS
+    converted = np.full((len(ids), days), np.nan)
+    converted[group, day] = values[:, 4]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cpa = np.where(converted > 0, cost / converted, np.nan)
+    return ids, campaigns, {"cost": cost, "cpa": cpa}
+
+
+def robust_scores(values):
+    """
+    Robust z-scores of every row against its own median: 0.6745 * (x -
+    median) / MAD. Rows with fewer than MIN_DAYS values, or no spread at all,
+    get NaN. Returns (scores, baselines), both shaped like ``values``.
+    """
+    observed = np.sum(~np.isnan(values), axis=1)
+    usable = observed >= MIN_DAYS
+    scores = np.full(values.shape, np.nan)
+    baselines = np.full(values.shape, np.nan)
+    if not usable.any():
+        return scores, baselines
+
+    rows = values[usable]
+    median = np.nanmedian(rows, axis=1, keepdims=True)
+    mad = np.nanmedian(np.abs(rows - median), axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores[usable] = np.where(
+            mad > 0, MAD_SCALE * (rows - median) / mad, np.nan
+        )
+    baselines[usable] = np.broadcast_to(median, rows.shape)
+    return scores, baselines
+
+
+def ewma_scores(values, span=14):
+    """
+    EWMA residuals of every row: each day against the exponentially weighted
+    mean and standard deviation of the days before it (alpha = 2 / (span +
+    1)), updated for all rows at once one day at a time. Days are only scored
+    once their row had MIN_DAYS values. Returns (scores, baselines).
+    """
+    alpha = 2 / (span + 1)
+    count, days = values.shape
+    mean = np.full(count, np.nan)
+    variance = np.zeros(count)
+    seen = np.zeros(count, dtype=np.int64)
+    scores = np.full(values.shape, np.nan)
+    baselines = np.full(values.shape, np.nan)
+
+    for day in range(days):
+        x = values[:, day]
+        observed = ~np.isnan(x)
+        deviation = x - mean
+        std = np.sqrt(variance)
+        ready = observed & (seen >= MIN_DAYS) & (std > 0)
+        scores[ready, day] = deviation[ready] / std[ready]
+        baselines[ready, day] = mean[ready]
+
+        first = observed & (seen == 0)
+        mean[first] = x[first]
+        update = observed & ~first
+        increment = alpha * deviation[update]
+        mean[update] += increment
+        variance[update] = (1 - alpha) * (
+            variance[update] + deviation[update] * increment
+        )
+        seen[observed] += 1
+
+    return scores, baselines
+
+
+def detect_anomalies(
+    start,
+    end,
+    metrics=ANOMALY_METRICS,
+    method="robust",
+    threshold=3.5,
+    campaign_id=None,
+    limit=None,
+):
+    """
+    Days between two dates on which an ad group's daily cost or CPA is
+    ``threshold`` or more robust z-scores (or EWMA residual standard
+    deviations) away from its own baseline, most anomalous first.
+
+    Returns (number of ad groups scored, number flagged, the flagged days as
+    dicts, at most ``limit`` of them).
+    """
+    return run_steps(
+        detect_anomalies_steps(
+            start,
+            end,
+            db.engine.dialect.name,
+            metrics=metrics,
+            method=method,
+            threshold=threshold,
+            campaign_id=campaign_id,
+            limit=limit,
+        )
+    )
+
+
+def detect_anomalies_steps(
+    start,
+    end,
+    dialect_name,
+    metrics=ANOMALY_METRICS,
+    method="robust",
+    threshold=3.5,
+    campaign_id=None,
+    limit=None,
+):
+    """detect_anomalies() as steps (see app.steps)."""
+    days = (end - start).days + 1
+    rollup = yield from fresh_watermark_steps(DAILY_ROLLUP)
+    statement = daily_statement(
+        start, end, dialect_name, campaign_id, rollup=rollup is not None
+    )
+    rows = yield Query(statement, core=True)
+    ids, campaigns, matrices = daily_matrices(rows, days)
+
+    flagged = []
+    for metric in metrics:
+        values = matrices[metric]
+        if method == "ewma":
+            scores, baselines = ewma_scores(values)
+        else:
+            scores, baselines = robust_scores(values)
+        with np.errstate(invalid="ignore"):
+            group, day = np.nonzero(np.abs(scores) >= threshold)
+        for g, d, value, baseline, score in zip(
+            group.tolist(),
+            day.tolist(),
+            values[group, day].tolist(),
+            baselines[group, day].tolist(),
+            scores[group, day].tolist(),
+        ):
+            flagged.append(
+                {
+                    "ad_group_id": int(ids[g]),
+                    "campaign_id": int(campaigns[g]),
+                    "date": (start + timedelta(days=d)).isoformat(),
+                    "metric": metric,
+                    "value": round(value, 2),
+                    "baseline": round(baseline, 2),
+                    "score": round(score, 2),
+                }
+            )
+
+    flagged.sort(key=lambda item: -abs(item["score"]))
+    logger.info(
+        f"Scored {len(ids)} ad groups over {days} days: {len(flagged)} anomalies."
+    )
+    return len(ids), len(flagged), flagged[:limit]
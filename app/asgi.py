@@ -0,0 +1,398 @@
+import asyncio
+import io
+import json
+import logging
+import time
+from collections import namedtuple
+from urllib.parse import parse_qsl
+
+from sqlalchemy import make_url, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException, MethodNotAllowed
+from werkzeug.formparser import parse_form_data
+from werkzeug.http import dump_options_header
+from werkzeug.utils import get_content_type
+
+from app import create_app
+from app.health import pool_stats
+from app.services import (
+    Reply,
+    ServiceError,
+    anomalies_steps,
+    bulk_rename_steps,
+    campaigns_steps,
+    comparison_steps,
+    create_import_steps,
+    database_json_enabled,
+    import_job_steps,
+    import_rejects_steps,
+    parse_anomaly_params,
+    parse_compare_params,
+    parse_ranking_params,
+    parse_search_params,
+    parse_time_series_params,
+    rankings_steps,
+    rename_steps,
+    save_upload,
+    search_steps,
+    test_app_steps,
+    time_series_steps,
+)
+from app.singleflight import AsyncSingleFlight
+from app.steps import fetch
+
+logger = logging.getLogger(__name__)
+
+# Sync driver -> async driver used by the ASGI mode
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+# What an ASGI view gets: the query string, the raw body, the request headers
+# (lower-case names) and the arguments of the matched route
+AsgiRequest = namedtuple("AsgiRequest", ["args", "body", "headers", "view_args"])
+
+
+def async_database_url(url):
+    """Swap the sync DBAPI of a database URL for its asyncio counterpart."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver configured for '{backend}' databases.")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+async def execute(session, query):
+    """Run a Query (see app.steps) on an AsyncSession."""
+    if query.core:
+        connection = await session.connection()
+        return fetch(await connection.execute(query.statement), query.fetch)
+    return fetch(await session.execute(query.statement), query.fetch)
+
+
+def json_payload(body):
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+def uploaded_files(request):
+    """The files of a multipart/form-data body, as request.files in Flask."""
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "CONTENT_TYPE": request.headers.get("content-type", ""),
+        "CONTENT_LENGTH": str(len(request.body)),
+        "wsgi.input": io.BytesIO(request.body),
+    }
+    return parse_form_data(environ)[2]
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class AsgiApp:
+    """
+    Minimal ASGI application serving the same routes as the Flask blueprint.
+
+    Routes are matched on the Flask app's own url_map, and every endpoint's
+    logic is the step function its Flask view runs (the *_steps in
+    app.services); only the database round trips differ, running on
+    SQLAlchemy's async engine so a worker is not held while a query is in
+    flight. The columnar engine and read replicas are Flask-only.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.engine = create_async_engine(
+            async_database_url(flask_app.config["SQLALCHEMY_DATABASE_URI"]),
+            **flask_app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+        )
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.single_flight = None
+        if flask_app.config.get("SINGLE_FLIGHT"):
+            self.single_flight = AsyncSingleFlight(
+                wait_timeout=flask_app.config.get("SINGLE_FLIGHT_WAIT_SECONDS", 30)
+            )
+        self.url_adapter = flask_app.url_map.bind("localhost")
+        self.views = {
+            "main.health_main": self.health,
+            "main.ready_main": self.ready,
+            "main.test_app_main": self.test_app,
+            "main.get_campaigns_main": self.get_campaigns,
+            "main.update_campaign_name_main": self.update_campaign_name,
+            "main.bulk_update_campaign_names_main": self.bulk_update_campaign_names,
+            "main.performance_time_series_main": self.performance_time_series,
+            "main.compare_performance_main": self.compare_performance,
+            "main.search_main": self.search,
+            "main.rankings_main": self.rankings,
+            "main.anomalies_main": self.anomalies,
+            "main.create_import_job_main": self.create_import_job,
+            "main.get_import_job_main": self.get_import_job,
+            "main.get_import_job_rejects_main": self.get_import_job_rejects,
+        }
+        # A route added to the blueprint must get its ASGI view too
+        missing = {
+            rule.endpoint
+            for rule in flask_app.url_map.iter_rules()
+            if rule.endpoint.startswith("main.")
+        } - set(self.views)
+        if missing:
+            raise RuntimeError(f"No ASGI view for {', '.join(sorted(missing))}.")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        try:
+            endpoint, view_args = self.url_adapter.match(scope["path"], scope["method"])
+            view = self.views[endpoint]
+        except MethodNotAllowed:
+            await self._respond(send, Reply({"error": "Method not allowed."}, 405))
+            return
+        except (HTTPException, KeyError):
+            await self._respond(send, Reply({"error": "Not found."}, 404))
+            return
+
+        request = AsgiRequest(
+            MultiDict(
+                parse_qsl(
+                    scope["query_string"].decode("latin-1"), keep_blank_values=True
+                )
+            ),
+            await self._read_body(receive),
+            {
+                name.decode("latin-1"): value.decode("latin-1")
+                for name, value in scope.get("headers", [])
+            },
+            view_args,
+        )
+
+        async with self.session_factory() as session:
+            try:
+                reply = await view(session, request)
+            except ServiceError as e:
+                reply = Reply(e.to_body(), e.status)
+            except SQLAlchemyError as e:
+                logger.error(f"Database error in {scope['path']}: {e}")
+                await session.rollback()
+                reply = Reply({"error": "Database error occurred."}, 500)
+            except Exception as e:
+                logger.exception(f"Unexpected error in {scope['path']}: {e}")
+                await session.rollback()
+                reply = Reply({"error": "An unexpected error occurred."}, 500)
+
+        await self._respond(send, reply)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_body(self, receive):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    async def _respond(self, send, reply):
+        if reply.kind == "file":
+            download = reply.body
+            content = await asyncio.to_thread(read_file, download.path)
+            headers = {
+                "content-type": get_content_type(download.mimetype, "utf-8"),
+                "content-disposition": dump_options_header(
+                    "attachment", {"filename": download.download_name}
+                ),
+            }
+        else:
+            # JSON text from the db as is, else the same JSON provider as
+            # jsonify(), so both modes encode identically
+            if reply.kind == "json_text":
+                content = (reply.body + "\n").encode()
+            else:
+                content = (self.flask_app.json.dumps(reply.body) + "\n").encode()
+            headers = {"content-type": "application/json"}
+        headers["content-length"] = str(len(content))
+        headers["access-control-allow-origin"] = "*"
+        for name, value in (reply.headers or {}).items():
+            headers[name.lower()] = value
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": reply.status,
+                "headers": [
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in headers.items()
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": content})
+
+    async def run_steps(self, session, steps):
+        """
+        The async counterpart of app.steps.run_steps(): a list of Queries runs
+        concurrently, each on a session of its own, and every one is waited
+        for before the first error, if any, is raised.
+        """
+        result = None
+        while True:
+            try:
+                query = steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            if isinstance(query, list):
+                result = await asyncio.gather(
+                    *(self._execute_alone(q) for q in query), return_exceptions=True
+                )
+                for outcome in result:
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+            else:
+                result = await execute(session, query)
+
+    async def _execute_alone(self, query):
+        async with self.session_factory() as session:
+            return await execute(session, query)
+
+    async def _run_alone(self, steps):
+        async with self.session_factory() as session:
+            return await self.run_steps(session, steps)
+
+    async def coalesce(self, key, steps):
+        """
+        Run read-only steps on a session of their own, shared like
+        app.singleflight.coalesce() with concurrent requests for the same key.
+        """
+        if self.single_flight is None:
+            return await self._run_alone(steps)
+        return await self.single_flight.do(key, self._run_alone, steps)
+
+    async def commit_reply(self, session, reply):
+        if reply.status < 400:
+            await session.commit()
+        else:
+            await session.rollback()
+
+    async def health(self, session, request):
+        return Reply({"status": "ok"})
+
+    async def ready(self, session, request):
+        started = time.perf_counter()
+        try:
+            await session.execute(text("SELECT 1"))
+        except SQLAlchemyError as e:
+            logger.error(f"Readiness check failed: {e}")
+            return Reply(
+                {"status": "unavailable", "error": "Database unavailable."}, 503
+            )
+        latency_ms = (time.perf_counter() - started) * 1000
+        return Reply(
+            {
+                "status": "ready",
+                "database": {
+                    "latency_ms": round(latency_ms, 2),
+                    "pool": pool_stats(self.engine.sync_engine),
+                },
+                "replicas": {},
+            }
+        )
+
+    async def test_app(self, session, request):
+        return await self.run_steps(session, test_app_steps())
+
+    async def get_campaigns(self, session, request):
+        database_json = database_json_enabled(
+            self.flask_app.config, self.engine.dialect.name
+        )
+        return await self.run_steps(session, campaigns_steps(database_json))
+
+    async def update_campaign_name(self, session, request):
+        reply = await self.run_steps(session, rename_steps(json_payload(request.body)))
+        await self.commit_reply(session, reply)
+        return reply
+
+    async def bulk_update_campaign_names(self, session, request):
+        steps = bulk_rename_steps(
+            json_payload(request.body), self.flask_app.config["BULK_RENAME_MAX_ITEMS"]
+        )
+        reply = await self.run_steps(session, steps)
+        await self.commit_reply(session, reply)
+        return reply
+
+    async def performance_time_series(self, session, request):
+        params = parse_time_series_params(request.args)
+        config = self.flask_app.config
+        steps = time_series_steps(
+            params,
+            self.engine.dialect.name,
+            self.flask_app.extensions,
+            config.get("TIME_SERIES_SCAN_BUDGET_ROWS"),
+            database_json_enabled(config, self.engine.dialect.name),
+        )
+        return await self.coalesce(("time_series", params), steps)
+
+    async def compare_performance(self, session, request):
+        params = parse_compare_params(request.args)
+        return await self.coalesce(("comparison", params), comparison_steps(params))
+
+    async def search(self, session, request):
+        params = parse_search_params(request.args)
+        return await self.run_steps(
+            session, search_steps(params, self.engine.dialect.name)
+        )
+
+    async def rankings(self, session, request):
+        params = parse_ranking_params(request.args)
+        return await self.coalesce(("rankings", params), rankings_steps(params))
+
+    async def anomalies(self, session, request):
+        max_days = self.flask_app.config.get("ANOMALY_MAX_DAYS", 0)
+        params = parse_anomaly_params(request.args, max_days)
+        return await self.coalesce(
+            ("anomalies", params),
+            anomalies_steps(params, self.engine.dialect.name, max_days),
+        )
+
+    async def create_import_job(self, session, request):
+        filename, path = await asyncio.to_thread(
+            save_upload,
+            uploaded_files(request).get("file"),
+            self.flask_app.config["IMPORT_UPLOAD_DIR"],
+        )
+        reply = await self.run_steps(session, create_import_steps(filename, path))
+        await session.commit()
+        return reply
+
+    async def get_import_job(self, session, request):
+        job_id = request.view_args["job_id"]
+        return await self.run_steps(session, import_job_steps(job_id))
+
+    async def get_import_job_rejects(self, session, request):
+        job_id = request.view_args["job_id"]
+        return await self.run_steps(session, import_rejects_steps(job_id))
+
+
+def create_asgi_app(config_name="default", config_overrides=None):
+    """
+    ASGI counterpart of create_app(). Needs the packages of
+    requirements-async.txt: an async driver, asyncpg (PostgreSQL) or
+    aiosqlite (SQLite), plus an ASGI server such as uvicorn.
+    """
+    return AsgiApp(create_app(config_name, config_overrides))
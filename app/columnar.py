@@ -0,0 +1,562 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import AdGroup, AdGroupStats
+from app.models.ad_group_stats import MICROS
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+LOAD_CHUNK_ROWS = 100_000
+
+# Column name -> dtype of the in-memory arrays. "day" is days since 1970-01-01,
+# "campaign_id" is resolved from the ad group when a row is loaded.
+COLUMNS = {
+    "day": np.int32,
+    "ad_group_id": np.int64,
+    "campaign_id": np.int64,
+    "device_id": np.int16,
+    "impressions": np.int64,
+    "clicks": np.int64,
+    "conversions": np.float64,
+    "cost_micros": np.int64,
+}
+
+# Summed time series metric -> (column, scale) for the rolling windows and lags
+WINDOW_SOURCES = {
+    "total_cost": ("cost_micros", MICROS),
+    "total_clicks": ("clicks", 1),
+    "total_conversions": ("conversions", 1),
+    "total_impressions": ("impressions", 1),
+}
+
+# Same fields as a row of services.time_series_statement(), so both paths share
+# services.format_time_series()
+TimeSeriesRow = namedtuple(
+    "TimeSeriesRow",
+    [
+        "period",
+        "total_cost",
+        "total_clicks",
+        "total_conversions",
+        "total_impressions",
+        "avg_cost_per_click",
+        "avg_cost_per_conversion",
+        "avg_click_through_rate",
+        "avg_conversion_rate",
+    ],
+)
+
+
+def init_columnar_store(app):
+    """Attach a ColumnarStore to the app when COLUMNAR_ENGINE is enabled."""
+    if app.config.get("COLUMNAR_ENGINE"):
+        app.extensions["columnar_store"] = ColumnarStore(
+            snapshot_path=app.config.get("COLUMNAR_SNAPSHOT_PATH"),
+            refresh_interval=app.config.get("COLUMNAR_REFRESH_INTERVAL", 60),
+        )
+
+
+def get_columnar_store():
+    """The current app's ColumnarStore, or None when the engine is disabled."""
+    return current_app.extensions.get("columnar_store")
+
+
+def day_numbers(values):
+    """Dates (or datetimes) -> int32 days since 1970-01-01."""
+    return np.array(values, dtype="datetime64[D]").astype(np.int64).astype(np.int32)
+
+
+def period_keys(days, aggregate_by):
+    """
+    Bucket day numbers like services.period_expression(): the day itself,
+    the Monday of its week, or the first of its month or quarter.
+    """
+    days = days.astype(np.int64)
+    if aggregate_by == "week":
+        # 1970-01-01 was a Thursday, i.e. weekday 3 counting from Monday
+        return days - (days + 3) % 7
+    if aggregate_by in ("month", "quarter"):
+        months = days.astype("datetime64[D]").astype("datetime64[M]")
+        if aggregate_by == "quarter":
+            # Month numbers since 1970-01, which starts a quarter
+            months = months - months.astype(np.int64) % 3
+        return months.astype("datetime64[D]").astype(np.int64)
+    return days
+
+
+def period_numbers(keys, aggregate_by):
+    """
+    period_keys() -> consecutive integers for consecutive periods, like
+    services.period_number_expression().
+    """
+    if aggregate_by == "week":
+        return (keys + 3) // 7
+    if aggregate_by in ("month", "quarter"):
+        months = keys.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        return months // 3 if aggregate_by == "quarter" else months
+    return keys
+
+
+# period_numbers() counts months and quarters from 1970, the SQL expression
+# from year 0
+SQL_PERIOD_OFFSETS = {"month": 1970 * 12, "quarter": 1970 * 4}
+
+
+def group_mean(inverse, values, valid, size):
+    """Per-group average of ``values`` where ``valid``, None for empty groups."""
+    sums = np.bincount(inverse[valid], weights=values[valid], minlength=size)
+    counts = np.bincount(inverse[valid], minlength=size)
+    return [s / c if c else None for s, c in zip(sums.tolist(), counts.tolist())]
+
+
+def ratio(numerators, denominators):
+    return [
+        n / d if d else None for n, d in zip(numerators.tolist(), denominators.tolist())
+    ]
+
+
+class TailBuffer:
+    """
+    Column arrays with spare capacity for the rows appended after a frame's
+    base, filled up to ``rows``.
+    """
+
+    def __init__(self, capacity):
+        self.arrays = {
+            name: np.empty(capacity, dtype) for name, dtype in COLUMNS.items()
+        }
+        self.rows = 0
+
+    @property
+    def capacity(self):
+        return len(self.arrays["day"])
+
+
+class ColumnarFrame:
+    """
+    One immutable version of the loaded data: the base column arrays (what a
+    snapshot was mapped from, or empty), the rows added since in a tail buffer,
+    and the highest AdGroupStats.id included (the watermark for incremental
+    refreshes).
+    """
+
+    def __init__(self, base, watermark, tail=None, tail_rows=0):
+        self.base = base
+        self.watermark = watermark
+        self.tail = tail
+        self.tail_rows = tail_rows
+
+    @classmethod
+    def empty(cls):
+        base = {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+        return cls(base, 0)
+
+    def __len__(self):
+        return len(self.base["day"]) + self.tail_rows
+
+    @property
+    def segments(self):
+        """The base arrays, then this frame's part of the tail buffer."""
+        segments = [self.base]
+        if self.tail_rows:
+            segments.append(
+                {name: self.tail.arrays[name][: self.tail_rows] for name in COLUMNS}
+            )
+        return segments
+
+    def column(self, name):
+        """One column as a single array (a copy when there is a tail)."""
+        parts = [segment[name] for segment in self.segments]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def append(self, chunk, watermark):
+        """
+        A new frame with the rows of ``chunk`` added. The base is never copied
+        (it may be a memory-mapped snapshot); rows are written after this
+        frame's tail rows, in place while the buffer has room and nobody else
+        appended to it, else into a new buffer of twice the capacity, so
+        appending stays linear overall. Frames sharing a buffer each only see
+        their own prefix of it.
+        """
+        added = len(chunk["day"])
+        tail, rows = self.tail, self.tail_rows
+        needed = rows + added
+        if tail is None or tail.rows != rows or tail.capacity < needed:
+            capacity = max(needed, 2 * (tail.capacity if tail is not None else 0))
+            grown = TailBuffer(capacity)
+            for name in COLUMNS:
+                if rows:
+                    grown.arrays[name][:rows] = tail.arrays[name][:rows]
+            tail = grown
+        for name in COLUMNS:
+            tail.arrays[name][rows:needed] = chunk[name]
+        tail.rows = needed
+        return ColumnarFrame(self.base, watermark, tail, needed)
+
+
+class ColumnarStore:
+    """
+    In-process, column-oriented copy of ad_group_stats for time-series queries.
+
+    Rows are loaded once and then refreshed incrementally: a refresh only reads
+    rows with an id above the watermark, so rows updated or deleted in place
+    are not picked up until reload(). Refreshes happen at most every
+    ``refresh_interval`` seconds, triggered by the next query. When
+    ``snapshot_path`` holds a snapshot (see save_snapshot()), it is
+    memory-mapped instead of reading the whole table, then refreshed from the
+    database as usual.
+
+    Readers take a reference to the current ColumnarFrame, which is never
+    mutated; refreshes build a new one and swap it in.
+    """
+
+    def __init__(self, snapshot_path=None, refresh_interval=60):
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self.frame = None
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+
+    def _stale(self):
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at >= self.refresh_interval
+        )
+
+    def ensure_fresh(self):
+        """The current frame, loading or refreshing it first when due."""
+        if not self._stale():
+            return self.frame
+        with self._lock:
+            if self.frame is None:
+                snapshot = self.snapshot_path
+                if snapshot and os.path.exists(self._meta_path(snapshot)):
+                    self.frame = self.load_snapshot(snapshot)
+                if self.frame is None:
+                    self.frame = ColumnarFrame.empty()
+            if self._stale():
+                self._refresh_locked()
+        return self.frame
+
+    def refresh(self):
+        """Append AdGroupStats rows added since the last load, returning their count."""
+        with self._lock:
+            if self.frame is None:
+                self.frame = ColumnarFrame.empty()
+            return self._refresh_locked()
+
+    def reload(self):
+        """Drop everything loaded and read the whole table again."""
+        with self._lock:
+            self.frame = ColumnarFrame.empty()
+            return self._refresh_locked()
+
+    def _refresh_locked(self):
+        frame = self.frame
+        chunks = []
+        watermark = frame.watermark
+        for chunk, watermark in self._read_rows(frame.watermark):
+            chunks.append(chunk)
+        added = sum(len(chunk["day"]) for chunk in chunks)
+        if added:
+            # Concatenated once, not once per chunk
+            rows = {name: np.concatenate([c[name] for c in chunks]) for name in COLUMNS}
+            frame = frame.append(rows, watermark)
+            logger.info(f"Columnar store loaded {added} rows ({len(frame)} total).")
+        self.frame = frame
+        self.refreshed_at = time.monotonic()
+        return added
+
+    def _read_rows(self, watermark):
+        # The campaign comes with each row, so ad groups created while the
+        # rows stream in are covered too
+        result = db.session.execute(
+            select(
+                AdGroupStats.id,
+                AdGroupStats.date,
+                AdGroupStats.ad_group_id,
+                AdGroup.campaign_id,
+                AdGroupStats.device_id,
+                AdGroupStats.impressions,
+                AdGroupStats.clicks,
+                AdGroupStats.conversions,
+                AdGroupStats.cost_micros,
+            )
+            .join(AdGroup)
+            .where(AdGroupStats.id > watermark)
+            .order_by(AdGroupStats.id)
+            .execution_options(stream_results=True, yield_per=LOAD_CHUNK_ROWS)
+        )
+        for rows in result.partitions():
+            (
+                ids,
+                dates,
+                ad_group_ids,
+                campaign_ids,
+                device_ids,
+                impressions,
+                clicks,
+                conversions,
+                cost_micros,
+            ) = zip(*rows)
+            chunk = {
+                "day": day_numbers(dates),
+                "ad_group_id": np.array(ad_group_ids, dtype=np.int64),
+                "campaign_id": np.array(campaign_ids, dtype=np.int64),
+                "device_id": np.array(device_ids, dtype=np.int16),
+                "impressions": np.array(impressions, dtype=np.int64),
+                "clicks": np.array(clicks, dtype=np.int64),
+                "conversions": np.array(conversions, dtype=np.float64),
+                "cost_micros": np.array(cost_micros, dtype=np.int64),
+            }
+            yield chunk, max(ids)
+
+    def time_series(self, params, window_start=None):
+        """
+        Aggregate like services.time_series_statement() for TimeSeriesParams,
+        returning TimeSeriesRow tuples ordered by period. With rolling windows
+        or lags they get the same extra fields as
+        services.windowed_time_series_statement(), summed from
+        ``window_start`` (services.window_start()) on.
+        """
+        frame = self.ensure_fresh()
+        start = params.start_date.date() if params.start_date else None
+        selected = self._select(frame, params, start)
+        rows = self._time_series(selected, params.aggregate_by)
+        if not params.rolling and not params.lag:
+            return rows
+
+        window_rows = self._select(frame, params, window_start or start)
+        return self._add_windows(rows, window_rows, params)
+
+    def campaign_series(self, params):
+        """
+        The rows of services.campaign_series_statement() for TimeSeriesParams,
+        as one float array in SERIES_COLUMNS order.
+        """
+        start = params.start_date.date() if params.start_date else None
+        arrays = self._select(self.ensure_fresh(), params, start)
+
+        numbers = period_numbers(
+            period_keys(arrays["day"], params.aggregate_by), params.aggregate_by
+        )
+        numbers = numbers + SQL_PERIOD_OFFSETS.get(params.aggregate_by, 0)
+        campaign_ids = arrays["campaign_id"]
+        if not len(numbers):
+            return np.empty((0, 10))  # as many columns as below
+        low = campaign_ids.min()
+        span = campaign_ids.max() - low + 1
+        keys, inverse = np.unique(
+            (numbers - numbers.min()) * span + (campaign_ids - low),
+            return_inverse=True,
+        )
+        size = len(keys)
+
+        clicks = arrays["clicks"]
+        conversions = arrays["conversions"]
+        cost = arrays["cost_micros"] / MICROS
+        has_clicks = clicks != 0
+        has_conversions = conversions != 0
+        cost_per_click = np.divide(
+            cost, clicks, out=np.zeros_like(cost), where=has_clicks
+        )
+        cost_per_conversion = np.divide(
+            cost, conversions, out=np.zeros_like(cost), where=has_conversions
+        )
+
+        def total(values):
+            return np.bincount(inverse, weights=values, minlength=size)
+
+        return np.column_stack(
+            [
+                keys // span + numbers.min(),
+                keys % span + low,
+                total(arrays["cost_micros"]),
+                total(clicks),
+                total(conversions),
+                total(arrays["impressions"]),
+                total(cost_per_click),
+                total(has_clicks),
+                total(cost_per_conversion),
+                total(has_conversions),
+            ]
+        ).astype(np.float64)
+
+    @classmethod
+    def _select(cls, frame, params, start):
+        """
+        The rows of ``frame`` in the campaigns and dates of ``params``, from
+        ``start`` on, as one array per column. Each segment is filtered where
+        it lies, so a memory-mapped base is never copied as a whole.
+        """
+        parts = []
+        for segment in frame.segments:
+            mask = cls._mask(segment, params, start)
+            parts.append({name: segment[name][mask] for name in COLUMNS})
+        if len(parts) == 1:
+            return parts[0]
+        return {
+            name: np.concatenate([part[name] for part in parts]) for name in COLUMNS
+        }
+
+    @staticmethod
+    def _mask(arrays, params, start):
+        mask = np.ones(len(arrays["day"]), dtype=bool)
+        if params.campaigns:
+            campaigns = np.array(params.campaigns, dtype=np.int64)
+            mask &= np.isin(arrays["campaign_id"], campaigns)
+        if start:
+            mask &= arrays["day"] >= day_numbers(start)
+        if params.end_date:
+            mask &= arrays["day"] <= day_numbers(params.end_date.date())
+        return mask
+
+    @staticmethod
+    def _add_windows(rows, arrays, params):
+        """
+        Rolling averages and lagged values of the WINDOW_SOURCES metrics for
+        ``rows``, from the rows in ``arrays``: whole periods summed on
+        a dense axis of period numbers (missing periods are 0), rolling sums
+        as differences of its cumulative sum.
+        """
+        numbers = period_numbers(
+            period_keys(arrays["day"], params.aggregate_by), params.aggregate_by
+        )
+        if not len(numbers):
+            return rows
+        first = numbers.min()
+        size = numbers.max() - first + 1
+        present = np.bincount(numbers - first, minlength=size) > 0
+
+        row_keys = period_keys(
+            day_numbers([row.period for row in rows]), params.aggregate_by
+        )
+        index = period_numbers(row_keys, params.aggregate_by) - first
+
+        fields = {}
+        for metric, (column, scale) in WINDOW_SOURCES.items():
+            totals = np.bincount(
+                numbers - first, weights=arrays[column], minlength=size
+            )
+            totals = totals / scale
+            cumulative = np.concatenate(([0.0], np.cumsum(totals)))
+            for window in params.rolling:
+                low = np.maximum(index + 1 - window, 0)
+                fields[f"{metric}_rolling_{window}"] = (
+                    (cumulative[index + 1] - cumulative[low]) / window
+                ).tolist()
+            if params.lag:
+                fields[f"{metric}_whole"] = totals[index].tolist()
+            for lag in params.lag:
+                back = index - lag
+                valid = back >= 0
+                valid[valid] = present[back[valid]]
+                previous = np.where(valid, totals[np.maximum(back, 0)], np.nan)
+                fields[f"{metric}_previous_{lag}"] = [
+                    None if np.isnan(value) else value for value in previous.tolist()
+                ]
+
+        WindowedRow = namedtuple("WindowedRow", TimeSeriesRow._fields + tuple(fields))
+        return [
+            WindowedRow(*row, *values)
+            for row, values in zip(rows, zip(*fields.values()))
+        ]
+
+    @staticmethod
+    def _time_series(arrays, aggregate_by):
+        keys = period_keys(arrays["day"], aggregate_by)
+        periods, inverse = np.unique(keys, return_inverse=True)
+        size = len(periods)
+
+        clicks = arrays["clicks"]
+        impressions = arrays["impressions"]
+        conversions = arrays["conversions"]
+        cost_micros = arrays["cost_micros"]
+        cost = cost_micros / MICROS
+
+        # Exact as long as a period's total stays below 2**53 micros
+        total_cost = np.bincount(inverse, weights=cost_micros, minlength=size) / MICROS
+        total_clicks = np.bincount(inverse, weights=clicks, minlength=size)
+        total_conversions = np.bincount(inverse, weights=conversions, minlength=size)
+        total_impressions = np.bincount(inverse, weights=impressions, minlength=size)
+
+        # AVG(cost / NULLIF(x, 0)) skips the rows where x is 0
+        has_clicks = clicks != 0
+        has_conversions = conversions != 0
+        cost_per_click = np.divide(
+            cost, clicks, out=np.zeros_like(cost), where=has_clicks
+        )
+        cost_per_conversion = np.divide(
+            cost, conversions, out=np.zeros_like(cost), where=has_conversions
+        )
+
+        return [
+            TimeSeriesRow(*values)
+            for values in zip(
+                [EPOCH + timedelta(days=int(p)) for p in periods],
+                total_cost.tolist(),
+                total_clicks.astype(np.int64).tolist(),
+                total_conversions.tolist(),
+                total_impressions.astype(np.int64).tolist(),
+                group_mean(inverse, cost_per_click, has_clicks, size),
+                group_mean(inverse, cost_per_conversion, has_conversions, size),
+                ratio(total_clicks, total_impressions),
+                ratio(total_conversions, total_clicks),
+            )
+        ]
+
+    def save_snapshot(self, path):
+        """
+        Write the current frame as one .npy file per column plus a meta.json,
+        so it can be memory-mapped by load_snapshot(). meta.json is written
+        last, so a snapshot interrupted halfway is never picked up.
+        """
+        frame = self.ensure_fresh()
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self._meta_path(path)):
+            os.remove(self._meta_path(path))
+        for name in COLUMNS:
+            tmp_path = os.path.join(path, f"{name}.tmp.npy")
+            np.save(tmp_path, np.ascontiguousarray(frame.column(name)))
+            os.replace(tmp_path, os.path.join(path, f"{name}.npy"))
+
+        tmp_meta = self._meta_path(path) + ".tmp"
+        with open(tmp_meta, "w") as f:
+            meta = {
+                "columns": list(COLUMNS),
+                "watermark": frame.watermark,
+                "rows": len(frame),
+            }
+            json.dump(meta, f)
+        os.replace(tmp_meta, self._meta_path(path))
+        return len(frame)
+
+    @classmethod
+    def load_snapshot(cls, path):
+        """The snapshot at ``path`` memory-mapped, or None when it has other columns."""
+        with open(cls._meta_path(path)) as f:
+            meta = json.load(f)
+        if meta.get("columns") != list(COLUMNS):
+            logger.warning(f"Ignoring columnar snapshot {path}, it has other columns.")
+            return None
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in COLUMNS
+        }
+        logger.info(f"Columnar store mapped {meta['rows']} rows from {path}.")
+        return ColumnarFrame(arrays, meta["watermark"])
+
+    @staticmethod
+    def _meta_path(path):
+        return os.path.join(path, "meta.json")
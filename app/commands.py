@@ -0,0 +1,185 @@
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+
+from . import db
+from .aggregates import AGGREGATES, refresh_aggregates
+from .anomalies import ANOMALY_METHODS, ANOMALY_METRICS, detect_anomalies
+from .columnar import ColumnarStore
+from .importer import start_worker_pool, work
+from .models import AdGroupStats
+from .prefix_sums import refresh_prefix_sums
+from .synthetic import SyntheticDataset, truncate_ad_data, write_dataset
+
+
+@click.command("seed-synthetic")
+@click.option("--campaigns", default=50, show_default=True)
+@click.option("--ad-groups-per-campaign", default=20, show_default=True)
+@click.option("--days", default=365, show_default=True)
+@click.option("--devices", default=3, show_default=True, help="Devices per ad group (1-4).")
+@click.option("--end-date", help="Last day of data, YYYY-MM-DD. Defaults to today.")
+@click.option("--seed", default=42, show_default=True)
+@click.option("--chunk-rows", default=500_000, show_default=True)
+@click.option("--truncate", is_flag=True, help="Delete existing ad data first.")
+@with_appcontext
+def seed_synthetic_command(
+    campaigns, ad_groups_per_campaign, days, devices, end_date, seed, chunk_rows, truncate
+):
+    """Generate deterministic synthetic campaigns, ad groups and daily stats."""
+    end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    dataset = SyntheticDataset(
+        campaigns=campaigns,
+        ad_groups_per_campaign=ad_groups_per_campaign,
+        days=days,
+        devices=devices,
+        end_date=end,
+        seed=seed,
+    )
+
+    if truncate:
+        truncate_ad_data()
+
+    click.echo(
+        f"Generating {dataset.rows:,} stats rows for {campaigns} campaigns "
+        f"({dataset.start_date} to {dataset.end_date})."
+    )
+    started = time.perf_counter()
+
+    def progress(written):
+        elapsed = time.perf_counter() - started
+        click.echo(f"  {written:,} rows ({written / elapsed:,.0f} rows/s)")
+
+    written = write_dataset(dataset, chunk_rows=chunk_rows, progress=progress)
+    elapsed = time.perf_counter() - started
+    click.echo(f"Done: {written:,} rows in {elapsed:.1f}s.")
+
+    refresh_aggregates(full=truncate)
+
+
+@click.command("columnar-snapshot")
+@click.argument("path", required=False)
+@with_appcontext
+def columnar_snapshot_command(path):
+    """Write ad_group_stats as a memory-mappable snapshot for the columnar engine."""
+    path = path or current_app.config.get("COLUMNAR_SNAPSHOT_PATH")
+    if not path:
+        raise click.UsageError("Pass a PATH or set COLUMNAR_SNAPSHOT_PATH.")
+
+    started = time.perf_counter()
+    rows = ColumnarStore(snapshot_path=path).save_snapshot(path)
+    elapsed = time.perf_counter() - started
+    click.echo(f"Wrote {rows:,} rows to {path} in {elapsed:.1f}s.")
+
+
+@click.command("refresh-prefix-sums")
+@click.option("--full", is_flag=True, help="Rebuild from scratch instead of incrementally.")
+@with_appcontext
+def refresh_prefix_sums_command(full):
+    """Bring the compare-performance prefix sums up to date with ad_group_stats."""
+    started = time.perf_counter()
+    written = refresh_prefix_sums(full=full)
+    elapsed = time.perf_counter() - started
+    click.echo(f"Wrote {written:,} prefix sum rows in {elapsed:.1f}s.")
+
+
+@click.command("refresh-aggregates")
+@click.option("--full", is_flag=True, help="Rebuild from scratch instead of incrementally.")
+@click.option(
+    "--only",
+    multiple=True,
+    type=click.Choice(list(AGGREGATES)),
+    help="Refresh just this aggregate (repeatable).",
+)
+@with_appcontext
+def refresh_aggregates_command(full, only):
+    """Bring the derived aggregates of ad_group_stats up to date."""
+    for name, (written, seconds) in refresh_aggregates(only, full=full).items():
+        click.echo(f"{name}: wrote {written:,} rows in {seconds:.1f}s.")
+
+
+@click.command("detect-anomalies")
+@click.option("--days", default=90, show_default=True, help="Days up to --end-date.")
+@click.option("--end-date", help="Last day, YYYY-MM-DD. Defaults to the latest data.")
+@click.option(
+    "--metric",
+    "metrics",
+    multiple=True,
+    type=click.Choice(ANOMALY_METRICS),
+    help="Metric to check (repeatable, default all).",
+)
+@click.option(
+    "--method", type=click.Choice(ANOMALY_METHODS), default="robust", show_default=True
+)
+@click.option("--threshold", default=3.5, show_default=True)
+@click.option("--campaign-id", type=int)
+@click.option("--limit", default=50, show_default=True)
+@with_appcontext
+def detect_anomalies_command(
+    days, end_date, metrics, method, threshold, campaign_id, limit
+):
+    """Flag ad group days whose cost or CPA is far off the ad group's baseline."""
+    if end_date:
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    else:
+        end = db.session.execute(select(func.max(AdGroupStats.date))).scalar()
+        if end is None:
+            raise click.ClickException("ad_group_stats is empty.")
+    start = end - timedelta(days=days - 1)
+
+    started = time.perf_counter()
+    scored, flagged, results = detect_anomalies(
+        start,
+        end,
+        metrics=metrics or ANOMALY_METRICS,
+        method=method,
+        threshold=threshold,
+        campaign_id=campaign_id,
+        limit=limit,
+    )
+    elapsed = time.perf_counter() - started
+
+    click.echo(
+        f"{flagged:,} anomalies in {scored:,} ad groups from {start} to {end} "
+        f"({elapsed:.2f}s)."
+    )
+    for item in results:
+        click.echo(
+            f"  {item['date']}  ad group {item['ad_group_id']:>8}  "
+            f"{item['metric']:<4} {item['value']:>12,.2f} "
+            f"(baseline {item['baseline']:,.2f})  score {item['score']:>7.2f}"
+        )
+
+
+@click.command("import-worker")
+@click.option("--workers", default=2, show_default=True, help="Worker processes.")
+@click.option("--config", "config_name", default="default", show_default=True)
+@click.option("--once", is_flag=True, help="Work through the queue in-process, then exit.")
+@with_appcontext
+def import_worker_command(workers, config_name, once):
+    """Process queued import jobs (uploaded through POST /imports)."""
+    if once:
+        processed = work(current_app._get_current_object(), once=True)
+        click.echo(f"Processed {processed} import jobs.")
+        return
+
+    processes = start_worker_pool(workers, config_name)
+    click.echo(f"Started {len(processes)} import workers, Ctrl+C to stop.")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+def register_commands(app):
+    app.cli.add_command(seed_synthetic_command)
+    app.cli.add_command(columnar_snapshot_command)
+    app.cli.add_command(refresh_prefix_sums_command)
+    app.cli.add_command(refresh_aggregates_command)
+    app.cli.add_command(detect_anomalies_command)
+    app.cli.add_command(import_worker_command)
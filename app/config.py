@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,6 +11,55 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.getenv("SECRET_KEY", "default-secret-key")
 
+    # Max threads running independent sub-queries of one request concurrently,
+    # further capped by the engine's pool size (see app/executor.py)
+    PARALLEL_QUERY_WORKERS = int(os.getenv("PARALLEL_QUERY_WORKERS", 4))
+
+    # Max items accepted by one bulk rename request (PUT /campaigns)
+    BULK_RENAME_MAX_ITEMS = int(os.getenv("BULK_RENAME_MAX_ITEMS", 1000))
+
+    # In-process NumPy engine for performance_time_series (see app/columnar.py).
+    # The snapshot directory, if set, is memory-mapped at startup when present.
+    COLUMNAR_ENGINE = os.getenv("COLUMNAR_ENGINE", "").lower() in ("1", "true", "yes")
+    COLUMNAR_SNAPSHOT_PATH = os.getenv("COLUMNAR_SNAPSHOT_PATH")
+    # Seconds between incremental refreshes of the loaded rows
+    COLUMNAR_REFRESH_INTERVAL = float(os.getenv("COLUMNAR_REFRESH_INTERVAL", 60))
+
+    # Concurrent identical analytic requests share one computation (see
+    # app/singleflight.py); waiters give up and compute alone after this long
+    SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+    SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", 30))
+
+    # On PostgreSQL, /campaigns and /performance-time-series responses are
+    # built as JSON text by the db and passed through (see services.py)
+    DATABASE_JSON = os.getenv("DATABASE_JSON", "true").lower() in ("1", "true", "yes")
+
+    # /performance-time-series refuses queries estimated to scan more rows
+    # than this (see services.plan_time_series); 0 turns the check off
+    TIME_SERIES_SCAN_BUDGET_ROWS = int(os.getenv("TIME_SERIES_SCAN_BUDGET_ROWS", 20_000_000))
+
+    # /anomalies refuses date ranges longer than this many days, as it scores a
+    # matrix of one value per ad group and day; 0 turns the check off
+    ANOMALY_MAX_DAYS = int(os.getenv("ANOMALY_MAX_DAYS", 366))
+
+    # Import jobs (see app/importer.py). Uploads are stored in IMPORT_UPLOAD_DIR,
+    # which the import workers must be able to read.
+    IMPORT_UPLOAD_DIR = os.getenv(
+        "IMPORT_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "kaya_imports")
+    )
+    IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", 50_000))
+    # Seconds between queue polls of an idle worker
+    IMPORT_POLL_INTERVAL = float(os.getenv("IMPORT_POLL_INTERVAL", 2))
+    # A running job without progress for this long is handed to another worker
+    IMPORT_JOB_STALE_SECONDS = float(os.getenv("IMPORT_JOB_STALE_SECONDS", 600))
+    # Refresh the derived aggregates (see app/aggregates.py) after each import;
+    # off, run flask refresh-aggregates on a schedule instead
+    IMPORT_REFRESH_AGGREGATES = os.getenv("IMPORT_REFRESH_AGGREGATES", "true").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+
     # Default database configuration
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     if not SQLALCHEMY_DATABASE_URI:
@@ -17,6 +67,19 @@ class Config:
             "The 'DATABASE_URL' environment variable is required but not set."
         )
 
+    # Read replicas (comma-separated URLs). Read-only service functions are
+    # routed to them round-robin, writes always go to the primary.
+    REPLICA_DATABASE_URLS = [
+        url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()
+    ]
+    # Seconds an unhealthy replica is skipped before it is tried again
+    REPLICA_HEALTH_CHECK_INTERVAL = float(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", 30))
+    # After a write, that client's reads stay on the primary this long to hide
+    # replica lag
+    REPLICA_READ_AFTER_WRITE_SECONDS = float(
+        os.getenv("REPLICA_READ_AFTER_WRITE_SECONDS", 1)
+    )
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -34,6 +97,8 @@ class TestingConfig(Config):
 
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"  # In-memory SQLite DB for testing
+    REPLICA_DATABASE_URLS = []
+    COLUMNAR_ENGINE = False
 
 
 class ProductionConfig(Config):
@@ -1,14 +1,31 @@
 from .services import (
+    health,
+    ready,
     test_app,
     get_campaigns,
     update_campaign_name,
+    bulk_update_campaign_names,
     performance_time_series,
     compare_performance,
+    search,
+    rankings,
+    anomalies,
+    create_import_job,
+    get_import_job,
+    get_import_job_rejects,
 )
 
 # from .helpers.auth import auth_required
 
 
+def health_main(**kwargs):
+    return health(**kwargs)
+
+
+def ready_main(**kwargs):
+    return ready(**kwargs)
+
+
 # @auth_required
 def test_app_main(**kwargs):
     return test_app(**kwargs)
@@ -22,9 +39,37 @@ def update_campaign_name_main(**kwargs):
     return update_campaign_name(**kwargs)
 
 
+def bulk_update_campaign_names_main(**kwargs):
+    return bulk_update_campaign_names(**kwargs)
+
+
 def performance_time_series_main(**kwargs):
     return performance_time_series(**kwargs)
 
 
 def compare_performance_main(**kwargs):
     return compare_performance(**kwargs)
+
+
+def search_main(**kwargs):
+    return search(**kwargs)
+
+
+def rankings_main(**kwargs):
+    return rankings(**kwargs)
+
+
+def anomalies_main(**kwargs):
+    return anomalies(**kwargs)
+
+
+def create_import_job_main(**kwargs):
+    return create_import_job(**kwargs)
+
+
+def get_import_job_main(**kwargs):
+    return get_import_job(**kwargs)
+
+
+def get_import_job_rejects_main(**kwargs):
+    return get_import_job_rejects(**kwargs)
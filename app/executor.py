@@ -0,0 +1,143 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import current_app
+from sqlalchemy.pool import QueuePool
+
+from app import db
+
+
+_in_worker = contextvars.ContextVar("in_query_worker", default=False)
+_executors_lock = threading.Lock()
+
+
+def _worker_count(app):
+    """
+    Workers are bounded by the engine's pool size less the connection the
+    calling request already holds, so a fan-out never asks for more
+    connections than the pool keeps open. Pools that hand the same
+    connection to every thread (in-memory SQLite uses StaticPool) cannot run
+    statements concurrently, so they get no workers at all.
+    """
+    pool = db.engine.pool
+    if not isinstance(pool, QueuePool):
+        return 0
+    workers = app.config.get("PARALLEL_QUERY_WORKERS", 0)
+    return max(0, min(workers, pool.size() - 1))
+
+
+def _get_executor(app):
+    executor = app.extensions.get("query_executor")
+    if executor is None:
+        with _executors_lock:
+            executor = app.extensions.get("query_executor")
+            if executor is None:
+                workers = _worker_count(app)
+                executor = False
+                if workers > 1:
+                    executor = ThreadPoolExecutor(
+                        max_workers=workers, thread_name_prefix="query"
+                    )
+                    # One slot per connection the pool keeps, see run_parallel()
+                    slots = threading.BoundedSemaphore(db.engine.pool.size())
+                    app.extensions["query_connection_slots"] = slots
+                app.extensions["query_executor"] = executor
+    return executor
+
+
+def _take_slots(slots, wanted):
+    """Take up to ``wanted`` of ``slots`` without waiting; returns how many."""
+    taken = 0
+    while taken < wanted and slots.acquire(blocking=False):
+        taken += 1
+    return taken
+
+
+def _run_in_app_context(app, fn, args, session_info, slots):
+    # A fresh app context means a fresh db.session, so every task checks out
+    # its own pooled connection and returns it when the context is torn down;
+    # only then is the task's connection slot given back.
+    _in_worker.set(True)
+    try:
+        with app.app_context():
+            db.session.info.update(session_info)
+            return fn(*args)
+    finally:
+        slots.release()
+
+
+def _pinned_session_info():
+    """
+    The routing state of the caller's session, with its bind resolved first,
+    so every task of a request reads from the same replica (or the primary)
+    as the request itself rather than each picking its own.
+    """
+    session = db.session()
+    session.get_bind()
+    return {
+        key: session.info[key] for key in ("replica", "wrote") if key in session.info
+    }
+
+
+def run_parallel(calls):
+    """
+    Run independent read functions concurrently and return their results in order.
+
+    ``calls`` is a list of (fn, args) pairs. Each call runs in a copy of the
+    caller's context (so context-local state such as routing flags carries over)
+    inside its own app context and database session, bound to the caller's
+    replica. Every call is waited for
+    before the first error, if any, is re-raised in the caller. Falls back to
+    running the calls one after another when the pool cannot run them
+    concurrently, when there is only one call, or when already inside a worker.
+
+    Connections are rationed app-wide: a fan-out takes one slot for the
+    caller's connection and one per task, without waiting, out of as many
+    slots as the pool keeps connections. Calls left without a slot run in the
+    caller, so concurrent fan-outs never all hold a connection while waiting
+    for workers that wait for one (until pool_timeout).
+    """
+    app = current_app._get_current_object()
+    executor = _get_executor(app)
+
+    if not executor or len(calls) < 2 or _in_worker.get():
+        return [fn(*args) for fn, args in calls]
+
+    session_info = _pinned_session_info()
+    slots = app.extensions["query_connection_slots"]
+    taken = _take_slots(slots, len(calls) + 1)
+    if taken < 2:
+        for _ in range(taken):
+            slots.release()
+        return [fn(*args) for fn, args in calls]
+
+    # The first slot is the caller's own
+    in_workers = taken - 1
+    futures = [
+        executor.submit(
+            contextvars.copy_context().run,
+            _run_in_app_context,
+            app,
+            fn,
+            args,
+            session_info,
+            slots,
+        )
+        for fn, args in calls[:in_workers]
+    ]
+    try:
+        rest = [fn(*args) for fn, args in calls[in_workers:]]
+    finally:
+        wait(futures)
+        slots.release()
+    return [future.result() for future in futures] + rest
+
+
+def start_executor(app):
+    """
+    Create the app's query workers ahead of the first fan-out and return how
+    many statements one request may run at once.
+    """
+    _get_executor(app)
+    return max(1, _worker_count(app))
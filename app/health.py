@@ -0,0 +1,89 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.pool import QueuePool
+
+from app import db
+from app.columnar import get_columnar_store
+from app.executor import start_executor
+
+logger = logging.getLogger(__name__)
+
+
+def pool_stats(engine):
+    """Connection pool usage of an engine, as far as its pool class reports it."""
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return stats
+
+
+def check_database():
+    """
+    One SELECT 1 on the primary, plus pool stats of the primary and replicas.
+    Raises SQLAlchemyError when the primary cannot be reached.
+    """
+    started = time.perf_counter()
+    with db.engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    router = current_app.extensions.get("replica_router")
+    return {
+        "database": {"latency_ms": round(latency_ms, 2), "pool": pool_stats(db.engine)},
+        "replicas": router.status() if router is not None else {},
+    }
+
+
+def _open_connections(engine, count):
+    # Hold ``count`` connections at once so the pool really opens that many,
+    # then hand them all back
+    with ExitStack() as stack:
+        for _ in range(count):
+            stack.enter_context(engine.connect()).execute(text("SELECT 1"))
+
+
+def warm_up(app):
+    """
+    Do the setup work a cold process would otherwise do in its first request:
+    configure the ORM mappers, open as many pooled connections as one request
+    may use in parallel (primary and healthy replicas), start the query worker
+    threads and load the columnar store when it is enabled.
+    Returns what was done, with timings.
+    """
+    started = time.perf_counter()
+    with app.app_context():
+        configure_mappers()
+
+        connections = start_executor(app)
+        _open_connections(db.engine, connections)
+
+        router = app.extensions.get("replica_router")
+        replicas = {}
+        if router is not None:
+            for key, engine in router.engines.items():
+                replicas[key] = router.check(key)
+                if replicas[key]:
+                    _open_connections(engine, connections)
+
+        store = get_columnar_store()
+        columnar_rows = len(store.ensure_fresh()) if store is not None else None
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Warm-up done in {elapsed_ms:.0f} ms ({connections} connections).")
+    return {
+        "connections": connections,
+        "replicas": replicas,
+        "columnar_rows": columnar_rows,
+        "elapsed_ms": round(elapsed_ms, 2),
+    }
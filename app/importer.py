@@ -0,0 +1,553 @@
+import io
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import (
+    Column,
+    MetaData,
+    Table,
+    exists,
+    func,
+    insert,
+    inspect,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.aggregates import refresh_aggregates
+from app.models import AdGroup, AdGroupStats, Campaign, Device
+from app.models.ad_group_stats import MICROS
+from app.models.device import device_ids
+from app.models.import_job import ImportJob
+from app.validation import validate_workbook
+
+logger = logging.getLogger(__name__)
+
+# Sheets of an import workbook and the columns each must have
+SHEET_COLUMNS = {
+    "campaign": ["campaign_id", "campaign_name", "campaign_type"],
+    "ad_group": ["ad_group_id", "ad_group_name", "campaign_id"],
+    "ad_group_stats": [
+        "date",
+        "ad_group_id",
+        "device",
+        "impressions",
+        "clicks",
+        "conversions",
+        "cost",
+    ],
+}
+# Columns written to ad_group_stats, in table order
+STATS_COLUMNS = [
+    "ad_group_id",
+    "cost_micros",
+    "conversions",
+    "date",
+    "impressions",
+    "clicks",
+    "device_id",
+]
+# Bulk loads rebuild the indexes of ad_group_stats when they add at least this
+# share of the rows already there; below, updating them in place is cheaper
+BULK_REBUILD_MIN_SHARE = 0.2
+
+
+class ImportFailed(Exception):
+    """A workbook that cannot be imported; the message is shown on the job."""
+
+
+def read_workbook(path):
+    """The sheets of an import workbook as DataFrames, checked for their columns."""
+    try:
+        sheets = pd.read_excel(path, sheet_name=list(SHEET_COLUMNS))
+    except ValueError as e:
+        # Missing sheets, or not an Excel file at all
+        raise ImportFailed(f"Cannot read workbook: {e}")
+
+    for name, columns in SHEET_COLUMNS.items():
+        missing = [c for c in columns if c not in sheets[name].columns]
+        if missing:
+            raise ImportFailed(f"Sheet '{name}' is missing columns: {', '.join(missing)}")
+    return sheets
+
+
+def storage_frame(frame):
+    """
+    Stats rows in the workbook layout -> the ad_group_stats layout: device
+    names replaced by their device_id (added to the device table when new),
+    cost in micros.
+    """
+    dates = frame["date"]
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        dates = dates.dt.date
+    ids = device_ids(frame["device"].unique().tolist())
+    return pd.DataFrame(
+        {
+            "ad_group_id": frame["ad_group_id"],
+            "cost_micros": (frame["cost"] * MICROS).round().astype(np.int64),
+            "conversions": frame["conversions"],
+            "date": dates,
+            "impressions": frame["impressions"],
+            "clicks": frame["clicks"],
+            "device_id": frame["device"].map(ids).astype(np.int16),
+        },
+        columns=STATS_COLUMNS,
+    )
+
+
+def write_stats_frame(connection, frame, table=AdGroupStats.__tablename__):
+    """
+    Write a storage_frame() into ``table`` through the fastest path there is:
+    COPY on PostgreSQL/psycopg2, one raw executemany of plain tuples elsewhere.
+    """
+    if connection.dialect.driver == "psycopg2":
+        buffer = io.StringIO()
+        frame.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(STATS_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        return
+
+    if connection.dialect.name == "sqlite":
+        frame = frame.assign(date=frame["date"].map(date.isoformat))
+    rows = list(frame.itertuples(index=False, name=None))
+    placeholders = ", ".join(
+        "?" if connection.dialect.paramstyle == "qmark" else "%s" for _ in STATS_COLUMNS
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO {table} ({', '.join(STATS_COLUMNS)}) VALUES ({placeholders})",
+        rows,
+    )
+
+
+def staging_table(dialect_name):
+    """
+    A uniquely named table with the STATS_COLUMNS of ad_group_stats and no
+    key, index or constraint: UNLOGGED on PostgreSQL (no WAL is written for
+    it), TEMPORARY elsewhere.
+    """
+    stats = AdGroupStats.__table__
+    return Table(
+        f"ad_group_stats_staging_{uuid.uuid4().hex[:8]}",
+        MetaData(),
+        *[Column(name, stats.c[name].type) for name in STATS_COLUMNS],
+        prefixes=["UNLOGGED" if dialect_name == "postgresql" else "TEMPORARY"],
+    )
+
+
+def drop_stats_indexes(connection):
+    """
+    Drop the secondary indexes of ad_group_stats, and its foreign keys on
+    PostgreSQL (SQLite cannot drop them, and does not enforce them unless
+    asked to). Returns what was dropped, for restore_stats_indexes().
+    """
+    table = AdGroupStats.__table__
+    inspector = inspect(connection)
+    present = {index["name"] for index in inspector.get_indexes(table.name)}
+    indexes = [index for index in table.indexes if index.name in present]
+    for index in indexes:
+        index.drop(connection)
+
+    foreign_keys = []
+    if connection.dialect.name == "postgresql":
+        foreign_keys = inspector.get_foreign_keys(table.name)
+        for foreign_key in foreign_keys:
+            connection.execute(
+                text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{foreign_key["name"]}"')
+            )
+    return indexes, foreign_keys
+
+
+def restore_stats_indexes(connection, dropped):
+    """Build what drop_stats_indexes() dropped again, one table scan each."""
+    indexes, foreign_keys = dropped
+    table = AdGroupStats.__tablename__
+    for index in indexes:
+        index.create(connection)
+    for foreign_key in foreign_keys:
+        connection.execute(
+            text(
+                f'ALTER TABLE {table} ADD CONSTRAINT "{foreign_key["name"]}" '
+                f"FOREIGN KEY ({', '.join(foreign_key['constrained_columns'])}) "
+                f"REFERENCES {foreign_key['referred_table']} "
+                f"({', '.join(foreign_key['referred_columns'])})"
+            )
+        )
+
+
+def bulk_load_stats(stats, chunk_rows=50_000, progress=None, rebuild_indexes=None):
+    """
+    Load validated stats rows (as from validate_workbook()) into
+    ad_group_stats through a staging table, without committing.
+
+    The rows are copied into a bare staging table first, checked for missing
+    ad groups and devices with one anti-join, then moved over with a single
+    INSERT ... SELECT. With ``rebuild_indexes`` (by default when the load adds
+    BULK_REBUILD_MIN_SHARE of the rows there already), the indexes and foreign
+    keys of ad_group_stats are dropped before that INSERT and built again
+    after it, instead of being updated row by row.
+
+    All of it, DDL included, happens in the session's transaction: a load that
+    fails or is interrupted at any point rolls back to the table as it was.
+    While indexes are rebuilt the table is locked, readers wait. Returns the
+    number of rows inserted.
+    """
+    connection = db.session.connection()
+    dbapi_connection = connection.connection.dbapi_connection
+    if connection.dialect.name == "sqlite" and not dbapi_connection.in_transaction:
+        # pysqlite only opens its transaction at the first INSERT, UPDATE or
+        # DELETE; open it now so the DDL below is rolled back with the rest
+        connection.exec_driver_sql("BEGIN")
+    staging = staging_table(connection.dialect.name)
+    staging.create(connection)
+
+    for first in range(0, len(stats), chunk_rows):
+        chunk = storage_frame(stats.iloc[first : first + chunk_rows])
+        write_stats_frame(connection, chunk, staging.name)
+        if progress:
+            progress(first + len(chunk), len(stats))
+
+    orphans = connection.execute(
+        select(func.count())
+        .select_from(staging)
+        .where(
+            or_(
+                ~exists().where(AdGroup.ad_group_id == staging.c.ad_group_id),
+                ~exists().where(Device.device_id == staging.c.device_id),
+            )
+        )
+    ).scalar()
+    if orphans:
+        raise ImportFailed(
+            f"{orphans:,} rows reference ad groups or devices that do not exist."
+        )
+
+    if rebuild_indexes is None:
+        low, high = connection.execute(
+            select(func.min(AdGroupStats.id), func.max(AdGroupStats.id))
+        ).one()
+        existing = high - low + 1 if high is not None else 0
+        rebuild_indexes = len(stats) >= BULK_REBUILD_MIN_SHARE * existing
+    dropped = drop_stats_indexes(connection) if rebuild_indexes else None
+
+    # In (date, ad_group_id) order, the order the table is mostly read in
+    inserted = connection.execute(
+        insert(AdGroupStats).from_select(
+            STATS_COLUMNS,
+            select(*[staging.c[name] for name in STATS_COLUMNS]).order_by(
+                staging.c.date, staging.c.ad_group_id
+            ),
+        )
+    ).rowcount
+
+    if dropped is not None:
+        restore_stats_indexes(connection, dropped)
+    staging.drop(connection)
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(f"ANALYZE {AdGroupStats.__tablename__}"))
+    logger.info(
+        f"Bulk loaded {inserted:,} stats rows"
+        f"{', indexes rebuilt' if rebuild_indexes else ''}."
+    )
+    return inserted
+
+
+def reject_path_for(path):
+    """Where the rejected rows of the workbook at ``path`` are written."""
+    return f"{os.path.splitext(path)[0]}.rejects.csv"
+
+
+def insert_new_rows(key, frame):
+    """
+    Insert the rows of ``frame`` whose primary key (``key``, a model column)
+    is not in the table yet, so importing a workbook again does not fail on
+    the campaigns and ad groups it already added. Returns the inserted count.
+    """
+    frame = frame.drop_duplicates(subset=key.key)
+    existing = set(
+        db.session.execute(
+            select(key).where(key.in_(frame[key.key].tolist()))
+        ).scalars()
+    )
+    new = frame[~frame[key.key].isin(existing)]
+    if len(new):
+        db.session.execute(insert(key.class_), new.to_dict("records"))
+    return len(new)
+
+
+def import_workbook(
+    path, chunk_rows=50_000, job=None, progress=None, bulk=False, refresh=True
+):
+    """
+    Import a workbook (sheets as in SHEET_COLUMNS) into the current app's
+    database, then, with ``refresh``, refresh the derived aggregates
+    (refresh_after_import()).
+
+    The sheets are validated first (see app/validation.py): rows that cannot
+    be inserted are left out and written with their reasons to a CSV next to
+    the workbook (reject_path_for()), the rest is imported in one pass.
+    Campaigns and ad groups go in first, then the stats in chunks of
+    ``chunk_rows`` sheet rows, each committed on its own. With a ``job``, its
+    progress is saved in the same transaction as each chunk, and stats rows
+    the job already processed are skipped, so a job interrupted halfway can
+    simply be run again.
+
+    With ``bulk``, the stats go in through bulk_load_stats() in one
+    transaction instead: nothing of them is there until all of them are, and
+    an interrupted load has to start over (so not for jobs). Returns (stats
+    rows inserted, rows rejected).
+    """
+    if bulk and job is not None:
+        raise ValueError("Import jobs cannot use the bulk-load mode.")
+    sheets = read_workbook(path)
+    total = len(sheets["ad_group_stats"])
+    known_campaigns = db.session.execute(select(Campaign.campaign_id)).scalars()
+    known_ad_groups = db.session.execute(select(AdGroup.ad_group_id)).scalars()
+    sheets, rejects = validate_workbook(sheets, known_campaigns, known_ad_groups)
+    stats = sheets["ad_group_stats"]
+
+    reject_path = reject_path_for(path)
+    if len(rejects):
+        rejects.to_csv(reject_path, index=False)
+        logger.warning(f"Rejected {len(rejects):,} rows of {path}, see {reject_path}.")
+
+    for attempt in range(3):
+        try:
+            insert_new_rows(Campaign.campaign_id, sheets["campaign"])
+            insert_new_rows(AdGroup.ad_group_id, sheets["ad_group"])
+            if job is not None:
+                job.total_rows = total
+                job.rejected_rows = len(rejects)
+                job.reject_path = reject_path if len(rejects) else None
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Another job added some of the same campaigns or ad groups
+            # meanwhile; they are skipped on the next attempt
+            db.session.rollback()
+            if attempt == 2:
+                raise
+
+    # Chunks and progress count sheet rows, valid or not, so a resumed job
+    # starts from the same row whatever was rejected
+    start = job.rows_processed if job is not None else 0
+    inserted = 0
+    if bulk:
+        try:
+            inserted = bulk_load_stats(stats, chunk_rows, progress)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            raise
+        start = total
+    for first in range(start, total, chunk_rows):
+        done = min(first + chunk_rows, total)
+        low, high = stats.index.searchsorted([first, done])
+        chunk = stats.iloc[low:high]
+        if len(chunk):
+            db.session.execute(
+                insert(AdGroupStats), storage_frame(chunk).to_dict("records")
+            )
+            inserted += len(chunk)
+        if job is not None:
+            job.rows_processed = done
+            job.updated_at = datetime.utcnow()
+        db.session.commit()
+        if progress:
+            progress(done, total)
+
+    if refresh:
+        refresh_after_import()
+    return inserted, len(rejects)
+
+
+def refresh_after_import():
+    """
+    Keep the prefix sums and the daily rollup in step with newly imported
+    rows, unless IMPORT_REFRESH_AGGREGATES is off; only the dates and ad
+    groups of the import are recomputed. The rows are committed by then, so
+    a failure is logged and not raised: the aggregates read as stale, the
+    endpoints scan ad_group_stats, and the next refresh catches up.
+    """
+    if not current_app.config.get("IMPORT_REFRESH_AGGREGATES", True):
+        return
+    try:
+        refreshed = refresh_aggregates()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"Refreshing the aggregates after an import failed: {e}")
+        return
+    for name, (written, seconds) in refreshed.items():
+        logger.info(f"Refreshed {name}: {written:,} rows in {seconds:.2f}s.")
+
+
+def enqueue_import_statement(filename, path):
+    """INSERT of a queued ImportJob, returning the job."""
+    return (
+        insert(ImportJob)
+        .values(filename=filename, path=path, status="queued")
+        .returning(ImportJob)
+    )
+
+
+def enqueue_import(filename, path):
+    """Queue an uploaded workbook for the import workers."""
+    job = db.session.execute(enqueue_import_statement(filename, path)).scalar()
+    db.session.commit()
+    return job
+
+
+def claim_next_job(worker):
+    """
+    Mark the oldest queued job as running for ``worker`` and return it, or
+    None when the queue is empty. The conditional UPDATE makes sure only one
+    of several competing workers gets a job.
+    """
+    while True:
+        job_id = db.session.execute(
+            select(ImportJob.id)
+            .where(ImportJob.status == "queued")
+            .order_by(ImportJob.id)
+            .limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status == "queued")
+            .values(status="running", worker=worker, started_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(ImportJob, job_id)
+
+
+def requeue_stale_jobs(stale_after):
+    """
+    Put running jobs whose worker stopped reporting progress ``stale_after``
+    seconds ago back in the queue; they resume after their last chunk.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    requeued = db.session.execute(
+        update(ImportJob)
+        .where(ImportJob.status == "running", ImportJob.updated_at < cutoff)
+        .values(status="queued", worker=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if requeued:
+        logger.warning(f"Requeued {requeued} import jobs of unresponsive workers.")
+    return requeued
+
+
+def run_job(job, chunk_rows=50_000):
+    """
+    Import one claimed job and record how it ended. The job is done once its
+    rows are committed; the aggregate refresh runs after that and cannot fail
+    it, so a client never retries an import that went in.
+    """
+    job_id = job.id
+    logger.info(f"Import job {job_id}: importing {job.filename}.")
+    try:
+        imported, rejected = import_workbook(
+            job.path, chunk_rows=chunk_rows, job=job, refresh=False
+        )
+    except Exception as e:
+        db.session.rollback()
+        if not isinstance(e, ImportFailed):
+            logger.exception(f"Import job {job_id} failed: {e}")
+        job = db.session.get(ImportJob, job_id)
+        job.status = "failed"
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return job
+
+    job.status = "done"
+    job.finished_at = job.updated_at = datetime.utcnow()
+    db.session.commit()
+    logger.info(
+        f"Import job {job_id}: {imported:,} rows, {rejected:,} rejected, "
+        f"{job.rows_per_second()} rows/s."
+    )
+    refresh_after_import()
+    try:
+        os.remove(job.path)
+    except OSError:
+        pass
+    return job
+
+
+def work(app, worker=None, once=False, stop=None):
+    """
+    Process queued import jobs with ``app`` until ``stop`` (a threading.Event)
+    is set, or, with ``once``, until the queue is empty. Returns the number of
+    jobs processed.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or threading.Event()
+    poll_interval = app.config.get("IMPORT_POLL_INTERVAL", 2)
+    processed = 0
+
+    while not stop.is_set():
+        with app.app_context():
+            requeue_stale_jobs(app.config.get("IMPORT_JOB_STALE_SECONDS", 600))
+            job = claim_next_job(worker)
+            if job is not None:
+                run_job(job, chunk_rows=app.config.get("IMPORT_CHUNK_ROWS", 50_000))
+                processed += 1
+                continue
+        if once:
+            break
+        stop.wait(poll_interval)
+    return processed
+
+
+def _worker_process(config_name, config_overrides, number):
+    from app import create_app
+
+    app = create_app(config_name, config_overrides)
+    try:
+        work(app, worker=f"{socket.gethostname()}:{os.getpid()}:{number}")
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the whole process group; the job is picked up again
+        # once it goes stale
+        pass
+
+
+def start_worker_pool(workers, config_name="development", config_overrides=None):
+    """
+    Start ``workers`` import worker processes, each with its own app from the
+    app factory (and so its own connection pool), and return them.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=_worker_process,
+            args=(config_name, config_overrides, number),
+            name=f"import-worker-{number}",
+            daemon=True,
+        )
+        for number in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    return processes
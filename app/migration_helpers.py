@@ -0,0 +1,375 @@
+import logging
+import math
+import os
+import time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+
+import sqlalchemy as sa
+from alembic import op
+
+# Under alembic's logger, so the plans show up next to its own output
+logger = logging.getLogger("alembic.migration_helpers")
+
+# Keys per backfill batch, and seconds to wait between two batches
+BATCH_SIZE = 10_000
+BATCH_PAUSE_SECONDS = 0.1
+# How long the short exclusive steps wait for a lock before failing, instead
+# of queueing every query of the app behind them
+LOCK_TIMEOUT = "5s"
+# Rows per second a scan, index build or backfill is assumed to get through;
+# only used for the estimates
+ESTIMATED_ROWS_PER_SECOND = float(os.getenv("MIGRATION_ROWS_PER_SECOND", 200_000))
+
+# What a helper does (or, in a dry run, would do) to a table: rows touched,
+# batches, seconds other queries are locked out and seconds it takes overall
+MigrationPlan = namedtuple(
+    "MigrationPlan",
+    ["operation", "table", "rows", "batches", "lock_seconds", "seconds"],
+)
+
+# Live connection the estimates are read from during a dry run, while the
+# migration itself only prints its SQL (see migrations/env.py)
+_dry_run_bind = None
+
+
+def is_dry_run():
+    """True for MIGRATION_DRY_RUN=true flask db upgrade."""
+    return os.getenv("MIGRATION_DRY_RUN", "").lower() in ("1", "true", "yes")
+
+
+@contextmanager
+def dry_run(connection):
+    """Read estimates from ``connection`` while the migrations only print SQL."""
+    global _dry_run_bind
+    _dry_run_bind = connection
+    try:
+        yield
+    finally:
+        _dry_run_bind = None
+
+
+def _bind():
+    return _dry_run_bind if _dry_run_bind is not None else op.get_bind()
+
+
+def _postgresql():
+    return op.get_context().dialect.name == "postgresql"
+
+
+def _scan_seconds(rows):
+    return rows / ESTIMATED_ROWS_PER_SECOND
+
+
+def _report(plan):
+    prefix = "Dry run, would " if is_dry_run() else ""
+    logger.info(
+        f"{prefix}{plan.operation} on {plan.table}: {plan.rows:,} rows in "
+        f"{plan.batches:,} batches, exclusive lock ~{plan.lock_seconds:.1f}s, "
+        f"~{plan.seconds:.0f}s in total."
+    )
+    return plan
+
+
+def _autocommit():
+    """
+    Statements committed one by one on PostgreSQL. Whatever the migration did
+    before is committed when the block starts, so give online changes a
+    revision of their own.
+    """
+    return op.get_context().autocommit_block() if _postgresql() else nullcontext()
+
+
+@contextmanager
+def _lock_timeout():
+    if _postgresql():
+        op.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+    yield
+    if _postgresql():
+        op.execute("RESET lock_timeout")
+
+
+def table_rows(table):
+    """Rows in ``table``: the planner's estimate on PostgreSQL, else counted."""
+    bind = _bind()
+    if bind.dialect.name == "postgresql":
+        estimate = sa.text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"
+        )
+        rows = bind.execute(estimate, {"t": table}).scalar()
+        # -1 until the table was first analyzed
+        if rows is not None and rows >= 0:
+            return rows
+    return bind.execute(sa.text(f"SELECT count(*) FROM {table}")).scalar()
+
+
+def create_index_concurrently(index_name, table, columns, unique=False, **kw):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL: reads and writes go on while the
+    index is built (it scans the table twice). A build that failed halfway
+    leaves an invalid index behind, which is dropped first, so the migration
+    can simply run again. Elsewhere a plain CREATE INDEX.
+    """
+    rows = table_rows(table)
+    if not _postgresql():
+        op.create_index(index_name, table, columns, unique=unique, **kw)
+        plan = MigrationPlan(
+            f"create index {index_name}",
+            table,
+            rows,
+            1,
+            _scan_seconds(rows),
+            _scan_seconds(rows),
+        )
+        return _report(plan)
+
+    with _autocommit():
+        if not is_dry_run() and _invalid_index(index_name):
+            op.drop_index(index_name, table_name=table, postgresql_concurrently=True)
+        op.create_index(
+            index_name,
+            table,
+            columns,
+            unique=unique,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+            **kw,
+        )
+    plan = MigrationPlan(
+        f"create index {index_name} concurrently",
+        table,
+        rows,
+        1,
+        0.0,
+        2 * _scan_seconds(rows),
+    )
+    return _report(plan)
+
+
+def _invalid_index(index_name):
+    invalid = sa.text(
+        "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:i)"
+    )
+    return bool(_bind().execute(invalid, {"i": index_name}).scalar())
+
+
+def drop_index_concurrently(index_name, table):
+    """DROP INDEX CONCURRENTLY on PostgreSQL, a plain DROP INDEX elsewhere."""
+    if not _postgresql():
+        op.drop_index(index_name, table_name=table)
+        return
+    with _autocommit():
+        op.drop_index(
+            index_name, table_name=table, postgresql_concurrently=True, if_exists=True
+        )
+
+
+def backfill_column(
+    table, column, value, key="id", batch_size=BATCH_SIZE, pause=BATCH_PAUSE_SECONDS
+):
+    """
+    UPDATE ``table`` SET ``column`` = ``value`` (an SQL expression) in ranges
+    of ``batch_size`` keys, each committed on its own on PostgreSQL with
+    ``pause`` seconds in between: row locks are held for one batch only, and
+    autovacuum and the replicas keep up. Only rows where ``column`` is still
+    NULL are updated, so an interrupted backfill continues when run again.
+    In a dry run, only the first batch is printed.
+    """
+    low, high = _bind().execute(
+        sa.text(f"SELECT min({key}), max({key}) FROM {table}")
+    ).one()
+    batches = 0 if low is None else math.ceil((high - low + 1) / batch_size)
+    rows = table_rows(table)
+    plan = MigrationPlan(
+        f"backfill {column}",
+        table,
+        rows,
+        batches,
+        0.0,
+        _scan_seconds(rows) + batches * pause,
+    )
+    statement = (
+        f"UPDATE {table} SET {column} = {value} "
+        f"WHERE {key} >= {{first}} AND {key} < {{last}} AND {column} IS NULL"
+    )
+    if is_dry_run():
+        if batches:
+            op.execute(statement.format(first=low, last=low + batch_size))
+        return _report(plan)
+
+    touched = 0
+    with _autocommit():
+        for first in range(low, high + 1, batch_size) if batches else ():
+            batch = statement.format(first=first, last=first + batch_size)
+            touched += _bind().execute(sa.text(batch)).rowcount
+            if pause:
+                time.sleep(pause)
+    return _report(plan._replace(rows=touched))
+
+
+def set_not_null(table, column):
+    """
+    Make ``column`` NOT NULL. On PostgreSQL through a CHECK constraint that is
+    added NOT VALID and validated without blocking writes, so SET NOT NULL
+    (12+) can skip its own scan under the exclusive lock.
+    """
+    if not _postgresql():
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, nullable=False)
+        return
+
+    check = f"{table}_{column}_not_null"
+    with _lock_timeout():
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {check} "
+            f"CHECK ({column} IS NOT NULL) NOT VALID"
+        )
+    with _autocommit():
+        op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}")
+    with _lock_timeout():
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {check}")
+
+
+def add_column_with_backfill(
+    table,
+    column,
+    value,
+    nullable=True,
+    key="id",
+    batch_size=BATCH_SIZE,
+    pause=BATCH_PAUSE_SECONDS,
+):
+    """
+    Add ``column`` (an sa.Column, nullable and without a server default, so
+    adding it only changes the catalog), fill it with backfill_column() and,
+    unless ``nullable``, make it NOT NULL with set_not_null().
+
+    Deploy the code that writes the new column first, or the rows the app
+    adds during the backfill stay NULL.
+    """
+    op.add_column(table, column)
+    plan = backfill_column(table, column.name, value, key, batch_size, pause)
+    if not nullable:
+        set_not_null(table, column.name)
+    return plan
+
+
+def change_column_type(
+    table,
+    column,
+    type_,
+    using=None,
+    key="id",
+    batch_size=BATCH_SIZE,
+    pause=BATCH_PAUSE_SECONDS,
+):
+    """
+    Change the type of ``column`` without rewriting ``table`` under an
+    exclusive lock, through a shadow column on PostgreSQL:
+
+    1. add {column}_new of ``type_``, kept in step with ``column`` by a
+       trigger for rows the app writes meanwhile
+    2. backfill it in batches with ``using`` (an SQL expression in which
+       {column} is the old value, by default a CAST)
+    3. make it NOT NULL if the column is, rebuild the column's indexes on it
+       concurrently and add its foreign keys NOT VALID and validate them
+    4. in one short transaction: drop the trigger and the old column, rename
+       the new column, its indexes and foreign keys to the old names
+
+    Primary key columns are not supported, nor are server defaults carried
+    over. Elsewhere (SQLite rewrites tables anyway) a plain ALTER.
+    """
+    bind = _bind()
+    inspector = sa.inspect(bind)
+    rows = table_rows(table)
+    if not _postgresql():
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, type_=type_)
+        plan = MigrationPlan(
+            f"change type of {column}",
+            table,
+            rows,
+            1,
+            _scan_seconds(rows),
+            _scan_seconds(rows),
+        )
+        return _report(plan)
+
+    if column in inspector.get_pk_constraint(table)["constrained_columns"]:
+        raise ValueError(f"{table}.{column} is a primary key column.")
+    nullable = next(
+        c["nullable"] for c in inspector.get_columns(table) if c["name"] == column
+    )
+    indexes = [i for i in inspector.get_indexes(table) if column in i["column_names"]]
+    foreign_keys = [
+        # PostgreSQL's own name for constraints created without one
+        {**fk, "name": fk["name"] or f"{table}_{column}_fkey"}
+        for fk in inspector.get_foreign_keys(table)
+        if column in fk["constrained_columns"]
+    ]
+
+    shadow = f"{column}_new"
+    sync = f"{table}_{shadow}_sync"
+    type_sql = type_.compile(dialect=op.get_context().dialect)
+    using = using or f"CAST({{column}} AS {type_sql})"
+
+    op.add_column(table, sa.Column(shadow, type_, nullable=True))
+    op.execute(
+        f"CREATE FUNCTION {sync}() RETURNS trigger AS $$ BEGIN "
+        f"NEW.{shadow} := {using.format(column=f'NEW.{column}')}; RETURN NEW; "
+        "END $$ LANGUAGE plpgsql"
+    )
+    op.execute(
+        f"CREATE TRIGGER {sync} BEFORE INSERT OR UPDATE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {sync}()"
+    )
+    backfill = backfill_column(
+        table, shadow, using.format(column=column), key, batch_size, pause
+    )
+    if not nullable:
+        set_not_null(table, shadow)
+
+    def on_shadow(columns):
+        return [shadow if c == column else c for c in columns]
+
+    for index in indexes:
+        create_index_concurrently(
+            f"{index['name']}_new",
+            table,
+            on_shadow(index["column_names"]),
+            unique=index["unique"],
+        )
+    for fk in foreign_keys:
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {fk['name']}_new "
+            f"FOREIGN KEY ({', '.join(on_shadow(fk['constrained_columns']))}) "
+            f"REFERENCES {fk['referred_table']} "
+            f"({', '.join(fk['referred_columns'])}) NOT VALID"
+        )
+        with _autocommit():
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {fk['name']}_new")
+
+    # The old column takes its indexes and foreign keys with it
+    with _lock_timeout():
+        op.execute(f"DROP TRIGGER {sync} ON {table}")
+        op.execute(f"DROP FUNCTION {sync}()")
+        op.drop_column(table, column)
+        op.alter_column(table, shadow, new_column_name=column)
+        for index in indexes:
+            op.execute(f"ALTER INDEX {index['name']}_new RENAME TO {index['name']}")
+        for fk in foreign_keys:
+            op.execute(
+                f"ALTER TABLE {table} "
+                f"RENAME CONSTRAINT {fk['name']}_new TO {fk['name']}"
+            )
+
+    plan = MigrationPlan(
+        f"change type of {column} through {shadow}",
+        table,
+        backfill.rows,
+        backfill.batches,
+        0.0,
+        backfill.seconds + (2 * len(indexes) + 1) * _scan_seconds(rows),
+    )
+    return _report(plan)
@@ -1,3 +1,6 @@
 from app.models.ad_group import AdGroup
 from app.models.ad_group_stats import AdGroupStats
 from app.models.campaign import Campaign
+from app.models.device import Device
+from app.models.import_job import ImportJob
+from app.models.aggregates import AggregateWatermark, StatsDailyRollup, StatsPrefixSum
@@ -1,4 +1,5 @@
 from app import db
+from app.models.search import name_search_indexes
 
 
 class AdGroup(db.Model):
@@ -17,3 +18,6 @@ class AdGroup(db.Model):
             "ad_group_name": self.ad_group_name,
             "campaign_id": self.campaign_id,
         }
+
+
+name_search_indexes(AdGroup.__table__.c.ad_group_name)
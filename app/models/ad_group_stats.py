@@ -1,25 +1,63 @@
 from app import db
-from sqlalchemy import BigInteger
+from app.models.device import device_by_name
+from sqlalchemy import BigInteger, func
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext.hybrid import hybrid_property
+
+# cost is stored in millionths of the account currency, so sums are exact
+MICROS = 1_000_000
+
+
+def to_micros(amount):
+    return int(round(amount * MICROS))
 
 
 class AdGroupStats(db.Model):
     __tablename__ = "ad_group_stats"
+    # 8-byte columns first, then 4- and 2-byte ones, so PostgreSQL needs no
+    # alignment padding between them
     id = db.Column(
         BigInteger().with_variant(db.Integer, "sqlite"),
         primary_key=True,
         autoincrement=True,
     )
-    date = db.Column(db.Date, nullable=False)
     ad_group_id = db.Column(
         db.BigInteger, db.ForeignKey("ad_group.ad_group_id"), nullable=False
     )
-    device = db.Column(db.String(50), nullable=False)
+    cost_micros = db.Column(db.BigInteger, nullable=False)
+    conversions = db.Column(db.Float, nullable=False)
+    date = db.Column(db.Date, nullable=False)
     impressions = db.Column(db.Integer, nullable=False)
     clicks = db.Column(db.Integer, nullable=False)
-    conversions = db.Column(db.Float, nullable=False)
-    cost = db.Column(db.Float, nullable=False)
+    device_id = db.Column(
+        db.SmallInteger, db.ForeignKey("device.device_id"), nullable=False
+    )
+
+    # Date range scans that group by ad group (rankings, per-day rollups)
+    __table_args__ = (db.Index("ix_ad_group_stats_date_ad_group_id", "date", "ad_group_id"),)
 
     ad_group = db.relationship("AdGroup", backref=db.backref("stats", lazy=True))
+    device_row = db.relationship("Device", lazy="joined", innerjoin=True)
+    # The device name, read and written like the old string column
+    device = association_proxy("device_row", "name", creator=device_by_name)
+
+    @hybrid_property
+    def cost(self):
+        return self.cost_micros / MICROS
+
+    @cost.inplace.setter
+    def _cost_setter(self, amount):
+        self.cost_micros = to_micros(amount)
+
+    @cost.inplace.expression
+    @classmethod
+    def _cost_expression(cls):
+        return cls.cost_micros / float(MICROS)
+
+    @classmethod
+    def total_cost(cls):
+        """SUM(cost), added up exactly in micros and converted once."""
+        return func.sum(cls.cost_micros) / float(MICROS)
 
     def serialize(self):
         return {
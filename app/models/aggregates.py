@@ -0,0 +1,73 @@
+from app import db
+
+
+class AggregateWatermark(db.Model):
+    """
+    How far a derived aggregate has caught up with ad_group_stats: the highest
+    AdGroupStats.id it includes, and when it was last refreshed. The row is
+    also the lock that makes refreshes of one aggregate run one at a time.
+    """
+
+    __tablename__ = "aggregate_watermark"
+    name = db.Column(db.String(50), primary_key=True)
+    max_stats_id = db.Column(db.BigInteger, nullable=False, default=0)
+    # ad_group_stats rows in the window below max_stats_id when it was set, to
+    # notice rows committed late (see app.prefix_sums.LATE_COMMIT_WINDOW)
+    window_rows = db.Column(
+        db.BigInteger, nullable=False, default=0, server_default="0"
+    )
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+class StatsPrefixSum(db.Model):
+    """
+    Running totals of ad_group_stats through ``date`` inclusive, for one
+    campaign or for all of them (campaign_id 0). The total over any date range
+    is the row at its end minus the row just before its start.
+
+    Cost is summed in micros like AdGroupStats.cost_micros, so a difference of
+    two large running totals is still exact to the cent. The averaged ratios
+    are kept as a sum and a count of the per-row ratio, so
+    AVG(cost / NULLIF(clicks, 0)) can be rebuilt for any range.
+    """
+
+    __tablename__ = "stats_prefix_sum"
+    campaign_id = db.Column(db.BigInteger, primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    row_count = db.Column(db.BigInteger, nullable=False)
+    cost_micros = db.Column(db.BigInteger, nullable=False)
+    clicks = db.Column(db.BigInteger, nullable=False)
+    conversions = db.Column(db.Float, nullable=False)
+    impressions = db.Column(db.BigInteger, nullable=False)
+    cost_per_click_sum = db.Column(db.Float, nullable=False)
+    cost_per_click_count = db.Column(db.BigInteger, nullable=False)
+    cost_per_conversion_sum = db.Column(db.Float, nullable=False)
+    cost_per_conversion_count = db.Column(db.BigInteger, nullable=False)
+
+
+class StatsDailyRollup(db.Model):
+    """
+    ad_group_stats summed per day and ad group (over devices). Kept up to date
+    incrementally by app/aggregates.py: only the (date, ad_group_id) keys of
+    rows added since the last refresh are recomputed.
+
+    The averaged ratios are kept as a sum and a count, as in StatsPrefixSum.
+    """
+
+    __tablename__ = "stats_daily_rollup"
+    date = db.Column(db.Date, primary_key=True)
+    ad_group_id = db.Column(db.BigInteger, primary_key=True)
+    campaign_id = db.Column(db.BigInteger, nullable=False)
+    row_count = db.Column(db.BigInteger, nullable=False)
+    cost_micros = db.Column(db.BigInteger, nullable=False)
+    clicks = db.Column(db.BigInteger, nullable=False)
+    conversions = db.Column(db.Float, nullable=False)
+    impressions = db.Column(db.BigInteger, nullable=False)
+    cost_per_click_sum = db.Column(db.Float, nullable=False)
+    cost_per_click_count = db.Column(db.BigInteger, nullable=False)
+    cost_per_conversion_sum = db.Column(db.Float, nullable=False)
+    cost_per_conversion_count = db.Column(db.BigInteger, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_stats_daily_rollup_campaign_id_date", "campaign_id", "date"),
+    )
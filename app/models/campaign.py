@@ -1,4 +1,5 @@
 from app import db
+from app.models.search import name_search_indexes
 
 
 class Campaign(db.Model):
@@ -6,10 +7,16 @@ class Campaign(db.Model):
     campaign_id = db.Column(db.BigInteger, primary_key=True)
     campaign_name = db.Column(db.String(255), nullable=False)
     campaign_type = db.Column(db.String(50), nullable=False)
+    # Bumped on every rename, for the optimistic check of the bulk rename
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
 
     def serialize(self):
         return {
             "campaign_id": self.campaign_id,
             "campaign_name": self.campaign_name,
             "campaign_type": self.campaign_type,
+            "version": self.version,
         }
+
+
+name_search_indexes(Campaign.__table__.c.campaign_name)
@@ -0,0 +1,47 @@
+from sqlalchemy import insert, select
+
+from app import db
+
+
+class Device(db.Model):
+    """Device names, referenced from ad_group_stats by a small integer."""
+
+    __tablename__ = "device"
+    device_id = db.Column(
+        db.SmallInteger().with_variant(db.Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    name = db.Column(db.String(50), nullable=False, unique=True)
+
+    def serialize(self):
+        return {"device_id": self.device_id, "name": self.name}
+
+
+def device_ids(names):
+    """
+    Map device names to their device_id, adding the names not seen before.
+    Meant for bulk writes, which set AdGroupStats.device_id directly.
+    """
+    names = set(names)
+    ids = dict(
+        db.session.execute(
+            select(Device.name, Device.device_id).where(Device.name.in_(names))
+        ).all()
+    )
+    missing = sorted(names - ids.keys())
+    if missing:
+        db.session.execute(insert(Device), [{"name": name} for name in missing])
+        return device_ids(names)
+    return ids
+
+
+def device_by_name(name):
+    """The Device for a name, added when new; lets ``AdGroupStats(device=...)`` work."""
+    device = db.session.execute(
+        select(Device).where(Device.name == name)
+    ).scalar_one_or_none()
+    if device is None:
+        device = Device(name=name)
+        db.session.add(device)
+    return device
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from app import db
+
+
+class ImportJob(db.Model):
+    """
+    An uploaded workbook waiting to be imported, being imported, or done.
+    The table doubles as the job queue (see app/importer.py).
+    """
+
+    __tablename__ = "import_job"
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    # Where the upload was stored, readable by the workers
+    path = db.Column(db.String(1024), nullable=False)
+    # queued -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    total_rows = db.Column(db.Integer)
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    # Rows that failed validation, written to the CSV at reject_path
+    rejected_rows = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    reject_path = db.Column(db.String(1024))
+    worker = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    # Bumped after every chunk, so jobs of dead workers can be spotted
+    updated_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def rows_per_second(self):
+        if not self.started_at or not self.rows_processed:
+            return None
+        end = self.finished_at or datetime.utcnow()
+        seconds = (end - self.started_at).total_seconds()
+        return round(self.rows_processed / seconds, 1) if seconds > 0 else None
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "total_rows": self.total_rows,
+            "rows_processed": self.rows_processed,
+            "rows_per_second": self.rows_per_second(),
+            "rejected_rows": self.rejected_rows,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
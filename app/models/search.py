@@ -0,0 +1,37 @@
+from sqlalchemy import DDL, event, func
+
+from app import db
+
+# pg_trgm provides the % operator, similarity() and the gin_trgm_ops opclass
+event.listen(
+    db.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
+def name_search_indexes(column):
+    """
+    Add the indexes backing the /search endpoint to a name column.
+
+    PostgreSQL gets a text_pattern_ops btree on lower(name), so
+    "lower(name) LIKE 'abc%'" is an index range scan whatever the collation,
+    and a trigram GIN index for fuzzy matching. SQLite only uses an index for
+    its (case-insensitive) LIKE when the index is NOCASE.
+    """
+    prefix = f"ix_{column.table.name}_{column.name}"
+    lower = f"{column.name}_lower"
+    return (
+        db.Index(
+            f"{prefix}_pattern",
+            func.lower(column).label(lower),
+            postgresql_ops={lower: "text_pattern_ops"},
+        ).ddl_if(dialect="postgresql"),
+        db.Index(
+            f"{prefix}_trgm",
+            column,
+            postgresql_using="gin",
+            postgresql_ops={column.name: "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        db.Index(f"{prefix}_nocase", column.collate("NOCASE")).ddl_if(dialect="sqlite"),
+    )
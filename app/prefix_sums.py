@@ -0,0 +1,332 @@
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import BigInteger, cast, delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import AdGroup, AdGroupStats, AggregateWatermark, StatsPrefixSum
+from app.models.ad_group_stats import MICROS
+from app.steps import Query, run_steps
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "prefix_sums"
+# max_stats_id of a watermark row created by lock_watermark() before the
+# aggregate's first refresh
+NEVER_REFRESHED = -1
+# Ids are handed out on insert, not on commit, so an import that commits late
+# can add rows below a watermark already set. The rows in this many ids below
+# a watermark are counted when it is set; a different count later means rows
+# committed late, and the next refresh re-reads the whole window. Rows
+# committed later than this many ids are not noticed (use a full refresh).
+LATE_COMMIT_WINDOW = 10_000
+# campaign_id of the running totals over all campaigns
+ALL_CAMPAIGNS = 0
+
+SUM_COLUMNS = [
+    "row_count",
+    "cost_micros",
+    "clicks",
+    "conversions",
+    "impressions",
+    "cost_per_click_sum",
+    "cost_per_click_count",
+    "cost_per_conversion_sum",
+    "cost_per_conversion_count",
+]
+INTEGER_COLUMNS = [
+    "row_count",
+    "cost_micros",
+    "clicks",
+    "impressions",
+    "cost_per_click_count",
+    "cost_per_conversion_count",
+]
+
+# Same fields as a row of services.period_totals_statement()
+PeriodTotals = namedtuple(
+    "PeriodTotals",
+    [
+        "total_cost",
+        "total_clicks",
+        "total_conversions",
+        "total_impressions",
+        "avg_cost_per_click",
+        "avg_cost_per_conversion",
+        "avg_click_through_rate",
+        "avg_conversion_rate",
+    ],
+)
+
+
+def max_stats_id():
+    return db.session.execute(select(func.max(AdGroupStats.id))).scalar() or 0
+
+
+def window_rows_statement(max_id):
+    """Number of ad_group_stats rows in the LATE_COMMIT_WINDOW up to ``max_id``."""
+    return select(func.count()).where(
+        AdGroupStats.id > max_id - LATE_COMMIT_WINDOW, AdGroupStats.id <= max_id
+    )
+
+
+def create_watermark_statement(name, dialect_name):
+    """INSERT of a NEVER_REFRESHED watermark for ``name`` unless it exists."""
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    return (
+        dialect.insert(AggregateWatermark)
+        .values(
+            name=name,
+            max_stats_id=NEVER_REFRESHED,
+            window_rows=0,
+            updated_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+
+
+def lock_watermark(name):
+    """
+    Lock the watermark row of the aggregate ``name`` until the end of the
+    transaction, creating it if needed, so refreshes of one aggregate run one
+    at a time (SELECT ... FOR UPDATE; SQLite serializes writers anyway).
+    Returns the watermark, or None when the aggregate was never refreshed.
+    """
+    db.session.execute(create_watermark_statement(name, db.engine.dialect.name))
+    watermark = db.session.execute(
+        select(AggregateWatermark)
+        .where(AggregateWatermark.name == name)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    ).scalar_one()
+    if watermark.max_stats_id == NEVER_REFRESHED:
+        return None
+    return watermark
+
+
+def stats_to_refresh(watermark):
+    """
+    What a refresh from a locked ``watermark`` (None for a full refresh) has
+    to read: (the highest ad_group_stats id, the rows in the window up to it,
+    the id above which rows are new, None for all). The window is counted
+    first, so a row committed while the refresh runs is noticed by the next
+    one rather than missed.
+    """
+    latest_id = max_stats_id()
+    window_rows = db.session.execute(window_rows_statement(latest_id)).scalar()
+    if watermark is None:
+        return latest_id, window_rows, None
+
+    after = watermark.max_stats_id
+    late = db.session.execute(window_rows_statement(after)).scalar()
+    if late != watermark.window_rows:
+        logger.info(f"Rows committed late below stats id {after}, re-reading them")
+        after -= LATE_COMMIT_WINDOW
+    return latest_id, window_rows, after
+
+
+def set_watermark(name, max_id, window_rows):
+    """Move the (locked) watermark of ``name`` to ``max_id``."""
+    db.session.execute(
+        update(AggregateWatermark)
+        .where(AggregateWatermark.name == name)
+        .values(
+            max_stats_id=max_id, window_rows=window_rows, updated_at=datetime.utcnow()
+        )
+    )
+
+
+def sum_columns():
+    return [getattr(StatsPrefixSum, column) for column in SUM_COLUMNS]
+
+
+def daily_sums_statement(since=None):
+    """Per campaign and day sums of the prefix sum columns, from ``since`` on."""
+    cost_per_click = AdGroupStats.cost / func.nullif(AdGroupStats.clicks, 0)
+    cost_per_conversion = AdGroupStats.cost / func.nullif(AdGroupStats.conversions, 0)
+    query = (
+        select(
+            AdGroup.campaign_id,
+            AdGroupStats.date,
+            func.count().label("row_count"),
+            # bigint, where PostgreSQL would sum into numeric
+            cast(func.sum(AdGroupStats.cost_micros), BigInteger).label("cost_micros"),
+            func.sum(AdGroupStats.clicks).label("clicks"),
+            func.sum(AdGroupStats.conversions).label("conversions"),
+            func.sum(AdGroupStats.impressions).label("impressions"),
+            func.coalesce(func.sum(cost_per_click), 0).label("cost_per_click_sum"),
+            func.count(cost_per_click).label("cost_per_click_count"),
+            func.coalesce(func.sum(cost_per_conversion), 0).label(
+                "cost_per_conversion_sum"
+            ),
+            func.count(cost_per_conversion).label("cost_per_conversion_count"),
+        )
+        .join(AdGroup)
+        .group_by(AdGroup.campaign_id, AdGroupStats.date)
+    )
+    if since is not None:
+        query = query.where(AdGroupStats.date >= since)
+    return query
+
+
+def base_prefix_statement(since):
+    """The last running totals before ``since`` of every campaign."""
+    last_dates = (
+        select(StatsPrefixSum.campaign_id, func.max(StatsPrefixSum.date))
+        .where(StatsPrefixSum.date < since)
+        .group_by(StatsPrefixSum.campaign_id)
+    )
+    return select(StatsPrefixSum.campaign_id, *sum_columns()).where(
+        tuple_(StatsPrefixSum.campaign_id, StatsPrefixSum.date).in_(last_dates)
+    )
+
+
+def refresh_prefix_sums(full=False):
+    """
+    Bring stats_prefix_sum up to date with ad_group_stats and commit.
+
+    Only days from the earliest date among rows added since the watermark are
+    recomputed, on top of the running totals of the day before, so appending
+    recent days stays cheap. Rows updated or deleted in place are not noticed;
+    use ``full=True`` (flask refresh-prefix-sums --full) after such changes.
+    Returns the number of prefix rows written.
+    """
+    watermark = lock_watermark(WATERMARK_NAME)
+    latest_id, window_rows, after = stats_to_refresh(None if full else watermark)
+
+    if after is None:
+        since = None
+    elif after >= latest_id:
+        db.session.commit()
+        return 0
+    else:
+        since = db.session.execute(
+            select(func.min(AdGroupStats.date)).where(AdGroupStats.id > after)
+        ).scalar()
+
+    daily = pd.DataFrame(
+        db.session.execute(daily_sums_statement(since)).all(),
+        columns=["campaign_id", "date", *SUM_COLUMNS],
+    )
+    overall = daily.groupby("date", as_index=False)[SUM_COLUMNS].sum()
+    overall.insert(0, "campaign_id", ALL_CAMPAIGNS)
+    daily = pd.concat([daily, overall], ignore_index=True).sort_values(
+        ["campaign_id", "date"]
+    )
+
+    prefix = daily[["campaign_id", "date"]].copy()
+    prefix[SUM_COLUMNS] = daily.groupby("campaign_id")[SUM_COLUMNS].cumsum()
+
+    if since is None:
+        db.session.execute(delete(StatsPrefixSum))
+    else:
+        base = pd.DataFrame(
+            db.session.execute(base_prefix_statement(since)).all(),
+            columns=["campaign_id", *SUM_COLUMNS],
+        ).set_index("campaign_id")
+        offsets = base.reindex(prefix["campaign_id"]).fillna(0)
+        # Column by column, so the integer sums are not added as floats
+        offsets = offsets.astype({c: "int64" for c in INTEGER_COLUMNS})
+        for column in SUM_COLUMNS:
+            prefix[column] += offsets[column].to_numpy()
+        db.session.execute(delete(StatsPrefixSum).where(StatsPrefixSum.date >= since))
+
+    records = prefix.astype({c: "int64" for c in INTEGER_COLUMNS}).to_dict("records")
+    if records:
+        db.session.execute(insert(StatsPrefixSum), records)
+    set_watermark(WATERMARK_NAME, latest_id, window_rows)
+    db.session.commit()
+
+    logger.info(f"Refreshed {len(records)} prefix sum rows from {since or 'the start'}")
+    return len(records)
+
+
+def fresh_watermark_steps(name):
+    """
+    Steps returning the watermark of the aggregate ``name`` when the aggregate
+    includes every ad_group_stats row, else None: no row above it, and as many
+    in the window below it as when it was set (see LATE_COMMIT_WINDOW).
+    """
+    watermark = yield Query(
+        select(
+            AggregateWatermark.max_stats_id,
+            AggregateWatermark.window_rows,
+            AggregateWatermark.updated_at,
+        ).where(AggregateWatermark.name == name),
+        "first",
+    )
+    if watermark is None:
+        return None
+    latest_id, window_rows = yield Query(
+        select(
+            select(func.max(AdGroupStats.id)).scalar_subquery(),
+            window_rows_statement(watermark.max_stats_id).scalar_subquery(),
+        ),
+        "one",
+    )
+    if watermark.max_stats_id < (latest_id or 0):
+        return None
+    if window_rows != watermark.window_rows:
+        return None
+    return watermark
+
+
+def prefix_sums_fresh():
+    """True when stats_prefix_sum includes every ad_group_stats row."""
+    return run_steps(fresh_watermark_steps(WATERMARK_NAME)) is not None
+
+
+def prefix_at_statement(campaign_id, on_or_before=None, before=None):
+    """The running totals row of the last day up to a date (PK lookup)."""
+    query = select(*sum_columns()).where(StatsPrefixSum.campaign_id == campaign_id)
+    if on_or_before is not None:
+        query = query.where(StatsPrefixSum.date <= on_or_before)
+    if before is not None:
+        query = query.where(StatsPrefixSum.date < before)
+    return query.order_by(StatsPrefixSum.date.desc()).limit(1)
+
+
+def period_totals_from_prefix(start, end, campaign_id=None):
+    """
+    Totals of ad_group_stats between two dates (inclusive) from two lookups,
+    shaped like a period_totals_statement() row. None when no row falls in
+    the range, where the SQL path returns a row of NULLs.
+    """
+    return run_steps(period_totals_from_prefix_steps(start, end, campaign_id))
+
+
+def period_totals_from_prefix_steps(start, end, campaign_id=None):
+    """period_totals_from_prefix() as steps (see app.steps)."""
+    scope = ALL_CAMPAIGNS if campaign_id is None else campaign_id
+    through_end = yield Query(prefix_at_statement(scope, on_or_before=end), "first")
+    if through_end is None:
+        return None
+    before_start = yield Query(prefix_at_statement(scope, before=start), "first")
+
+    totals = dict(zip(SUM_COLUMNS, through_end))
+    if before_start is not None:
+        for column, value in zip(SUM_COLUMNS, before_start):
+            totals[column] -= value
+    if totals["row_count"] <= 0:
+        return None
+
+    def divide(numerator, denominator):
+        return numerator / denominator if denominator else None
+
+    return PeriodTotals(
+        total_cost=totals["cost_micros"] / MICROS,
+        total_clicks=totals["clicks"],
+        total_conversions=totals["conversions"],
+        total_impressions=totals["impressions"],
+        avg_cost_per_click=divide(
+            totals["cost_per_click_sum"], totals["cost_per_click_count"]
+        ),
+        avg_cost_per_conversion=divide(
+            totals["cost_per_conversion_sum"], totals["cost_per_conversion_count"]
+        ),
+        avg_click_through_rate=divide(totals["clicks"], totals["impressions"]),
+        avg_conversion_rate=divide(totals["conversions"], totals["clicks"]),
+    )
@@ -1,17 +1,35 @@
 from flask import Blueprint
 from .controllers import (
+    health_main,
+    ready_main,
     test_app_main,
     get_campaigns_main,
     update_campaign_name_main,
+    bulk_update_campaign_names_main,
     performance_time_series_main,
     compare_performance_main,
+    search_main,
+    rankings_main,
+    anomalies_main,
+    create_import_job_main,
+    get_import_job_main,
+    get_import_job_rejects_main,
 )
 
 bp = Blueprint("main", __name__)
 
+bp.route("/health", methods=["GET"])(health_main)
+bp.route("/ready", methods=["GET"])(ready_main)
 bp.route("/test", methods=["GET"])(test_app_main)
 bp.route("/campaigns", methods=["GET"])(get_campaigns_main)
 # bp.route("/campaign", methods=["POST"])(update_campaign_name_main)
 bp.route("/campaign", methods=["PUT"])(update_campaign_name_main)
+bp.route("/campaigns", methods=["PUT"])(bulk_update_campaign_names_main)
 bp.route("/performance-time-series", methods=["GET"])(performance_time_series_main)
 bp.route("/compare-performance", methods=["GET"])(compare_performance_main)
+bp.route("/search", methods=["GET"])(search_main)
+bp.route("/rankings", methods=["GET"])(rankings_main)
+bp.route("/anomalies", methods=["GET"])(anomalies_main)
+bp.route("/imports", methods=["POST"])(create_import_job_main)
+bp.route("/imports/<int:job_id>", methods=["GET"])(get_import_job_main)
+bp.route("/imports/<int:job_id>/rejects", methods=["GET"])(get_import_job_rejects_main)
@@ -0,0 +1,241 @@
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = "replica_"
+
+_read_only = contextvars.ContextVar("read_only", default=False)
+# Wall-clock time of the current client's last write, from its session cookie
+_last_write = contextvars.ContextVar("last_write", default=None)
+
+
+def init_replica_router(app):
+    """
+    Create an engine for every URL in REPLICA_DATABASE_URLS ("replica_0", ...)
+    and the router choosing between them. The engines are owned by the router
+    rather than registered as Flask-SQLAlchemy binds, because bind metadata is
+    shared by every app using the same db object and create_all() would then
+    expect replicas everywhere.
+    """
+    options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+    engines = {
+        f"{REPLICA_BIND_PREFIX}{i}": create_engine(url, **options)
+        for i, url in enumerate(app.config.get("REPLICA_DATABASE_URLS") or [])
+    }
+    app.extensions["replica_router"] = ReplicaRouter(
+        engines,
+        health_check_interval=app.config.get("REPLICA_HEALTH_CHECK_INTERVAL", 30),
+        read_after_write_window=app.config.get("REPLICA_READ_AFTER_WRITE_SECONDS", 0),
+    )
+    if engines:
+        app.before_request(_load_last_write)
+        app.after_request(_save_last_write)
+
+
+def _load_last_write():
+    # Set on every request, so nothing carries over from the thread's last one
+    _last_write.set(session.get("last_write"))
+
+
+def _save_last_write(response):
+    # Only the client that wrote reads from the primary for a while
+    last_write = _last_write.get()
+    if last_write is not None and last_write != session.get("last_write"):
+        session["last_write"] = last_write
+    return response
+
+
+def pinned_to_primary():
+    """
+    Whether the current client reads from the primary because it wrote within
+    REPLICA_READ_AFTER_WRITE_SECONDS, see RoutingSession.
+    """
+    router = current_app.extensions.get("replica_router")
+    return router is not None and bool(router.engines) and router.recently_written()
+
+
+def read_only(fn):
+    """
+    Mark a service function as read-only, so its queries may be served by a
+    replica. The flag lives in a context variable, so sub-queries run through
+    app.executor.run_parallel inherit it.
+    """
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Round-robin over replica engines with health checks.
+
+    A replica that raised a connection error while serving a query, or failed
+    a "SELECT 1" ping in check(), is skipped for ``health_check_interval``
+    seconds and then tried again. Requests only look at that cached state, the
+    pings run from warm_up(). When no replica is healthy, choose() returns None
+    and the caller falls back to the primary.
+    """
+
+    def __init__(self, engines, health_check_interval=30, read_after_write_window=0):
+        self.engines = engines
+        self.health_check_interval = health_check_interval
+        self.read_after_write_window = read_after_write_window
+        self._cycle = itertools.cycle(list(engines))
+        self._lock = threading.Lock()
+        self._checked_at = {}
+        self._healthy = {}
+
+        for key, engine in engines.items():
+            event.listen(engine, "handle_error", self._on_error(key))
+
+    def _on_error(self, key):
+        def handle_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                self.mark_unhealthy(key)
+
+        return handle_error
+
+    def mark_unhealthy(self, key):
+        logger.warning(f"Replica {key} marked unhealthy.")
+        with self._lock:
+            self._healthy[key] = False
+            self._checked_at[key] = time.monotonic()
+
+    def recently_written(self):
+        """Whether the current client wrote within the read-after-write window."""
+        last_write = _last_write.get()
+        return (
+            last_write is not None
+            and time.time() - last_write < self.read_after_write_window
+        )
+
+    def is_healthy(self, key):
+        """Cached health of a replica, without touching the database."""
+        with self._lock:
+            healthy = self._healthy.get(key, True)
+            waited = time.monotonic() - self._checked_at.get(key, 0)
+            if not healthy and waited >= self.health_check_interval:
+                # Give it another chance; a failing read marks it unhealthy again
+                self._healthy[key] = healthy = True
+            return healthy
+
+    def check(self, key):
+        """Ping a replica with SELECT 1 and record the result."""
+        try:
+            with self.engines[key].connect() as connection:
+                connection.execute(text("SELECT 1"))
+            healthy = True
+        except DBAPIError as e:
+            logger.warning(f"Replica {key} failed health check: {e}")
+            healthy = False
+
+        with self._lock:
+            self._healthy[key] = healthy
+            self._checked_at[key] = time.monotonic()
+        return healthy
+
+    def choose(self):
+        """Key of the next healthy replica, or None when there is none."""
+        for _ in range(len(self.engines)):
+            with self._lock:
+                key = next(self._cycle)
+            if self.is_healthy(key):
+                return key
+        return None
+
+    def status(self):
+        return {
+            key: {"healthy": self._healthy.get(key), "pool": engine.pool.status()}
+            for key, engine in self.engines.items()
+        }
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads made inside @read_only functions to a replica.
+
+    Writes, and every read in a session that has already flushed a write,
+    stay on the primary. So do reads by a client within
+    REPLICA_READ_AFTER_WRITE_SECONDS of its own last write. A session sticks to
+    the replica it first picked, so its queries see one consistent replica, and
+    run_parallel() hands that choice on to the sessions of its tasks. A read
+    failing on a replica with an OperationalError is retried once on the
+    primary, where the session then stays.
+    """
+
+    def execute(self, *args, **kwargs):
+        return self._retry_on_primary(super().execute, args, kwargs)
+
+    def scalar(self, *args, **kwargs):
+        return self._retry_on_primary(super().scalar, args, kwargs)
+
+    def scalars(self, *args, **kwargs):
+        return self._retry_on_primary(super().scalars, args, kwargs)
+
+    def _retry_on_primary(self, method, args, kwargs):
+        try:
+            return method(*args, **kwargs)
+        except OperationalError as e:
+            key = self.info.get("replica")
+            if key is None or self.info.get("wrote") or not _read_only.get():
+                raise
+            logger.warning(f"Read on replica {key} failed, retrying on primary: {e}")
+            self.rollback()
+            self.info["replica"] = None
+            return method(*args, **kwargs)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not _read_only.get():
+            return primary
+        if self._flushing or self.info.get("wrote") or isinstance(clause, UpdateBase):
+            return primary
+
+        router = current_app.extensions.get("replica_router")
+        if router is None or not router.engines or router.recently_written():
+            return primary
+
+        # None once chosen means the primary, as no replica was healthy
+        key = self.info.get("replica")
+        if "replica" not in self.info or (
+            key is not None and not router.is_healthy(key)
+        ):
+            key = router.choose()
+            self.info["replica"] = key
+        return router.engines[key] if key is not None else primary
+
+
+def _record_write(session):
+    session.info["wrote"] = True
+    if has_request_context():
+        _last_write.set(time.time())
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    _record_write(session)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _after_dml(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _record_write(orm_execute_state.session)
@@ -1,13 +1,54 @@
 from app.models.ad_group import AdGroup
-from app.models.ad_group_stats import AdGroupStats
+from app.models.ad_group_stats import MICROS, AdGroupStats
 from app.models.campaign import Campaign
+from app.models.import_job import ImportJob
+from app.models.aggregates import StatsDailyRollup
 from app import db
+from app.aggregates import DAILY_ROLLUP
+from app.anomalies import ANOMALY_METHODS, ANOMALY_METRICS, detect_anomalies_steps
+from app.columnar import get_columnar_store
+from app.health import check_database
+from app.importer import enqueue_import_statement
+from app.prefix_sums import (
+    WATERMARK_NAME,
+    fresh_watermark_steps,
+    period_totals_from_prefix_steps,
+)
+from app.routing import read_only
+from app.singleflight import coalesce
+from app.steps import Query, run_steps
 import os
 import logging
-from flask import jsonify, request
+import math
+import uuid
+from collections import defaultdict, namedtuple
+from itertools import chain
+
+import numpy as np
+from flask import current_app, jsonify, request, send_file
 from logging.handlers import RotatingFileHandler
+from werkzeug.utils import secure_filename
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import select, func
+from sqlalchemy import (
+    select,
+    update,
+    text,
+    func,
+    and_,
+    or_,
+    case,
+    cast,
+    extract,
+    literal,
+    literal_column,
+    Float,
+    Integer,
+    BigInteger,
+    String,
+    Text,
+    JSON,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from datetime import timedelta, datetime
 
 
@@ -32,79 +73,2056 @@ logger.setLevel(logging.INFO)
 logger.addHandler(handler)
 
 
-def test_app():
-    ad_groups = db.session.execute(select(AdGroup)).scalars().all()
+DATE_FORMAT = "%Y-%m-%d"
+AGGREGATE_BY_CHOICES = ["day", "week", "month", "quarter"]
+SEARCH_MODE_CHOICES = ["prefix", "fuzzy"]
+SEARCH_TYPE_CHOICES = ["campaign", "ad_group"]
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+LIKE_ESCAPE = "/"
+RANKING_METRIC_CHOICES = ["cost", "conversions", "cpc", "cpa", "ctr"]
+RANKING_LEVEL_CHOICES = ["ad_group", "campaign"]
+RANKING_DEFAULT_LIMIT = 10
+RANKING_MAX_LIMIT = 100
+# Summed metrics of the time series that rolling windows and lags apply to
+WINDOW_METRICS = ["total_cost", "total_clicks", "total_conversions", "total_impressions"]
+WINDOW_MAX_PERIODS = 366
+SPLIT_BY_CHOICES = ["campaign"]
+# Columns of campaign_series_statement(): averaged ratios come as sums and
+# counts of the per-row ratio, so only numbers need to be pivoted
+SERIES_COLUMNS = [
+    "period_number",
+    "campaign_id",
+    "cost_micros",
+    "clicks",
+    "conversions",
+    "impressions",
+    "cost_per_click_sum",
+    "cost_per_click_count",
+    "cost_per_conversion_sum",
+    "cost_per_conversion_count",
+]
+ANOMALY_DEFAULT_DAYS = 90
+ANOMALY_DEFAULT_LIMIT = 100
+ANOMALY_MAX_LIMIT = 1000
+
+TimeSeriesParams = namedtuple(
+    "TimeSeriesParams",
+    [
+        "aggregate_by",
+        "campaigns",
+        "start_date",
+        "end_date",
+        "max_points",
+        "rolling",
+        "lag",
+        "split_by",
+    ],
+    defaults=[None, (), (), None],
+)
+CompareParams = namedtuple(
+    "CompareParams",
+    ["start_date", "end_date", "before_start_date", "before_end_date", "campaign_id"],
+)
+RenameItem = namedtuple("RenameItem", ["campaign_id", "new_name", "expected_version"])
+AnomalyParams = namedtuple(
+    "AnomalyParams",
+    ["metrics", "method", "threshold", "start_date", "end_date", "campaign_id", "limit"],
+)
+SearchParams = namedtuple("SearchParams", ["query", "mode", "types", "limit"])
+# What plan_time_series() estimates from: the first and last day with data,
+# the number of campaigns and the rows the query scans per day of data
+TimeSeriesBounds = namedtuple(
+    "TimeSeriesBounds", ["first_date", "last_date", "campaigns", "rows_per_day"]
+)
+RankingParams = namedtuple(
+    "RankingParams",
+    [
+        "metric",
+        "order",
+        "level",
+        "limit",
+        "start_date",
+        "end_date",
+        "campaign_id",
+        "per_campaign",
+    ],
+)
+# What a step function answers (see app.steps): a body with its status and
+# headers, where kind says how to send the body: "json" encoded by the
+# front-end, "json_text" as built by the db, or a "file" Download
+Reply = namedtuple(
+    "Reply", ["body", "status", "headers", "kind"], defaults=[200, None, "json"]
+)
+Download = namedtuple("Download", ["path", "mimetype", "download_name"])
+
+
+class ServiceError(Exception):
+    """
+    A request that cannot be served. Carries the JSON key and HTTP status of the
+    error response, so the Flask views and the ASGI app answer the same way.
+    """
 
-    return [ad_group.serialize() for ad_group in ad_groups]
+    def __init__(self, message, status=400, key="error"):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.key = key
 
+    def to_body(self):
+        return {self.key: self.message}
 
-def get_campaigns(**kwargs):
+
+# The helpers below hold the business logic shared by the Flask views in this
+# module and the async views in app/asgi.py. They parse and validate input,
+# build statements and format rows, and the step functions (the *_steps
+# below, see app.steps) chain them into whole endpoints, but never touch
+# request or db.session.
+
+
+def parse_rename_payload(data):
     """
-    Retrieve all campaigns along with their related ad groups and statistics.
+    Validate an update_campaign_name payload and return (campaign_id, new_name).
     """
-    try:
-        logger.info("Fetching all Campaigns.")
-        campaigns = Campaign.query.all()
+    if not data:
+        logger.warning("No JSON payload provided.")
+        raise ServiceError("No input data provided.", key="message")
 
-        if not campaigns:
-            logger.warning("No campaigns found.")
-            return jsonify({"message": "No campaigns found."}), 404
+    campaign_id = data.get("campaign_id")
+    new_name = data.get("new_name")
+
+    if not campaign_id or not new_name:
+        logger.warning("Missing required fields: campaign_id or new_name.")
+        raise ServiceError(
+            "Missing required fields: campaign_id and new_name.", key="message"
+        )
 
-        result = []
+    return campaign_id, new_name
 
-        for campaign in campaigns:
-            logger.info(f"Processing Campaign ID: {campaign.campaign_id}")
-            ad_groups = (
-                db.session.execute(
-                    select(AdGroup).where(AdGroup.campaign_id == campaign.campaign_id)
+
+def parse_bulk_rename_payload(data, max_items):
+    """
+    Validate a bulk rename payload, {"renames": [{"campaign_id", "new_name",
+    "version"?}, ...]}, into a list of RenameItem.
+    """
+    if not data:
+        logger.warning("No JSON payload provided.")
+        raise ServiceError("No input data provided.", key="message")
+
+    renames = data.get("renames")
+    if not isinstance(renames, list) or not renames:
+        logger.warning("Missing or empty 'renames' list.")
+        raise ServiceError("renames must be a non-empty list.", key="message")
+
+    if len(renames) > max_items:
+        logger.warning(f"Too many renames in one request: {len(renames)}")
+        raise ServiceError(f"At most {max_items} renames per request.", key="message")
+
+    items = []
+    seen = set()
+    for rename in renames:
+        rename = rename if isinstance(rename, dict) else {}
+        campaign_id = rename.get("campaign_id")
+        new_name = rename.get("new_name")
+        version = rename.get("version")
+
+        if (
+            not isinstance(campaign_id, int)
+            or isinstance(campaign_id, bool)
+            or not isinstance(new_name, str)
+            or not new_name
+            or len(new_name) > 255
+        ):
+            logger.warning(f"Invalid rename item: {rename}")
+            raise ServiceError(
+                "Each rename needs an integer campaign_id and a new_name of at most 255 characters.",
+                key="message",
+            )
+        if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+            logger.warning(f"Invalid version in rename item: {rename}")
+            raise ServiceError("version must be an integer.", key="message")
+        if campaign_id in seen:
+            logger.warning(f"Duplicate campaign_id in renames: {campaign_id}")
+            raise ServiceError(
+                f"Duplicate campaign_id in renames: {campaign_id}.", key="message"
+            )
+
+        seen.add(campaign_id)
+        items.append(RenameItem(campaign_id, new_name, version))
+
+    return items
+
+
+def parse_periods(value, name):
+    """Comma-separated period counts (1..WINDOW_MAX_PERIODS), sorted and unique."""
+    if not value:
+        return ()
+    items = [item.strip() for item in value.split(",")]
+    if not all(item.isdigit() and 1 <= int(item) <= WINDOW_MAX_PERIODS for item in items):
+        raise ServiceError(
+            f"{name} must be comma-separated integers from 1 to {WINDOW_MAX_PERIODS}."
+        )
+    return tuple(sorted({int(item) for item in items}))
+
+
+def parse_time_series_params(args):
+    """
+    Validate performance_time_series query parameters into TimeSeriesParams.
+    """
+    aggregate_by = args.get("aggregate_by")
+    campaigns_param = args.get("campaigns")
+    start_date = args.get("start_date")
+    end_date = args.get("end_date")
+    max_points = args.get("max_points")
+
+    # Input Validation
+    if not aggregate_by:
+        logger.warning("Missing 'aggregate_by' parameter.")
+        raise ServiceError("aggregate_by parameter is required.")
+
+    if aggregate_by not in AGGREGATE_BY_CHOICES:
+        logger.warning(f"Invalid 'aggregate_by' parameter: {aggregate_by}")
+        raise ServiceError("aggregate_by must be one of: day, week, month, quarter.")
+
+    # Handle campaign filtering (comma-separated values)
+    campaigns = ()
+    if campaigns_param:
+        try:
+            # Sorted and de-duplicated, so equal filters give equal params
+            campaigns = tuple(
+                sorted(
+                    {
+                        int(c.strip())
+                        for c in campaigns_param.split(",")
+                        if c.strip().isdigit()
+                    }
                 )
-                .scalars()
-                .all()
+            )
+            logger.info(f"Filtering by Campaign IDs: {list(campaigns)}")
+        except ValueError:
+            logger.warning("Invalid format for 'campaigns' parameter.")
+            raise ServiceError(
+                "Invalid format for campaigns parameter. Must be comma-separated integers."
             )
 
-            ad_group_count = len(ad_groups)
-            ad_group_names = [ag.ad_group_name for ag in ad_groups]
+    # Validate and parse dates
+    start_date_obj = end_date_obj = None
+    if start_date:
+        try:
+            start_date_obj = datetime.strptime(start_date, DATE_FORMAT)
+            logger.info(f"Filtering from start_date: {start_date}")
+        except ValueError:
+            logger.warning("Invalid 'start_date' format.")
+            raise ServiceError("Invalid start_date format. Use YYYY-MM-DD.")
 
-            total_cost = 0
-            total_conversions = 0
-            months = set()
+    if end_date:
+        try:
+            end_date_obj = datetime.strptime(end_date, DATE_FORMAT)
+            logger.info(f"Filtering up to end_date: {end_date}")
+        except ValueError:
+            logger.warning("Invalid 'end_date' format.")
+            raise ServiceError("Invalid end_date format. Use YYYY-MM-DD.")
+
+    if max_points is not None:
+        if not max_points.isdigit() or int(max_points) < 1:
+            raise ServiceError("max_points must be a positive integer.")
+        max_points = int(max_points)
+
+    # Rolling averages over the last N periods, changes against N periods back
+    rolling = parse_periods(args.get("rolling"), "rolling")
+    lag = parse_periods(args.get("lag"), "lag")
+
+    # One series per campaign instead of one for all of them
+    split_by = args.get("split_by") or None
+    if split_by is not None:
+        if split_by not in SPLIT_BY_CHOICES:
+            raise ServiceError("split_by must be one of: campaign.")
+        if rolling or lag:
+            raise ServiceError("rolling and lag cannot be combined with split_by.")
+
+    return TimeSeriesParams(
+        aggregate_by,
+        campaigns,
+        start_date_obj,
+        end_date_obj,
+        max_points,
+        rolling,
+        lag,
+        split_by,
+    )
+
+
+def parse_compare_params(args):
+    """
+    Validate compare_performance query parameters and work out the 'before'
+    period, returning CompareParams.
+    """
+    start_date = args.get("start_date")
+    end_date = args.get("end_date")
+    compare_mode = args.get("compare_mode")
+    campaign_id = args.get("campaign_id")
+
+    # Input Validation
+    if not start_date or not end_date:
+        logger.warning("Missing 'start_date' or 'end_date' parameters.")
+        raise ServiceError("start_date and end_date parameters are required.")
+
+    if campaign_id is not None:
+        if not campaign_id.isdigit():
+            logger.warning(f"Invalid 'campaign_id' parameter: {campaign_id}")
+            raise ServiceError("campaign_id must be an integer.")
+        campaign_id = int(campaign_id)
+
+    if compare_mode not in ["preceding", "previous_month"]:
+        logger.warning(f"Invalid 'compare_mode' parameter: {compare_mode}")
+        raise ServiceError(
+            'Invalid compare_mode. Must be "preceding" or "previous_month".'
+        )
 
-            for ad_group in ad_groups:
-                ad_group_stats = (
-                    db.session.execute(
-                        select(AdGroupStats).where(
-                            AdGroupStats.ad_group_id == ad_group.ad_group_id
-                        )
-                    )
-                    .scalars()
-                    .all()
+    # Convert dates
+    try:
+        start_date_obj = datetime.strptime(start_date, DATE_FORMAT)
+        end_date_obj = datetime.strptime(end_date, DATE_FORMAT)
+    except ValueError:
+        logger.warning("Invalid date format provided.")
+        raise ServiceError("Invalid date format. Use YYYY-MM-DD.")
+
+    if start_date_obj > end_date_obj:
+        logger.warning("'start_date' is after 'end_date'.")
+        raise ServiceError("start_date must be before or equal to end_date.")
+    logger.info(f"Date range: {start_date} to {end_date}")
+
+    # Calculate 'before' period based on compare_mode
+    days_diff = (end_date_obj - start_date_obj).days + 1
+    if compare_mode == "preceding":
+        before_start_date = start_date_obj - timedelta(days=days_diff)
+        before_end_date = end_date_obj - timedelta(days=days_diff)
+        logger.info(
+            f"Comparing with preceding period: {before_start_date} to {before_end_date}"
+        )
+    elif compare_mode == "previous_month":
+        try:
+            before_start_date = (start_date_obj - timedelta(days=30)).replace(
+                day=start_date_obj.day
+            )
+            before_end_date = (end_date_obj - timedelta(days=30)).replace(
+                day=end_date_obj.day
+            )
+            logger.info(
+                f"Comparing with previous month period: {before_start_date} to {before_end_date}"
+            )
+        except ValueError as e:
+            logger.error(f"Error calculating previous month dates: {e}")
+            raise ServiceError("Error calculating previous month dates.")
+
+    return CompareParams(
+        start_date_obj, end_date_obj, before_start_date, before_end_date, campaign_id
+    )
+
+
+def parse_search_params(args):
+    """
+    Validate search query parameters into SearchParams.
+    """
+    query = (args.get("q") or "").strip()
+    mode = args.get("mode", "prefix")
+    types_param = args.get("type")
+    limit = args.get("limit", str(SEARCH_DEFAULT_LIMIT))
+
+    if not query:
+        logger.warning("Missing 'q' parameter.")
+        raise ServiceError("q parameter is required.")
+
+    if len(query) > 255:
+        logger.warning("Search query too long.")
+        raise ServiceError("q must be at most 255 characters.")
+
+    if mode not in SEARCH_MODE_CHOICES:
+        logger.warning(f"Invalid 'mode' parameter: {mode}")
+        raise ServiceError("mode must be one of: prefix, fuzzy.")
+
+    types = tuple(SEARCH_TYPE_CHOICES)
+    if types_param:
+        types = tuple(t.strip() for t in types_param.split(",") if t.strip())
+        if not types or any(t not in SEARCH_TYPE_CHOICES for t in types):
+            logger.warning(f"Invalid 'type' parameter: {types_param}")
+            raise ServiceError("type must be one of: campaign, ad_group.")
+
+    if not limit.isdigit() or not 1 <= int(limit) <= SEARCH_MAX_LIMIT:
+        logger.warning(f"Invalid 'limit' parameter: {limit}")
+        raise ServiceError(f"limit must be an integer between 1 and {SEARCH_MAX_LIMIT}.")
+
+    return SearchParams(query, mode, types, int(limit))
+
+
+def parse_ranking_params(args):
+    """
+    Validate ranking query parameters into RankingParams.
+    """
+    metric = args.get("metric")
+    order = args.get("order", "top")
+    level = args.get("level", "ad_group")
+    limit = args.get("limit", str(RANKING_DEFAULT_LIMIT))
+    campaign_id = args.get("campaign_id")
+    per_campaign = args.get("per_campaign", "false").lower() in ("1", "true", "yes")
+
+    if metric not in RANKING_METRIC_CHOICES:
+        logger.warning(f"Invalid 'metric' parameter: {metric}")
+        raise ServiceError("metric must be one of: cost, conversions, cpc, cpa, ctr.")
+
+    if order not in ("top", "bottom"):
+        logger.warning(f"Invalid 'order' parameter: {order}")
+        raise ServiceError("order must be one of: top, bottom.")
+
+    if level not in RANKING_LEVEL_CHOICES:
+        logger.warning(f"Invalid 'level' parameter: {level}")
+        raise ServiceError("level must be one of: ad_group, campaign.")
+
+    if per_campaign and level != "ad_group":
+        logger.warning("per_campaign requested for campaign level ranking.")
+        raise ServiceError("per_campaign is only supported for ad_group rankings.")
+
+    if not limit.isdigit() or not 1 <= int(limit) <= RANKING_MAX_LIMIT:
+        logger.warning(f"Invalid 'limit' parameter: {limit}")
+        raise ServiceError(f"limit must be an integer between 1 and {RANKING_MAX_LIMIT}.")
+
+    if campaign_id is not None:
+        if not campaign_id.isdigit():
+            logger.warning(f"Invalid 'campaign_id' parameter: {campaign_id}")
+            raise ServiceError("campaign_id must be an integer.")
+        campaign_id = int(campaign_id)
+
+    start_date = end_date = None
+    try:
+        if args.get("start_date"):
+            start_date = datetime.strptime(args["start_date"], DATE_FORMAT).date()
+        if args.get("end_date"):
+            end_date = datetime.strptime(args["end_date"], DATE_FORMAT).date()
+    except ValueError:
+        logger.warning("Invalid date format provided.")
+        raise ServiceError("Invalid date format. Use YYYY-MM-DD.")
+
+    if start_date and end_date and start_date > end_date:
+        logger.warning("'start_date' is after 'end_date'.")
+        raise ServiceError("start_date must be before or equal to end_date.")
+
+    return RankingParams(
+        metric, order, level, int(limit), start_date, end_date, campaign_id, per_campaign
+    )
+
+
+def check_anomaly_days(start_date, end_date, max_days):
+    """Refuse an anomaly scan of more than ``max_days`` days (0: no limit)."""
+    if max_days and (end_date - start_date).days + 1 > max_days:
+        logger.warning(f"Anomaly date range too long: {start_date} to {end_date}")
+        raise ServiceError(f"The date range must not exceed {max_days} days.")
+
+
+def parse_anomaly_params(args, max_days=0):
+    """
+    Validate anomaly query parameters into AnomalyParams. Without dates the
+    last ANOMALY_DEFAULT_DAYS days up to end_date (or the latest data) are
+    scanned; start_date then stays None here and is filled in later. Ranges
+    over ``max_days`` days are refused (see check_anomaly_days()).
+    """
+    metric = args.get("metric")
+    method = args.get("method", "robust")
+    threshold = args.get("threshold", "3.5")
+    limit = args.get("limit", str(ANOMALY_DEFAULT_LIMIT))
+    campaign_id = args.get("campaign_id")
+
+    metrics = tuple(ANOMALY_METRICS)
+    if metric:
+        names = {name.strip() for name in metric.split(",")}
+        if not names <= set(ANOMALY_METRICS):
+            logger.warning(f"Invalid 'metric' parameter: {metric}")
+            raise ServiceError("metric must be one or both of: cost, cpa.")
+        metrics = tuple(name for name in ANOMALY_METRICS if name in names)
+
+    if method not in ANOMALY_METHODS:
+        logger.warning(f"Invalid 'method' parameter: {method}")
+        raise ServiceError("method must be one of: robust, ewma.")
+
+    try:
+        threshold = float(threshold)
+    except ValueError:
+        threshold = 0
+    if not (threshold > 0 and math.isfinite(threshold)):
+        logger.warning(f"Invalid 'threshold' parameter: {args.get('threshold')}")
+        raise ServiceError("threshold must be a positive number.")
+
+    if not limit.isdigit() or not 1 <= int(limit) <= ANOMALY_MAX_LIMIT:
+        logger.warning(f"Invalid 'limit' parameter: {limit}")
+        raise ServiceError(f"limit must be an integer between 1 and {ANOMALY_MAX_LIMIT}.")
+
+    if campaign_id is not None:
+        if not campaign_id.isdigit():
+            logger.warning(f"Invalid 'campaign_id' parameter: {campaign_id}")
+            raise ServiceError("campaign_id must be an integer.")
+        campaign_id = int(campaign_id)
+
+    start_date = end_date = None
+    try:
+        if args.get("start_date"):
+            start_date = datetime.strptime(args["start_date"], DATE_FORMAT).date()
+        if args.get("end_date"):
+            end_date = datetime.strptime(args["end_date"], DATE_FORMAT).date()
+    except ValueError:
+        logger.warning("Invalid date format provided.")
+        raise ServiceError("Invalid date format. Use YYYY-MM-DD.")
+
+    if start_date and end_date and start_date > end_date:
+        logger.warning("'start_date' is after 'end_date'.")
+        raise ServiceError("start_date must be before or equal to end_date.")
+    if start_date and end_date:
+        check_anomaly_days(start_date, end_date, max_days)
+
+    return AnomalyParams(
+        metrics, method, threshold, start_date, end_date, campaign_id, int(limit)
+    )
+
+
+def campaigns_statement():
+    """
+    The /campaigns list reads plain rows of just the columns it returns; the
+    ORM identity map and change tracking buy nothing on a read-only path.
+    """
+    return select(
+        Campaign.campaign_id,
+        Campaign.campaign_name,
+        Campaign.campaign_type,
+        Campaign.version,
+    ).order_by(Campaign.campaign_id)
+
+
+def rename_campaign_statement(campaign_id, new_name):
+    """
+    The single rename stays last-writer-wins, but still bumps the version so
+    a bulk rename holding the old version reports a conflict.
+    """
+    campaign = Campaign.__table__
+    return (
+        update(campaign)
+        .where(campaign.c.campaign_id == campaign_id)
+        .values(campaign_name=new_name, version=campaign.c.version + 1)
+    )
+
+
+def bulk_rename_statement(items):
+    """
+    One UPDATE ... FROM (VALUES ...) applying every rename whose expected
+    version still matches (or that has none), bumping the version and
+    returning the new one. No rows are locked beyond the update itself.
+    """
+    campaign = Campaign.__table__
+    params = {}
+    rows = []
+    for i, item in enumerate(items):
+        params[f"rename_{i}_id"] = item.campaign_id
+        params[f"rename_{i}_name"] = item.new_name
+        params[f"rename_{i}_version"] = item.expected_version
+        rows.append(f"(:rename_{i}_id, :rename_{i}_name, :rename_{i}_version)")
+
+    # VALUES columns are positional (column1, ...) on both SQLite and
+    # PostgreSQL; SQLite does not accept a column list on the alias.
+    renames = (
+        text(
+            "SELECT column1 AS campaign_id, column2 AS new_name, "
+            f"column3 AS expected_version FROM (VALUES {', '.join(rows)}) AS v"
+        )
+        .bindparams(**params)
+        .columns(campaign_id=BigInteger, new_name=String, expected_version=Integer)
+        .subquery("renames")
+    )
+
+    return (
+        update(campaign)
+        .values(campaign_name=renames.c.new_name, version=campaign.c.version + 1)
+        .where(campaign.c.campaign_id == renames.c.campaign_id)
+        .where(
+            or_(
+                renames.c.expected_version.is_(None),
+                campaign.c.version == cast(renames.c.expected_version, Integer),
+            )
+        )
+        .returning(campaign.c.campaign_id, campaign.c.version)
+    )
+
+
+def campaign_versions_statement(campaign_ids):
+    return select(Campaign.campaign_id, Campaign.version).where(
+        Campaign.campaign_id.in_(campaign_ids)
+    )
+
+
+def bulk_rename_results(items, updated, current):
+    """
+    Per-item outcome of a bulk rename, in request order. ``updated`` maps
+    renamed campaign IDs to their new version, ``current`` maps the IDs that
+    were not renamed but exist to their current version.
+    """
+    results = []
+    for item in items:
+        if item.campaign_id in updated:
+            status, version = "updated", updated[item.campaign_id]
+        elif item.campaign_id in current:
+            status, version = "conflict", current[item.campaign_id]
+        else:
+            status, version = "not_found", None
+        results.append(
+            {"campaign_id": item.campaign_id, "status": status, "version": version}
+        )
+    return {"results": results, "updated": len(updated)}
+
+
+def escape_like(value):
+    """Escape LIKE wildcards so user input only matches literally."""
+    return (
+        value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2)
+        .replace("%", LIKE_ESCAPE + "%")
+        .replace("_", LIKE_ESCAPE + "_")
+    )
+
+
+def search_columns(search_type):
+    """Columns returned for a search type; the name column comes second."""
+    if search_type == "campaign":
+        return Campaign.campaign_id, Campaign.campaign_name, Campaign.campaign_type
+    return AdGroup.ad_group_id, AdGroup.ad_group_name, AdGroup.campaign_id
+
+
+def search_statement(search_type, params, dialect_name):
+    """
+    Ranked name search, written so each dialect can use its search indexes
+    (see app.models.search).
+
+    Prefix matches are ordered shortest name first. Fuzzy search uses trigram
+    similarity on PostgreSQL; elsewhere it falls back to a substring LIKE
+    ranked exact match, then prefix match, then earliest match.
+    """
+    columns = search_columns(search_type)
+    name = columns[1]
+    query = params.query
+    prefix_pattern = escape_like(query) + "%"
+
+    if params.mode == "fuzzy" and dialect_name == "postgresql":
+        # % matches above pg_trgm.similarity_threshold, via the GIN index
+        condition = name.op("%")(query)
+        ranking = (func.similarity(name, query).desc(), name)
+    elif params.mode == "fuzzy":
+        condition = name.like(f"%{escape_like(query)}%", escape=LIKE_ESCAPE)
+        ranking = (
+            case(
+                (func.lower(name) == query.lower(), 0),
+                (name.like(prefix_pattern, escape=LIKE_ESCAPE), 1),
+                else_=2,
+            ),
+            func.instr(func.lower(name), query.lower()),
+            func.length(name),
+            name,
+        )
+    else:
+        # The pattern is a single bound value, so SQLite can use the index.
+        # LIKE is case-insensitive there already; PostgreSQL matches lower().
+        if dialect_name == "postgresql":
+            condition = func.lower(name).like(prefix_pattern.lower(), escape=LIKE_ESCAPE)
+        else:
+            condition = name.like(prefix_pattern, escape=LIKE_ESCAPE)
+        ranking = (func.length(name), name)
+
+    return select(*columns).where(condition).order_by(*ranking).limit(params.limit)
+
+
+def ad_groups_statement():
+    """Rows with the same keys as AdGroup.serialize()."""
+    return select(AdGroup.ad_group_id, AdGroup.ad_group_name, AdGroup.campaign_id)
+
+
+def campaigns_ad_groups_statement():
+    """Every ad group's name with its campaign, in the order /campaigns lists them."""
+    return select(AdGroup.campaign_id, AdGroup.ad_group_name).order_by(
+        AdGroup.campaign_id, AdGroup.ad_group_id
+    )
+
+
+def campaigns_stats_statement():
+    """
+    One row per campaign with stats: the totals summarize_campaign() needs and
+    the number of months they span.
+    """
+    month = extract("year", AdGroupStats.date) * 100 + extract(
+        "month", AdGroupStats.date
+    )
+    return (
+        select(
+            AdGroup.campaign_id,
+            # bigint, where PostgreSQL would sum into numeric
+            cast(func.sum(AdGroupStats.cost_micros), BigInteger).label("cost_micros"),
+            func.sum(AdGroupStats.conversions).label("conversions"),
+            func.count(func.distinct(month)).label("months"),
+        )
+        .join(AdGroup)
+        .group_by(AdGroup.campaign_id)
+    )
+
+
+def serialize_rows(rows):
+    """Column rows -> dicts keyed by column label, without building ORM objects."""
+    return [row._asdict() for row in rows]
+
+
+def json_object(fields):
+    """
+    json_build_object() of a {key: column} dict, keys sorted like jsonify()
+    sorts them.
+    """
+    return func.json_build_object(
+        *chain.from_iterable(
+            (literal_column(f"'{key}'"), value) for key, value in sorted(fields.items())
+        ),
+        type_=JSON,
+    )
+
+
+def json_round(value, scale=1):
+    """
+    round(value * scale, 2) computed by PostgreSQL exactly as Python rounds a
+    float: to the nearest hundredth of its exact binary value, ties to even.
+    numeric can't do that (the cast keeps 15 digits, ties go away from zero),
+    and rounding value * 100 alone is off whenever that product rounds to an
+    exact .5 (0.855 * 100 is 85.5, though 0.855 is just below it). So the
+    product's rounding error is computed exactly too (Dekker's two-product,
+    100 needs no split) and decides those cases.
+    """
+    value = cast(value, Float)
+    if scale != 1:
+        value = value * float(scale)
+    scaled = value * 100.0
+    split = value * 134217729.0
+    high = split - (split - value)
+    error = (high * 100.0 - scaled) + (value - high) * 100.0
+    floor = func.floor(scaled, type_=Float)
+    half = scaled - floor == 0.5
+    rounded = case(
+        (and_(half, error > 0), floor + 1.0),
+        (and_(half, error < 0), floor),
+        # round(double precision) breaks real ties to even, like Python
+        else_=func.round(scaled, type_=Float),
+    )
+    return rounded / 100.0
+
+
+def summarize_campaign(campaign, ad_group_names, stats):
+    """
+    Build the /campaigns entry for one campaign from its ad group names and its
+    row of campaigns_stats_statement() (None when it has no stats).
+    """
+    total_cost = stats.cost_micros / MICROS if stats else 0
+    total_conversions = stats.conversions if stats else 0
+    months = stats.months if stats else 0
+
+    avg_monthly_cost = total_cost / months if months else 0
+    avg_cost_per_conversion = (
+        total_cost / total_conversions if total_conversions > 0 else 0
+    )
+
+    return {
+        "campaign_id": campaign.campaign_id,
+        "campaign_name": campaign.campaign_name,
+        "campaign_type": campaign.campaign_type,
+        "version": campaign.version,
+        "ad_group_count": len(ad_group_names),
+        "ad_group_names": ad_group_names,
+        "average_monthly_cost": round(avg_monthly_cost, 2),
+        "average_cost_per_conversion": round(avg_cost_per_conversion, 2),
+    }
+
+
+def summarize_campaigns(campaigns, ad_groups, stats):
+    """
+    The /campaigns entries from the rows of campaigns_statement(),
+    campaigns_ad_groups_statement() and campaigns_stats_statement().
+    """
+    names = defaultdict(list)
+    for ad_group in ad_groups:
+        names[ad_group.campaign_id].append(ad_group.ad_group_name)
+    stats = {row.campaign_id: row for row in stats}
+    return [
+        summarize_campaign(
+            campaign, names[campaign.campaign_id], stats.get(campaign.campaign_id)
+        )
+        for campaign in campaigns
+    ]
+
+
+def campaigns_json_statement():
+    """
+    The whole /campaigns response as one JSON text built by PostgreSQL, the
+    same document summarize_campaign() gives for every campaign (NULL when
+    there are no campaigns). Campaigns and their stats are each read once,
+    in grouped subqueries, instead of two queries per campaign.
+    """
+    ad_groups = (
+        select(
+            AdGroup.campaign_id,
+            func.count().label("count"),
+            func.json_agg(
+                aggregate_order_by(AdGroup.ad_group_name, AdGroup.ad_group_id)
+            ).label("names"),
+        )
+        .group_by(AdGroup.campaign_id)
+        .subquery()
+    )
+    month = func.date_trunc("month", AdGroupStats.date)
+    stats = (
+        select(
+            AdGroup.campaign_id,
+            # Summed exactly, then divided in double precision like Python
+            (cast(func.sum(AdGroupStats.cost_micros), Float) / float(MICROS)).label(
+                "cost"
+            ),
+            func.sum(AdGroupStats.conversions).label("conversions"),
+            func.count(func.distinct(month)).label("months"),
+        )
+        .join(AdGroup)
+        .group_by(AdGroup.campaign_id)
+        .subquery()
+    )
+    campaign = json_object(
+        {
+            "campaign_id": Campaign.campaign_id,
+            "campaign_name": Campaign.campaign_name,
+            "campaign_type": Campaign.campaign_type,
+            "version": Campaign.version,
+            "ad_group_count": func.coalesce(ad_groups.c.count, 0),
+            "ad_group_names": func.coalesce(
+                ad_groups.c.names, literal_column("'[]'::json")
+            ),
+            "average_monthly_cost": case(
+                (
+                    stats.c.months > 0,
+                    json_round(stats.c.cost / cast(stats.c.months, Float)),
+                ),
+                else_=0,
+            ),
+            "average_cost_per_conversion": case(
+                (
+                    stats.c.conversions > 0,
+                    json_round(stats.c.cost / stats.c.conversions),
+                ),
+                else_=0,
+            ),
+        }
+    )
+    campaigns = func.json_agg(aggregate_order_by(campaign, Campaign.campaign_id))
+    # As text, which the driver hands over as it is (json it would decode)
+    return (
+        select(cast(campaigns, Text))
+        .select_from(Campaign)
+        .outerjoin(ad_groups, ad_groups.c.campaign_id == Campaign.campaign_id)
+        .outerjoin(stats, stats.c.campaign_id == Campaign.campaign_id)
+    )
+
+
+def metric_columns():
+    """
+    Aggregated metric columns shared by the time series and the period comparison.
+    """
+    return [
+        AdGroupStats.total_cost().label("total_cost"),
+        func.sum(AdGroupStats.clicks).label("total_clicks"),
+        func.sum(AdGroupStats.conversions).label("total_conversions"),
+        func.sum(AdGroupStats.impressions).label("total_impressions"),
+        func.avg(AdGroupStats.cost / func.nullif(AdGroupStats.clicks, 0)).label(
+            "avg_cost_per_click"
+        ),
+        func.avg(AdGroupStats.cost / func.nullif(AdGroupStats.conversions, 0)).label(
+            "avg_cost_per_conversion"
+        ),
+        # Cast so two integer sums are not divided with integer division
+        (
+            cast(func.sum(AdGroupStats.clicks), Float)
+            / func.nullif(func.sum(AdGroupStats.impressions), 0)
+        ).label("avg_click_through_rate"),
+        (
+            func.sum(AdGroupStats.conversions)
+            / func.nullif(func.sum(AdGroupStats.clicks), 0)
+        ).label("avg_conversion_rate"),
+    ]
+
+
+def ranking_metric(metric, totals):
+    """Ranked value of one ad group or campaign, from its summed columns."""
+    if metric == "cost":
+        return totals.c.total_cost
+    if metric == "conversions":
+        return totals.c.total_conversions
+    if metric == "cpc":
+        return totals.c.total_cost / func.nullif(totals.c.total_clicks, 0)
+    if metric == "cpa":
+        return totals.c.total_cost / func.nullif(totals.c.total_conversions, 0)
+    return cast(totals.c.total_clicks, Float) / func.nullif(totals.c.total_impressions, 0)
+
+
+def ranking_statement(params):
+    """
+    Top or bottom N ad groups or campaigns by a metric, ranked in the database.
+
+    The stats of the date range are summed per ad group (or campaign) first,
+    which the (date, ad_group_id) index serves; rank() then numbers the sums,
+    within each campaign when per_campaign is set, and only the first N rows
+    of each ranking are returned. Undefined ratios (no clicks, conversions or
+    impressions) rank last either way.
+    """
+    if params.level == "campaign":
+        keys = [Campaign.campaign_id, Campaign.campaign_name]
+    else:
+        keys = [AdGroup.ad_group_id, AdGroup.ad_group_name, AdGroup.campaign_id]
+
+    totals = (
+        select(
+            *keys,
+            AdGroupStats.total_cost().label("total_cost"),
+            func.sum(AdGroupStats.clicks).label("total_clicks"),
+            func.sum(AdGroupStats.conversions).label("total_conversions"),
+            func.sum(AdGroupStats.impressions).label("total_impressions"),
+        )
+        .select_from(AdGroupStats)
+        .join(AdGroup)
+        .group_by(*keys)
+    )
+    if params.level == "campaign":
+        totals = totals.join(Campaign)
+    if params.campaign_id is not None:
+        totals = totals.where(AdGroup.campaign_id == params.campaign_id)
+    if params.start_date:
+        totals = totals.where(AdGroupStats.date >= params.start_date)
+    if params.end_date:
+        totals = totals.where(AdGroupStats.date <= params.end_date)
+    totals = totals.subquery("totals")
+
+    value = ranking_metric(params.metric, totals)
+    ordering = value.desc() if params.order == "top" else value.asc()
+    ordering = ordering.nulls_last()
+    key = totals.c[keys[0].key]
+    partition = totals.c.campaign_id if params.per_campaign else None
+
+    ranked = select(
+        totals,
+        value.label("value"),
+        func.rank().over(partition_by=partition, order_by=ordering).label("rank"),
+        func.row_number()
+        .over(partition_by=partition, order_by=(ordering, key))
+        .label("position"),
+    ).subquery("ranked")
+
+    query = select(ranked).where(ranked.c.position <= params.limit)
+    if params.per_campaign:
+        return query.order_by(ranked.c.campaign_id, ranked.c.position)
+    return query.order_by(ranked.c.position)
+
+
+def format_ranking(rows, params):
+    results = []
+    for row in rows:
+        record = dict(row._mapping)
+        record.pop("position")
+        record["total_cost"] = round(record["total_cost"], 2)
+        record["total_conversions"] = round(record["total_conversions"], 2)
+        if record["value"] is not None:
+            # CTR in percent, as in the other endpoints
+            scale = 100 if params.metric == "ctr" else 1
+            record["value"] = round(record["value"] * scale, 2)
+        results.append(record)
+
+    return {
+        "metric": params.metric,
+        "order": params.order,
+        "level": params.level,
+        "start_date": (
+            params.start_date.strftime(DATE_FORMAT) if params.start_date else None
+        ),
+        "end_date": params.end_date.strftime(DATE_FORMAT) if params.end_date else None,
+        "results": results,
+    }
+
+
+def period_expression(aggregate_by, dialect_name, column=AdGroupStats.date):
+    """
+    Bucket expression for AdGroupStats.date (or another date ``column``).
+    func.date() is for precision at the day level, func.date_trunc() is for
+    broader time ranges like weeks or months. SQLite has no date_trunc, so
+    weeks and months use date modifiers there.
+    """
+    if aggregate_by == "day":
+        return func.date(column)
+    if dialect_name == "sqlite":
+        if aggregate_by == "week":
+            # Monday of the week, same as date_trunc('week')
+            return func.date(column, "weekday 0", "-6 days")
+        if aggregate_by == "quarter":
+            # Back 0-2 months from the start of the month
+            months_back = (cast(func.strftime("%m", column), Integer) - 1) % 3
+            return func.date(
+                column, "start of month", func.printf("-%d months", months_back)
+            )
+        return func.date(column, "start of month")
+    return func.date_trunc(aggregate_by, column)
+
+
+def time_series_statement(params, dialect_name):
+    group_by = period_expression(params.aggregate_by, dialect_name)
+    query = select(group_by.label("period"), *metric_columns())
+
+    if params.campaigns:
+        query = query.join(AdGroup).where(AdGroup.campaign_id.in_(params.campaigns))
+    # Compare dates, not datetimes: SQLite stores dates as text, where
+    # '2024-01-01' < '2024-01-01 00:00:00' would drop the first day
+    if params.start_date:
+        query = query.where(AdGroupStats.date >= params.start_date.date())
+    if params.end_date:
+        query = query.where(AdGroupStats.date <= params.end_date.date())
+
+    return query.group_by(group_by).order_by(group_by)
+
+
+def period_number_expression(aggregate_by, dialect_name, column=AdGroupStats.date):
+    """
+    Consecutive integers for consecutive buckets of ``column`` (days since
+    1970-01-01, weeks, months or quarters), so window frames can count
+    periods with RANGE even where some periods have no rows.
+    """
+    if dialect_name == "sqlite":
+        days = cast(func.julianday(column) - 2440587.5, Integer)
+        year = cast(func.strftime("%Y", column), Integer)
+        month = cast(func.strftime("%m", column), Integer)
+    else:
+        days = cast(func.extract("epoch", column), BigInteger) // 86400
+        year = cast(func.extract("year", column), Integer)
+        month = cast(func.extract("month", column), Integer)
+
+    if aggregate_by == "day":
+        return days
+    if aggregate_by == "week":
+        # 1970-01-01 was a Thursday; + 3 puts every Monday on a multiple of 7
+        return (days + 3) // 7
+    if aggregate_by == "month":
+        return year * 12 + month - 1
+    return year * 4 + (month - 1) // 3
+
+
+def shift_months(day, months):
+    """First of the month ``months`` after (or before) the month of ``day``."""
+    index = day.year * 12 + day.month - 1 + months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def window_start(params):
+    """
+    First day the rolling windows and lags of TimeSeriesParams need: the
+    start of the bucket of start_date, moved back as many periods as the
+    widest window or lag looks back. None without a start_date or windows.
+    """
+    lookback = max([w - 1 for w in params.rolling] + list(params.lag), default=0)
+    if not params.start_date or not lookback:
+        return None
+
+    start = params.start_date.date()
+    if params.aggregate_by == "day":
+        return start - timedelta(days=lookback)
+    if params.aggregate_by == "week":
+        return start - timedelta(days=start.weekday() + 7 * lookback)
+    if params.aggregate_by == "month":
+        return shift_months(start, -lookback)
+    return shift_months(start, -((start.month - 1) % 3) - 3 * lookback)
+
+
+def windowed_time_series_statement(statement, params, dialect_name, date_column):
+    """
+    ``statement`` (time_series_statement or rollup_time_series_statement) with
+    the rolling averages and lagged values of WINDOW_METRICS added, computed
+    by window functions in the db.
+
+    The rows are read from window_start() on, so the first windows are full.
+    Rows before start_date are tagged out of range and only kept for the
+    windows: the bucket start_date falls in is summed once over its days in
+    range (its totals, as without windows) and once over the rest (only for
+    its window values, which RANGE frames add up with the first part). Lagged
+    values come from a frame of just the period N back, NULL when it has no
+    rows, and are compared with the whole current period ({metric}_whole).
+    """
+    if not params.rolling and not params.lag:
+        return statement(params, dialect_name)
+
+    start = window_start(params)
+    if start is None:
+        query = statement(params, dialect_name)
+        base = query.add_columns(literal(True).label("in_range"))
+    else:
+        query = statement(
+            params._replace(start_date=datetime.combine(start, datetime.min.time())),
+            dialect_name,
+        )
+        in_range = date_column >= params.start_date.date()
+        base = query.add_columns(in_range.label("in_range")).group_by(in_range)
+
+    number = period_number_expression(params.aggregate_by, dialect_name, date_column)
+    base = base.add_columns(number.label("period_number")).group_by(number)
+    base = base.order_by(None).subquery()
+
+    columns = list(base.c)
+    for window in params.rolling:
+        for metric in WINDOW_METRICS:
+            total = func.sum(base.c[metric]).over(
+                order_by=base.c.period_number, range_=(-(window - 1), 0)
+            )
+            # Missing periods count as 0
+            columns.append((total / float(window)).label(f"{metric}_rolling_{window}"))
+    for metric in WINDOW_METRICS if params.lag else ():
+        whole = func.sum(base.c[metric]).over(
+            order_by=base.c.period_number, range_=(0, 0)
+        )
+        columns.append(whole.label(f"{metric}_whole"))
+    for lag in params.lag:
+        for metric in WINDOW_METRICS:
+            previous = func.sum(base.c[metric]).over(
+                order_by=base.c.period_number, range_=(-lag, -lag)
+            )
+            columns.append(previous.label(f"{metric}_previous_{lag}"))
+
+    windowed = select(*columns).subquery()
+    return (
+        select(*[c for c in windowed.c if c.key not in ("in_range", "period_number")])
+        .where(windowed.c.in_range)
+        .order_by(windowed.c.period_number)
+    )
+
+
+def rollup_time_series_statement(params, dialect_name):
+    """
+    Same rows as time_series_statement(), summed from stats_daily_rollup (one
+    row per day and ad group instead of one per device).
+    """
+    group_by = period_expression(
+        params.aggregate_by, dialect_name, StatsDailyRollup.date
+    )
+    clicks = func.sum(StatsDailyRollup.clicks)
+    conversions = func.sum(StatsDailyRollup.conversions)
+    impressions = func.sum(StatsDailyRollup.impressions)
+    query = select(
+        group_by.label("period"),
+        (func.sum(StatsDailyRollup.cost_micros) / float(MICROS)).label("total_cost"),
+        clicks.label("total_clicks"),
+        conversions.label("total_conversions"),
+        impressions.label("total_impressions"),
+        (
+            func.sum(StatsDailyRollup.cost_per_click_sum)
+            / func.nullif(func.sum(StatsDailyRollup.cost_per_click_count), 0)
+        ).label("avg_cost_per_click"),
+        (
+            func.sum(StatsDailyRollup.cost_per_conversion_sum)
+            / func.nullif(func.sum(StatsDailyRollup.cost_per_conversion_count), 0)
+        ).label("avg_cost_per_conversion"),
+        (cast(clicks, Float) / func.nullif(impressions, 0)).label(
+            "avg_click_through_rate"
+        ),
+        (conversions / func.nullif(clicks, 0)).label("avg_conversion_rate"),
+    )
+
+    if params.campaigns:
+        query = query.where(StatsDailyRollup.campaign_id.in_(params.campaigns))
+    if params.start_date:
+        query = query.where(StatsDailyRollup.date >= params.start_date.date())
+    if params.end_date:
+        query = query.where(StatsDailyRollup.date <= params.end_date.date())
+
+    return query.group_by(group_by).order_by(group_by)
+
+
+def campaign_series_statement(params, dialect_name):
+    """
+    ad_group_stats summed per period and campaign for TimeSeriesParams, in
+    SERIES_COLUMNS order. Periods come as period_number_expression() integers,
+    so the rows are plain numbers for pivot_campaign_series().
+    """
+    number = period_number_expression(params.aggregate_by, dialect_name)
+    cost_per_click = AdGroupStats.cost / func.nullif(AdGroupStats.clicks, 0)
+    cost_per_conversion = AdGroupStats.cost / func.nullif(AdGroupStats.conversions, 0)
+    query = select(
+        number,
+        AdGroup.campaign_id,
+        func.sum(AdGroupStats.cost_micros),
+        func.sum(AdGroupStats.clicks),
+        func.sum(AdGroupStats.conversions),
+        func.sum(AdGroupStats.impressions),
+        func.coalesce(func.sum(cost_per_click), 0),
+        func.count(cost_per_click),
+        func.coalesce(func.sum(cost_per_conversion), 0),
+        func.count(cost_per_conversion),
+    ).join(AdGroup)
+
+    if params.campaigns:
+        query = query.where(AdGroup.campaign_id.in_(params.campaigns))
+    if params.start_date:
+        query = query.where(AdGroupStats.date >= params.start_date.date())
+    if params.end_date:
+        query = query.where(AdGroupStats.date <= params.end_date.date())
+
+    return query.group_by(number, AdGroup.campaign_id)
+
+
+def rollup_campaign_series_statement(params, dialect_name):
+    """Same rows as campaign_series_statement(), from stats_daily_rollup."""
+    number = period_number_expression(
+        params.aggregate_by, dialect_name, StatsDailyRollup.date
+    )
+    query = select(
+        number,
+        StatsDailyRollup.campaign_id,
+        func.sum(StatsDailyRollup.cost_micros),
+        func.sum(StatsDailyRollup.clicks),
+        func.sum(StatsDailyRollup.conversions),
+        func.sum(StatsDailyRollup.impressions),
+        func.sum(StatsDailyRollup.cost_per_click_sum),
+        func.sum(StatsDailyRollup.cost_per_click_count),
+        func.sum(StatsDailyRollup.cost_per_conversion_sum),
+        func.sum(StatsDailyRollup.cost_per_conversion_count),
+    )
+
+    if params.campaigns:
+        query = query.where(StatsDailyRollup.campaign_id.in_(params.campaigns))
+    if params.start_date:
+        query = query.where(StatsDailyRollup.date >= params.start_date.date())
+    if params.end_date:
+        query = query.where(StatsDailyRollup.date <= params.end_date.date())
+
+    return query.group_by(number, StatsDailyRollup.campaign_id)
+
+
+def period_start(number, aggregate_by):
+    """First day of the period a period_number_expression() value stands for."""
+    if aggregate_by == "day":
+        return datetime(1970, 1, 1) + timedelta(days=number)
+    if aggregate_by == "week":
+        return datetime(1970, 1, 1) + timedelta(days=7 * number - 3)
+    if aggregate_by == "month":
+        return datetime(number // 12, number % 12 + 1, 1)
+    return datetime(number // 4, number % 4 * 3 + 1, 1)
+
+
+def series_values(values, defined=None):
+    """
+    A campaigns x periods matrix -> one list per campaign, rounded to 2
+    decimals, with None where not ``defined``.
+    """
+    values = np.round(values, 2)
+    if defined is None:
+        return values.tolist()
+    values = values.astype(object)
+    values[~defined] = None
+    return values.tolist()
+
+
+def pivot_campaign_series(rows, params):
+    """
+    campaign_series_statement() rows (or the same columns as a float array)
+    -> the split_by=campaign response: one period axis from the first to the
+    last period with data and, per campaign, one array per metric along it.
+    Periods a campaign has no rows in are 0 (the averages are None).
+
+    The rows are scattered into campaigns x periods matrices and every metric
+    is computed on whole matrices, no dict per row is built.
+    """
+    width = len(SERIES_COLUMNS)
+    if not isinstance(rows, np.ndarray):
+        rows = np.fromiter(
+            chain.from_iterable(rows), dtype=np.float64, count=width * len(rows)
+        ).reshape(-1, width)
+
+    numbers = rows[:, 0].astype(np.int64)
+    campaign_ids = rows[:, 1].astype(np.int64)
+    if params.campaigns:
+        # Sorted by parse_time_series_params(); kept even without rows
+        campaigns = np.array(params.campaigns, dtype=np.int64)
+    else:
+        campaigns = np.unique(campaign_ids)
+    first = int(numbers.min()) if len(numbers) else 0
+    size = int(numbers.max()) - first + 1 if len(numbers) else 0
+
+    # One row per (period, campaign), so plain assignment is enough
+    grid = {}
+    index = (np.searchsorted(campaigns, campaign_ids), numbers - first)
+    for column, name in enumerate(SERIES_COLUMNS[2:], start=2):
+        grid[name] = np.zeros((len(campaigns), size))
+        grid[name][index] = rows[:, column]
+
+    def divide(numerators, denominators, scale=1.0):
+        defined = denominators > 0
+        quotient = np.divide(
+            numerators, denominators, out=np.zeros_like(numerators), where=defined
+        )
+        return series_values(quotient * scale, defined)
+
+    metrics = {
+        "total_cost": series_values(grid["cost_micros"] / MICROS),
+        "total_clicks": grid["clicks"].astype(np.int64).tolist(),
+        "total_conversions": series_values(grid["conversions"]),
+        "avg_cost_per_click": divide(
+            grid["cost_per_click_sum"], grid["cost_per_click_count"]
+        ),
+        "avg_cost_per_conversion": divide(
+            grid["cost_per_conversion_sum"], grid["cost_per_conversion_count"]
+        ),
+        "avg_click_through_rate": divide(grid["clicks"], grid["impressions"], 100),
+        "avg_conversion_rate": divide(grid["conversions"], grid["clicks"]),
+    }
+    aggregate_by = params.aggregate_by
+    return {
+        "aggregate_by": aggregate_by,
+        "periods": [
+            format_period(period_start(number, aggregate_by), aggregate_by)
+            for number in range(first, first + size)
+        ],
+        "series": [
+            {"campaign_id": campaign_id, **dict(zip(metrics, values))}
+            for campaign_id, *values in zip(campaigns.tolist(), *metrics.values())
+        ],
+    }
+
+
+def time_series_bounds_statement():
+    """
+    First and last day of ad_group_stats, its number of rows taken as the span
+    of its ids, and the number of campaigns: a time_series_bounds() row when
+    ad_group_stats itself gets scanned. Only min/max over indexed columns, so
+    it stays cheap on a big table, but it assumes ids are dense (no large gaps
+    from deletes or skipped sequence values); the order of dates does not
+    matter.
+    """
+    return select(
+        func.min(AdGroupStats.date).label("first_date"),
+        func.max(AdGroupStats.date).label("last_date"),
+        (func.max(AdGroupStats.id) - func.min(AdGroupStats.id) + 1).label("rows"),
+        campaign_count_subquery(),
+    )
+
+
+def rollup_bounds_statement():
+    """
+    time_series_bounds_statement() over stats_daily_rollup, counting its rows,
+    for when the rollup is what gets scanned. Run once per rollup refresh.
+    """
+    return select(
+        func.min(StatsDailyRollup.date).label("first_date"),
+        func.max(StatsDailyRollup.date).label("last_date"),
+        func.count().label("rows"),
+        campaign_count_subquery(),
+    )
+
+
+def campaign_count_subquery():
+    return (
+        select(func.count())
+        .select_from(Campaign)
+        .scalar_subquery()
+        .label("campaigns")
+    )
+
+
+def time_series_bounds_from_row(row):
+    """A row of the bounds statements -> TimeSeriesBounds."""
+    if row.first_date is None:
+        return TimeSeriesBounds(None, None, row.campaigns, 0)
+    days = (row.last_date - row.first_date).days + 1
+    return TimeSeriesBounds(
+        row.first_date, row.last_date, row.campaigns, row.rows / days
+    )
+
+
+def count_periods(start, end, aggregate_by):
+    """Number of aggregate_by buckets between two dates (inclusive)."""
+    if aggregate_by == "day":
+        return (end - start).days + 1
+    if aggregate_by == "week":
+        first_monday = start - timedelta(days=start.weekday())
+        return (end - first_monday).days // 7 + 1
+    if aggregate_by == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    quarters = (end.year - start.year) * 4
+    return quarters + (end.month - 1) // 3 - (start.month - 1) // 3 + 1
+
+
+def plan_time_series(params, bounds, scan_budget=None):
+    """
+    Resolve max_points and check the scan budget for TimeSeriesParams, given
+    TimeSeriesBounds.
+
+    With max_points, aggregate_by becomes the finest bucket, from the
+    requested one up through day, week, month and quarter, that gives at most
+    that many periods over the requested range (clipped to the data); quarter
+    when none does. Returns the params to compute, with max_points cleared.
+
+    The rows to scan are estimated as rows per day * days in range * share of
+    campaigns asked for, plus the days rolling windows and lags look back;
+    above ``scan_budget`` the request is refused.
+    """
+    if bounds.first_date is None:
+        return params._replace(max_points=None)
+
+    start, end = bounds.first_date, bounds.last_date
+    if params.start_date:
+        start = max(start, params.start_date.date())
+    if params.end_date:
+        end = min(end, params.end_date.date())
+    days = max((end - start).days + 1, 0)
+
+    aggregate_by = params.aggregate_by
+    if params.max_points and days:
+        for aggregate_by in AGGREGATE_BY_CHOICES[
+            AGGREGATE_BY_CHOICES.index(params.aggregate_by) :
+        ]:
+            if count_periods(start, end, aggregate_by) <= params.max_points:
+                break
+
+    planned = params._replace(aggregate_by=aggregate_by, max_points=None)
+    if scan_budget:
+        # Rolling windows and lags also read the periods before start_date
+        lookback = window_start(planned)
+        if lookback is not None and days:
+            days += (start - max(lookback, bounds.first_date)).days
+        share = 1.0
+        if params.campaigns and bounds.campaigns:
+            share = min(len(params.campaigns) / bounds.campaigns, 1.0)
+        estimate = int(bounds.rows_per_day * days * share)
+        if estimate > scan_budget:
+            logger.warning(
+                f"Refused time series scanning about {estimate} rows: {params}"
+            )
+            raise ServiceError(
+                f"This query would scan about {estimate:,} rows, more than the "
+                f"limit of {scan_budget:,}. Narrow the date range or filter by "
+                "campaigns."
+            )
+
+    return planned
+
+
+def format_period(period, aggregate_by):
+    if isinstance(period, str) and aggregate_by != "day":
+        period = datetime.strptime(period, DATE_FORMAT)
+    if isinstance(period, datetime):
+        if aggregate_by == "day":
+            return period.strftime("%Y-%m-%d")
+        elif aggregate_by == "week":
+            return period.strftime("%Y-%U")
+        elif aggregate_by == "month":
+            return period.strftime("%Y-%m")
+        elif aggregate_by == "quarter":
+            return f"{period.year}-Q{(period.month - 1) // 3 + 1}"
+    return str(period)
+
+
+def round_float(value, scale=1):
+    """
+    round(value * scale, 2) as a float, None for None. PostgreSQL returns some
+    sums and averages as numeric, which would otherwise stay Decimal (and be
+    encoded as strings).
+    """
+    return round(float(value) * scale, 2) if value is not None else None
+
+
+def format_time_series(rows, aggregate_by, rolling=(), lag=()):
+    """
+    Time series rows -> the response records. The reference for
+    time_series_json_statement(), which builds the same records in the db.
+    """
+    result = []
+    for row in rows:
+        record = {
+            "period": format_period(row.period, aggregate_by),
+            "total_cost": round_float(row.total_cost),
+            "total_clicks": (
+                int(row.total_clicks) if row.total_clicks is not None else None
+            ),
+            "total_conversions": round_float(row.total_conversions),
+            "avg_cost_per_click": round_float(row.avg_cost_per_click),
+            "avg_cost_per_conversion": round_float(row.avg_cost_per_conversion),
+            "avg_click_through_rate": round_float(row.avg_click_through_rate, 100),
+            "avg_conversion_rate": round_float(row.avg_conversion_rate),
+        }
+        for metric in WINDOW_METRICS:
+            for window in rolling:
+                record[f"{metric}_rolling_{window}"] = round_float(
+                    getattr(row, f"{metric}_rolling_{window}")
                 )
+            for periods in lag:
+                # Percent change against the period ``periods`` back
+                record[f"{metric}_change_{periods}"] = calculate_percentage_change(
+                    safe_float(getattr(row, f"{metric}_whole")),
+                    safe_float(getattr(row, f"{metric}_previous_{periods}")),
+                )
+        logger.debug(f"Performance Record: {record}")
+        result.append(record)
+    return result
+
+
+def period_label_expression(period, aggregate_by):
+    """The format_period() label of a period_expression() column, in PostgreSQL."""
+    if aggregate_by == "day":
+        return func.to_char(period, "YYYY-MM-DD", type_=String)
+    year = func.to_char(period, "YYYY", type_=String)
+    if aggregate_by == "week":
+        # strftime's %U, the week of the year counted from Sundays: (zero
+        # based day of the year + 7 - weekday with Sunday as 0) // 7
+        week = cast(
+            func.floor(
+                (func.extract("doy", period) + 6 - func.extract("dow", period)) / 7
+            ),
+            Integer,
+        )
+        return year + "-" + func.to_char(week, "FM00", type_=String)
+    if aggregate_by == "month":
+        return func.to_char(period, "YYYY-MM", type_=String)
+    return year + "-Q" + func.to_char(period, "Q", type_=String)
 
-                for stat in ad_group_stats:
-                    total_cost += stat.cost
-                    total_conversions += stat.conversions
-                    months.add(stat.date.strftime("%Y-%m"))
 
-            avg_monthly_cost = total_cost / len(months) if months else 0
-            avg_cost_per_conversion = (
-                total_cost / total_conversions if total_conversions > 0 else 0
+def json_percentage_change(current, before):
+    """calculate_percentage_change() in PostgreSQL, on floats like the Python path."""
+    before = cast(before, Float)
+    return case(
+        (before == 0, None),
+        else_=json_round((cast(current, Float) - before) / before, 100),
+    )
+
+
+def time_series_json_statement(params, statement):
+    """
+    The time series response as one JSON text built by PostgreSQL from the
+    rows of ``statement`` (a windowed_time_series_statement()): the records
+    format_time_series() builds, with the same rounding, in period order.
+    """
+    rows = statement.subquery()
+    fields = {
+        "period": period_label_expression(rows.c.period, params.aggregate_by),
+        "total_cost": json_round(rows.c.total_cost),
+        "total_clicks": cast(rows.c.total_clicks, BigInteger),
+        "total_conversions": json_round(rows.c.total_conversions),
+        "avg_cost_per_click": json_round(rows.c.avg_cost_per_click),
+        "avg_cost_per_conversion": json_round(rows.c.avg_cost_per_conversion),
+        "avg_click_through_rate": json_round(rows.c.avg_click_through_rate, 100),
+        "avg_conversion_rate": json_round(rows.c.avg_conversion_rate),
+    }
+    for metric in WINDOW_METRICS:
+        for window in params.rolling:
+            name = f"{metric}_rolling_{window}"
+            fields[name] = json_round(rows.c[name])
+        for periods in params.lag:
+            fields[f"{metric}_change_{periods}"] = json_percentage_change(
+                rows.c[f"{metric}_whole"], rows.c[f"{metric}_previous_{periods}"]
             )
+    records = func.json_agg(aggregate_order_by(json_object(fields), rows.c.period))
+    # As text, which the driver hands over as it is (json it would decode)
+    return select(func.coalesce(cast(records, Text), "[]"))
+
+
+def period_totals_statement(start, end, campaign_id=None):
+    logger.debug(f"Fetching performance data from {start} to {end}.")
+    # Dates, not datetimes, as in time_series_statement()
+    query = select(*metric_columns()).where(
+        AdGroupStats.date >= start.date(), AdGroupStats.date <= end.date()
+    )
+    if campaign_id is not None:
+        query = query.join(AdGroup).where(AdGroup.campaign_id == campaign_id)
+    return query
+
+
+# Round and format metrics
+def round_metrics(data):
+    if not data:
+        return {
+            "total_cost": None,
+            "total_clicks": None,
+            "total_conversions": None,
+            "avg_cost_per_click": None,
+            "avg_cost_per_conversion": None,
+            "avg_click_through_rate": None,
+            "avg_conversion_rate": None,
+        }
+    return {
+        "total_cost": (
+            round(data.total_cost, 2) if data.total_cost is not None else None
+        ),
+        "total_clicks": (
+            int(data.total_clicks) if data.total_clicks is not None else None
+        ),
+        "total_conversions": (
+            round(data.total_conversions, 2)
+            if data.total_conversions is not None
+            else None
+        ),
+        "avg_cost_per_click": (
+            round(data.avg_cost_per_click, 2)
+            if data.avg_cost_per_click is not None
+            else None
+        ),
+        "avg_cost_per_conversion": (
+            round(data.avg_cost_per_conversion, 2)
+            if data.avg_cost_per_conversion is not None
+            else None
+        ),
+        "avg_click_through_rate": (
+            round(data.avg_click_through_rate * 100, 2)
+            if data.avg_click_through_rate is not None
+            else None
+        ),
+        "avg_conversion_rate": (
+            round(data.avg_conversion_rate * 100, 2)
+            if data.avg_conversion_rate is not None
+            else None
+        ),
+    }
+
+
+# Calculate percentage change
+def calculate_percentage_change(current, before):
+    if before in [0, None]:
+        return None
+    return (
+        round(((current - before) / before) * 100, 2)
+        if current is not None
+        else None
+    )
+
+
+# Safely convert to float
+def safe_float(value):
+    return float(value) if value is not None else None
+
+
+def build_comparison(params, current_row, before_row):
+    """
+    Build the compare_performance response from the aggregated rows of the
+    current and 'before' periods.
+    """
+    current_data = round_metrics(current_row)
+    before_data = round_metrics(before_row)
+
+    return {
+        "date_range": {
+            "from_start_date": params.start_date.strftime(DATE_FORMAT),
+            "from_end_date": params.end_date.strftime(DATE_FORMAT),
+            "before_start_date": params.before_start_date.strftime(DATE_FORMAT),
+            "before_end_date": params.before_end_date.strftime(DATE_FORMAT),
+        },
+        "metrics": {
+            "total_cost": {
+                "current": current_data["total_cost"],
+                "before": before_data["total_cost"],
+                "percentage_change": calculate_percentage_change(
+                    current_data["total_cost"], before_data["total_cost"]
+                ),
+            },
+            "total_clicks": {
+                "current": current_data["total_clicks"],
+                "before": before_data["total_clicks"],
+                "percentage_change": calculate_percentage_change(
+                    current_data["total_clicks"], before_data["total_clicks"]
+                ),
+            },
+            "total_conversions": {
+                "current": current_data["total_conversions"],
+                "before": before_data["total_conversions"],
+                "percentage_change": calculate_percentage_change(
+                    current_data["total_conversions"],
+                    before_data["total_conversions"],
+                ),
+            },
+            "avg_cost_per_click": {
+                "current": current_data["avg_cost_per_click"],
+                "before": before_data["avg_cost_per_click"],
+                "percentage_change": calculate_percentage_change(
+                    current_data["avg_cost_per_click"],
+                    before_data["avg_cost_per_click"],
+                ),
+            },
+            "avg_cost_per_conversion": {
+                "current": current_data["avg_cost_per_conversion"],
+                "before": before_data["avg_cost_per_conversion"],
+                "percentage_change": calculate_percentage_change(
+                    current_data["avg_cost_per_conversion"],
+                    before_data["avg_cost_per_conversion"],
+                ),
+            },
+            "avg_click_through_rate": {
+                "current": safe_float(current_data["avg_click_through_rate"]),
+                "before": safe_float(before_data["avg_click_through_rate"]),
+                "percentage_change": safe_float(
+                    calculate_percentage_change(
+                        current_data["avg_click_through_rate"],
+                        before_data["avg_click_through_rate"],
+                    )
+                ),
+            },
+            "avg_conversion_rate": {
+                "current": current_data["avg_conversion_rate"],
+                "before": before_data["avg_conversion_rate"],
+                "percentage_change": calculate_percentage_change(
+                    current_data["avg_conversion_rate"],
+                    before_data["avg_conversion_rate"],
+                ),
+            },
+        },
+    }
+
+
+def health(**kwargs):
+    """
+    Liveness probe: answers without touching the database.
+    """
+    return jsonify({"status": "ok"}), 200
+
+
+def ready(**kwargs):
+    """
+    Readiness probe: a SELECT 1 on the primary plus connection pool stats,
+    so its cost does not grow with the data.
+    """
+    try:
+        return jsonify({"status": "ready", **check_database()}), 200
+    except SQLAlchemyError as e:
+        logger.error(f"Readiness check failed: {e}")
+        return jsonify({"status": "unavailable", "error": "Database unavailable."}), 503
+
+
+def database_json_enabled(config, dialect_name):
+    """
+    Whether list responses are built as JSON by the db (DATABASE_JSON, only
+    on PostgreSQL; elsewhere the Python path is the only one).
+    """
+    return config.get("DATABASE_JSON", False) and dialect_name == "postgresql"
+
+
+def time_series_rows_statement(params, dialect_name, rollup=False):
+    """
+    The windowed time series statement for TimeSeriesParams, on the daily
+    rollup with ``rollup`` (pass whether it is fresh), else on ad_group_stats.
+    """
+    if rollup:
+        return windowed_time_series_statement(
+            rollup_time_series_statement, params, dialect_name, StatsDailyRollup.date
+        )
+    return windowed_time_series_statement(
+        time_series_statement, params, dialect_name, AdGroupStats.date
+    )
+
+
+def test_app_steps():
+    rows = yield Query(ad_groups_statement())
+    return Reply(serialize_rows(rows))
+
+
+def campaigns_steps(database_json=False):
+    """
+    The /campaigns response: all campaigns with their ad groups and stats, in
+    two set-based reads rather than two queries per campaign, or as JSON built
+    by PostgreSQL with ``database_json``.
+    """
+    if database_json:
+        body = yield Query(campaigns_json_statement(), "scalar")
+        if body is None:
+            return Reply({"message": "No campaigns found."}, 404)
+        return Reply(body, kind="json_text")
+
+    campaigns = yield Query(campaigns_statement())
+    if not campaigns:
+        return Reply({"message": "No campaigns found."}, 404)
+    ad_groups = yield Query(campaigns_ad_groups_statement())
+    stats = yield Query(campaigns_stats_statement())
+    return Reply(summarize_campaigns(campaigns, ad_groups, stats))
+
+
+def rename_steps(data):
+    """PUT /campaign for its JSON payload. The caller commits on success."""
+    campaign_id, new_name = parse_rename_payload(data)
+    updated = yield Query(rename_campaign_statement(campaign_id, new_name), "rowcount")
+    if not updated:
+        return Reply({"message": "Campaign not found."}, 404)
+    return Reply({"message": "Campaign name updated successfully."})
+
+
+def bulk_rename_steps(data, max_items):
+    """PUT /campaigns for its JSON payload. The caller commits on success."""
+    items = parse_bulk_rename_payload(data, max_items)
+    updated = dict((yield Query(bulk_rename_statement(items))))
+    not_updated = [i.campaign_id for i in items if i.campaign_id not in updated]
+    current = {}
+    if not_updated:
+        current = dict((yield Query(campaign_versions_statement(not_updated))))
+    return Reply(bulk_rename_results(items, updated, current))
+
+
+def time_series_bounds_steps(rollup_watermark, cache):
+    """
+    TimeSeriesBounds of what /performance-time-series scans. While the daily
+    rollup is fresh (``rollup_watermark`` is its watermark) that is the
+    rollup, and its bounds are kept in ``cache`` (the app's extensions) until
+    the watermark moves, so requests between refreshes run no extra query;
+    otherwise ad_group_stats, estimated from its ids on every request.
+    """
+    if rollup_watermark is None:
+        row = yield Query(time_series_bounds_statement(), "one")
+        return time_series_bounds_from_row(row)
+
+    key = tuple(rollup_watermark)
+    cached = cache.get("time_series_bounds")
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    row = yield Query(rollup_bounds_statement(), "one")
+    bounds = time_series_bounds_from_row(row)
+    cache["time_series_bounds"] = (key, bounds)
+    return bounds
+
+
+def time_series_bounds():
+    """time_series_bounds_steps() on db.session for the current app."""
+    rollup_watermark = run_steps(fresh_watermark_steps(DAILY_ROLLUP))
+    return run_steps(
+        time_series_bounds_steps(rollup_watermark, current_app.extensions)
+    )
+
+
+def planned_time_series_steps(params, rollup_watermark, cache, scan_budget=None):
+    """plan_time_series(), skipped when there is nothing to plan."""
+    if not params.max_points and not scan_budget:
+        return params
+    bounds = yield from time_series_bounds_steps(rollup_watermark, cache)
+    return plan_time_series(params, bounds, scan_budget)
+
+
+def time_series_steps(
+    params, dialect_name, cache, scan_budget=None, database_json=False
+):
+    """
+    The /performance-time-series response for TimeSeriesParams, summed by the
+    db: from the daily rollup while it is fresh, else from ad_group_stats, as
+    one series or one per campaign, and as JSON built by PostgreSQL with
+    ``database_json``. ``cache`` keeps the rollup's bounds across requests.
+    """
+    rollup = yield from fresh_watermark_steps(DAILY_ROLLUP)
+    params = yield from planned_time_series_steps(params, rollup, cache, scan_budget)
+    headers = {"X-Aggregate-By": params.aggregate_by}
+
+    if params.split_by:
+        if rollup is not None:
+            statement = rollup_campaign_series_statement(params, dialect_name)
+        else:
+            statement = campaign_series_statement(params, dialect_name)
+        rows = yield Query(statement, core=True)
+        return Reply(pivot_campaign_series(rows, params), headers=headers)
+
+    statement = time_series_rows_statement(params, dialect_name, rollup is not None)
+    if database_json:
+        # Built as JSON by PostgreSQL, the Python path below is the reference
+        body = yield Query(time_series_json_statement(params, statement), "scalar")
+        return Reply(body, headers=headers, kind="json_text")
+
+    rows = yield Query(statement)
+    return Reply(
+        format_time_series(rows, params.aggregate_by, params.rolling, params.lag),
+        headers=headers,
+    )
+
+
+def columnar_time_series(store, params):
+    """
+    The /performance-time-series response aggregated in process by the
+    columnar engine. Planned on ad_group_stats' bounds without a scan budget,
+    as nothing is scanned in the db.
+    """
+    params = run_steps(planned_time_series_steps(params, None, current_app.extensions))
+    headers = {"X-Aggregate-By": params.aggregate_by}
+    if params.split_by:
+        series = pivot_campaign_series(store.campaign_series(params), params)
+        return Reply(series, headers=headers)
+    rows = store.time_series(params, window_start(params))
+    return Reply(
+        format_time_series(rows, params.aggregate_by, params.rolling, params.lag),
+        headers=headers,
+    )
+
+
+def comparison_steps(params):
+    """The /compare-performance response for CompareParams."""
+    prefix_sums = yield from fresh_watermark_steps(WATERMARK_NAME)
+    if prefix_sums is not None:
+        # Two index lookups per period instead of scanning its rows
+        current_row = yield from period_totals_from_prefix_steps(
+            params.start_date.date(), params.end_date.date(), params.campaign_id
+        )
+        before_row = yield from period_totals_from_prefix_steps(
+            params.before_start_date.date(),
+            params.before_end_date.date(),
+            params.campaign_id,
+        )
+    else:
+        # Both periods at once
+        current_row, before_row = yield [
+            Query(
+                period_totals_statement(
+                    params.start_date, params.end_date, params.campaign_id
+                ),
+                "first",
+            ),
+            Query(
+                period_totals_statement(
+                    params.before_start_date, params.before_end_date, params.campaign_id
+                ),
+                "first",
+            ),
+        ]
+    return Reply(build_comparison(params, current_row, before_row))
+
+
+def search_steps(params, dialect_name):
+    """The /search response for SearchParams, every type searched at once."""
+    results = yield [
+        Query(search_statement(search_type, params, dialect_name))
+        for search_type in params.types
+    ]
+    return Reply(
+        {
+            f"{search_type}s": serialize_rows(rows)
+            for search_type, rows in zip(params.types, results)
+        }
+    )
+
+
+def rankings_steps(params):
+    rows = yield Query(ranking_statement(params))
+    return Reply(format_ranking(rows, params))
+
+
+def anomalies_steps(params, dialect_name, max_days=0):
+    """
+    The /anomalies response for AnomalyParams, over at most ``max_days`` days.
+    """
+    end = params.end_date
+    if end is None:
+        end = yield Query(select(func.max(AdGroupStats.date)), "scalar")
+    start = params.start_date
+    if end is not None and start is None:
+        days = min(ANOMALY_DEFAULT_DAYS, max_days or ANOMALY_DEFAULT_DAYS)
+        start = end - timedelta(days=days - 1)
+    elif end is not None and params.end_date is None:
+        # Only start_date was given; the range ends with the latest data
+        check_anomaly_days(start, end, max_days)
+
+    scored, flagged, results = 0, 0, []
+    if end is not None and start <= end:
+        scored, flagged, results = yield from detect_anomalies_steps(
+            start,
+            end,
+            dialect_name,
+            metrics=params.metrics,
+            method=params.method,
+            threshold=params.threshold,
+            campaign_id=params.campaign_id,
+            limit=params.limit,
+        )
+
+    return Reply(
+        {
+            "method": params.method,
+            "threshold": params.threshold,
+            "start_date": start.strftime(DATE_FORMAT) if start else None,
+            "end_date": end.strftime(DATE_FORMAT) if end else None,
+            "ad_groups": scored,
+            "flagged": flagged,
+            "results": results,
+        }
+    )
+
+
+def create_import_steps(filename, path):
+    """POST /imports for a saved upload. The caller commits."""
+    job = yield Query(enqueue_import_statement(filename, path), "scalar")
+    return Reply(job.serialize(), 202, {"Location": f"/imports/{job.id}"})
+
+
+def import_job_steps(job_id):
+    job = yield Query(select(ImportJob).where(ImportJob.id == job_id), "scalar")
+    if job is None:
+        return Reply({"message": "Import job not found."}, 404)
+    return Reply(job.serialize())
+
+
+def import_rejects_steps(job_id):
+    """The CSV of an import job's rejected rows, as a Download."""
+    job = yield Query(select(ImportJob).where(ImportJob.id == job_id), "scalar")
+    if job is None:
+        return Reply({"message": "Import job not found."}, 404)
+    if not job.reject_path or not os.path.exists(job.reject_path):
+        return Reply({"message": "The import job has no rejected rows."}, 404)
+    download_name = f"{os.path.splitext(job.filename)[0]}.rejects.csv"
+    return Reply(Download(job.reject_path, "text/csv", download_name), kind="file")
+
+
+def json_text_response(body, status=200, headers=None):
+    """A response of JSON text as it came from the db, not decoded or re-encoded."""
+    return current_app.response_class(
+        body + "\n", status=status, headers=headers, mimetype=current_app.json.mimetype
+    )
+
+
+def flask_response(reply):
+    """A Reply as the return value of a Flask view."""
+    if reply.kind == "json_text":
+        return json_text_response(reply.body, reply.status, reply.headers)
+    if reply.kind == "file":
+        response = send_file(
+            reply.body.path,
+            mimetype=reply.body.mimetype,
+            as_attachment=True,
+            download_name=reply.body.download_name,
+        )
+        response.headers.update(reply.headers or {})
+        return response
+    return jsonify(reply.body), reply.status, reply.headers or {}
+
+
+def commit_reply(reply):
+    """Commit a write's transaction when its Reply is a success, else roll back."""
+    if reply.status < 400:
+        db.session.commit()
+    else:
+        db.session.rollback()
 
-            campaign_data = {
-                "campaign_id": campaign.campaign_id,
-                "campaign_name": campaign.campaign_name,
-                "campaign_type": campaign.campaign_type,
-                "ad_group_count": ad_group_count,
-                "ad_group_names": ad_group_names,
-                "average_monthly_cost": round(avg_monthly_cost, 2),
-                "average_cost_per_conversion": round(avg_cost_per_conversion, 2),
-            }
 
-            logger.debug(f"Campaign Data: {campaign_data}")
-            result.append(campaign_data)
+@read_only
+def test_app():
+    return flask_response(run_steps(test_app_steps()))
+
+
+@read_only
+def get_campaigns(**kwargs):
+    """
+    Retrieve all campaigns along with their related ad groups and statistics.
+    """
+    try:
+        logger.info("Fetching all Campaigns.")
+        reply = run_steps(
+            campaigns_steps(
+                database_json_enabled(current_app.config, db.engine.dialect.name)
+            )
+        )
 
-        logger.info(f"Successfully fetched data for {len(result)} campaigns.")
-        return jsonify(result), 200
+        if reply.status == 404:
+            logger.warning("No campaigns found.")
+        elif reply.kind == "json_text":
+            logger.info(f"Fetched campaigns as {len(reply.body)} characters of JSON.")
+        else:
+            logger.info(f"Successfully fetched data for {len(reply.body)} campaigns.")
+        return flask_response(reply)
 
     except SQLAlchemyError as e:
         logger.error(f"Database error while fetching campaigns: {e}")
@@ -120,241 +2138,102 @@ def update_campaign_name(**kwargs):
     Update the name of a specific campaign.
     """
     try:
-        data = request.get_json()
         logger.info("Received request to update campaign name.")
 
-        if not data:
-            logger.warning("No JSON payload provided.")
-            return jsonify({"message": "No input data provided."}), 400
+        reply = run_steps(rename_steps(request.get_json(silent=True)))
+        commit_reply(reply)
 
-        campaign_id = data.get("campaign_id")
-        new_name = data.get("new_name")
+        if reply.status == 404:
+            logger.warning("Campaign not found.")
+        else:
+            logger.info("Campaign name updated.")
+        return flask_response(reply)
+
+    except ServiceError as e:
+        return jsonify(e.to_body()), e.status
+    except SQLAlchemyError as e:
+        logger.error(f"Database error while updating campaign name: {e}")
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
+    except Exception as e:
+        logger.exception(f"Unexpected error in update_campaign_name: {e}")
+        db.session.rollback()
+        return jsonify({"error": "An unexpected error occurred."}), 500
 
-        if not campaign_id or not new_name:
-            logger.warning("Missing required fields: campaign_id or new_name.")
-            return (
-                jsonify(
-                    {"message": "Missing required fields: campaign_id and new_name."}
-                ),
-                400,
-            )
 
-        # Check for duplicate campaign names if duplicates are not allowed
-        # name_exists = (
-        #     db.session.execute(
-        #         select(Campaign).where(Campaign.campaign_name == new_name)
-        #     )
-        #     .scalars()
-        #     .first()
-        # )
-        # if name_exists:
-        #     logger.warning(f"Duplicate campaign name attempted: {new_name}")
-        #     return (
-        #         jsonify(
-        #             {
-        #                 "message": "Campaign name already exists. Please choose a different name."
-        #             }
-        #         ),
-        #         400,
-        #     )
-
-        # Fetch the campaign
-        campaign = (
-            db.session.execute(
-                select(Campaign).where(Campaign.campaign_id == campaign_id)
+def bulk_update_campaign_names(**kwargs):
+    """
+    Rename many campaigns in one statement. Items carrying a "version" are only
+    applied if the campaign still has that version; the others are reported as
+    conflicts, so concurrent edits are detected without locking.
+    """
+    try:
+        logger.info("Received request to bulk update campaign names.")
+
+        reply = run_steps(
+            bulk_rename_steps(
+                request.get_json(silent=True),
+                current_app.config["BULK_RENAME_MAX_ITEMS"],
             )
-            .scalars()
-            .first()
         )
+        commit_reply(reply)
 
-        if not campaign:
-            logger.warning(f"Campaign not found: ID {campaign_id}")
-            return jsonify({"message": "Campaign not found."}), 404
-
-        # Update the campaing name
-        campaign.campaign_name = new_name
-        db.session.commit()
-        logger.info(f"Campaign ID {campaign_id} name updated to {new_name}.")
-        return jsonify({"message": "Campaign name updated successfully."}), 200
+        logger.info(
+            f"Bulk renamed {reply.body['updated']} of "
+            f"{len(reply.body['results'])} campaigns."
+        )
+        return flask_response(reply)
 
+    except ServiceError as e:
+        return jsonify(e.to_body()), e.status
     except SQLAlchemyError as e:
-        logger.error(f"Database error while updating campaign name: {e}")
+        logger.error(f"Database error while bulk updating campaign names: {e}")
         db.session.rollback()
         return jsonify({"error": "Database error occurred."}), 500
     except Exception as e:
-        logger.exception(f"Unexpected error in update_campaign_name: {e}")
+        logger.exception(f"Unexpected error in bulk_update_campaign_names: {e}")
         db.session.rollback()
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 
+@read_only
 def performance_time_series(**kwargs):
     """
-    Retrieve performance metrics aggregated by day, week, or month.
+    Retrieve performance metrics aggregated by day, week, month or quarter.
+    With max_points the bucket is coarsened to return at most that many
+    periods; the one used is in the X-Aggregate-By header. With
+    split_by=campaign there is one series per campaign on a shared period
+    axis instead.
     """
     try:
         logger.info("Fetching performance time series data.")
 
-        # Get query parameters
-        aggregate_by = request.args.get("aggregate_by")
-        campaigns_param = request.args.get("campaigns")
-        start_date = request.args.get("start_date")
-        end_date = request.args.get("end_date")
-
-        # Input Validation
-        if not aggregate_by:
-            logger.warning("Missing 'aggregate_by' parameter.")
-            return jsonify({"error": "aggregate_by parameter is required."}), 400
-
-        if aggregate_by not in ["day", "week", "month"]:
-            logger.warning(f"Invalid 'aggregate_by' parameter: {aggregate_by}")
-            return (
-                jsonify({"error": "aggregate_by must be one of: day, week, month."}),
-                400,
-            )
-
-        # Prepare base query for AdGroupStats. Furtjer on the query is added based on the input parameters
-        query = AdGroupStats.query
-
-        # Handle campaign filtering (comma-separated values)
-        campaigns = []
-        if campaigns_param:
-            try:
-                campaigns = [
-                    int(c.strip())
-                    for c in campaigns_param.split(",")
-                    if c.strip().isdigit()
-                ]
-                logger.info(f"Filtering by Campaign IDs: {campaigns}")
-            except ValueError:
-                logger.warning("Invalid format for 'campaigns' parameter.")
-                return (
-                    jsonify(
-                        {
-                            "error": "Invalid format for campaigns parameter. Must be comma-separated integers."
-                        }
-                    ),
-                    400,
-                )
-
-        if campaigns:
-            query = query.join(AdGroup).filter(AdGroup.campaign_id.in_(campaigns))
-
-        # Validate and parse dates
-        date_format = "%Y-%m-%d"
-        if start_date:
-            try:
-                start_date_obj = datetime.strptime(start_date, date_format)
-                query = query.filter(AdGroupStats.date >= start_date_obj)
-                logger.info(f"Filtering from start_date: {start_date}")
-            except ValueError:
-                logger.warning("Invalid 'start_date' format.")
-                return (
-                    jsonify({"error": "Invalid start_date format. Use YYYY-MM-DD."}),
-                    400,
-                )
+        params = parse_time_series_params(request.args)
 
-        if end_date:
-            try:
-                end_date_obj = datetime.strptime(end_date, date_format)
-                query = query.filter(AdGroupStats.date <= end_date_obj)
-                logger.info(f"Filtering up to end_date: {end_date}")
-            except ValueError:
-                logger.warning("Invalid 'end_date' format.")
-                return (
-                    jsonify({"error": "Invalid end_date format. Use YYYY-MM-DD."}),
-                    400,
-                )
-
-        # Define group_by based on aggregate_by | func.date() is for precision at the day level, func.date_trunc() is for broader time ranges like weeks or months.
-        if aggregate_by == "day":
-            group_by = func.date(AdGroupStats.date)
-        elif aggregate_by == "week":
-            group_by = func.date_trunc("week", AdGroupStats.date)
-        elif aggregate_by == "month":
-            group_by = func.date_trunc("month", AdGroupStats.date)
-
-        # Aggregate metrics
-        performance_data = (
-            query.with_entities(
-                group_by.label("period"),
-                func.sum(AdGroupStats.cost).label("total_cost"),
-                func.sum(AdGroupStats.clicks).label("total_clicks"),
-                func.sum(AdGroupStats.conversions).label("total_conversions"),
-                func.sum(AdGroupStats.impressions).label("total_impressions"),
-                func.avg(AdGroupStats.cost / func.nullif(AdGroupStats.clicks, 0)).label(
-                    "avg_cost_per_click"
-                ),
-                func.avg(
-                    AdGroupStats.cost / func.nullif(AdGroupStats.conversions, 0)
-                ).label("avg_cost_per_conversion"),
-                (
-                    func.sum(AdGroupStats.clicks)
-                    / func.nullif(func.sum(AdGroupStats.impressions), 0)
-                ).label("avg_click_through_rate"),
-                (
-                    func.sum(AdGroupStats.conversions)
-                    / func.nullif(func.sum(AdGroupStats.clicks), 0)
-                ).label("avg_conversion_rate"),
+        # Identical concurrent requests share one aggregation
+        store = get_columnar_store()
+        if store is not None:
+            reply = coalesce(
+                ("columnar_time_series", params), columnar_time_series, store, params
             )
-            .group_by(group_by)
-            .order_by(group_by)
-            .all()
-        )
-
-        # Format the results
-        result = []
-        for row in performance_data:
-            period = row.period
-            if isinstance(period, datetime):
-                if aggregate_by == "day":
-                    formatted_period = period.strftime("%Y-%m-%d")
-                elif aggregate_by == "week":
-                    formatted_period = period.strftime("%Y-%U")
-                elif aggregate_by == "month":
-                    formatted_period = period.strftime("%Y-%m")
-            else:
-                formatted_period = str(period)
-
-            record = {
-                "period": formatted_period,
-                "total_cost": (
-                    round(row.total_cost, 2) if row.total_cost is not None else None
-                ),
-                "total_clicks": row.total_clicks,
-                "total_conversions": (
-                    round(row.total_conversions, 2)
-                    if row.total_conversions is not None
-                    else None
+        else:
+            reply = coalesce(
+                ("time_series", params),
+                run_steps,
+                time_series_steps(
+                    params,
+                    db.engine.dialect.name,
+                    current_app.extensions,
+                    current_app.config.get("TIME_SERIES_SCAN_BUDGET_ROWS"),
+                    database_json_enabled(current_app.config, db.engine.dialect.name),
                 ),
-                "avg_cost_per_click": (
-                    round(row.avg_cost_per_click, 2)
-                    if row.avg_cost_per_click is not None
-                    else None
-                ),
-                "avg_cost_per_conversion": (
-                    round(row.avg_cost_per_conversion, 2)
-                    if row.avg_cost_per_conversion is not None
-                    else None
-                ),
-                "avg_click_through_rate": (
-                    float(round(row.avg_click_through_rate * 100, 2))
-                    if row.avg_click_through_rate is not None
-                    else None
-                ),
-                "avg_conversion_rate": (
-                    round(row.avg_conversion_rate, 2)
-                    if row.avg_conversion_rate is not None
-                    else None
-                ),
-            }
-            logger.debug(f"Performance Record: {record}")
-            result.append(record)
+            )
 
-        logger.info(
-            f"Successfully fetched performance data with {len(result)} records."
-        )
-        return jsonify(result), 200
+        logger.info(f"Fetched performance data by {reply.headers['X-Aggregate-By']}.")
+        return flask_response(reply)
 
+    except ServiceError as e:
+        return jsonify(e.to_body()), e.status
     except SQLAlchemyError as e:
         logger.error(f"Database error in performance_time_series: {e}")
         db.session.rollback()
@@ -364,6 +2243,7 @@ def performance_time_series(**kwargs):
         return jsonify({"error": "An unexpected error occurred."}), 500
 
 
+@read_only
 def compare_performance(**kwargs):
     """
     Compare performance metrics between two periods.
@@ -371,244 +2251,168 @@ def compare_performance(**kwargs):
     try:
         logger.info("Comparing performance between periods.")
 
-        # Get query parameters
-        start_date = request.args.get("start_date")
-        end_date = request.args.get("end_date")
-        compare_mode = request.args.get("compare_mode")
-
-        # Input Validation
-        if not start_date or not end_date:
-            logger.warning("Missing 'start_date' or 'end_date' parameters.")
-            return (
-                jsonify({"error": "start_date and end_date parameters are required."}),
-                400,
-            )
+        params = parse_compare_params(request.args)
+        reply = coalesce(("comparison", params), run_steps, comparison_steps(params))
 
-        if compare_mode not in ["preceding", "previous_month"]:
-            logger.warning(f"Invalid 'compare_mode' parameter: {compare_mode}")
-            return (
-                jsonify(
-                    {
-                        "error": 'Invalid compare_mode. Must be "preceding" or "previous_month".'
-                    }
-                ),
-                400,
-            )
+        logger.info("Successfully compared performance metrics.")
+        return flask_response(reply)
 
-        # Convert dates
-        date_format = "%Y-%m-%d"
-        try:
-            start_date_obj = datetime.strptime(start_date, date_format)
-            end_date_obj = datetime.strptime(end_date, date_format)
-            if start_date_obj > end_date_obj:
-                logger.warning("'start_date' is after 'end_date'.")
-                return (
-                    jsonify(
-                        {"error": "start_date must be before or equal to end_date."}
-                    ),
-                    400,
-                )
-            logger.info(f"Date range: {start_date} to {end_date}")
-        except ValueError:
-            logger.warning("Invalid date format provided.")
-            return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
-
-        # Calculate 'before' period based on compare_mode
-        days_diff = (end_date_obj - start_date_obj).days + 1
-        if compare_mode == "preceding":
-            before_start_date = start_date_obj - timedelta(days=days_diff)
-            before_end_date = end_date_obj - timedelta(days=days_diff)
-            logger.info(
-                f"Comparing with preceding period: {before_start_date} to {before_end_date}"
-            )
-        elif compare_mode == "previous_month":
-            try:
-                before_start_date = (start_date_obj - timedelta(days=30)).replace(
-                    day=start_date_obj.day
-                )
-                before_end_date = (end_date_obj - timedelta(days=30)).replace(
-                    day=end_date_obj.day
-                )
-                logger.info(
-                    f"Comparing with previous month period: {before_start_date} to {before_end_date}"
-                )
-            except ValueError as e:
-                logger.error(f"Error calculating previous month dates: {e}")
-                return (
-                    jsonify({"error": "Error calculating previous month dates."}),
-                    400,
-                )
+    except ServiceError as e:
+        return jsonify(e.to_body()), e.status
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in compare_performance: {e}")
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
+    except Exception as e:
+        logger.exception(f"Unexpected error in compare_performance: {e}")
+        db.session.rollback()
+        return jsonify({"error": "An unexpected error occurred."}), 500
 
-        # Helper function to get aggregated performance data
-        def get_performance_data(start, end):
-            logger.debug(f"Fetching performance data from {start} to {end}.")
-            return (
-                AdGroupStats.query.with_entities(
-                    func.sum(AdGroupStats.cost).label("total_cost"),
-                    func.sum(AdGroupStats.clicks).label("total_clicks"),
-                    func.sum(AdGroupStats.conversions).label("total_conversions"),
-                    func.sum(AdGroupStats.impressions).label("total_impressions"),
-                    func.avg(
-                        AdGroupStats.cost / func.nullif(AdGroupStats.clicks, 0)
-                    ).label("avg_cost_per_click"),
-                    func.avg(
-                        AdGroupStats.cost / func.nullif(AdGroupStats.conversions, 0)
-                    ).label("avg_cost_per_conversion"),
-                    (
-                        func.sum(AdGroupStats.clicks)
-                        / func.nullif(func.sum(AdGroupStats.impressions), 0)
-                    ).label("avg_click_through_rate"),
-                    (
-                        func.sum(AdGroupStats.conversions)
-                        / func.nullif(func.sum(AdGroupStats.clicks), 0)
-                    ).label("avg_conversion_rate"),
-                )
-                .filter(AdGroupStats.date >= start, AdGroupStats.date <= end)
-                .first()
-            )
 
-        # Round and format metrics
-        def round_metrics(data):
-            if not data:
-                return {
-                    "total_cost": None,
-                    "total_clicks": None,
-                    "total_conversions": None,
-                    "avg_cost_per_click": None,
-                    "avg_cost_per_conversion": None,
-                    "avg_click_through_rate": None,
-                    "avg_conversion_rate": None,
-                }
-            return {
-                "total_cost": (
-                    round(data.total_cost, 2) if data.total_cost is not None else None
-                ),
-                "total_clicks": (
-                    int(data.total_clicks) if data.total_clicks is not None else None
-                ),
-                "total_conversions": (
-                    round(data.total_conversions, 2)
-                    if data.total_conversions is not None
-                    else None
-                ),
-                "avg_cost_per_click": (
-                    round(data.avg_cost_per_click, 2)
-                    if data.avg_cost_per_click is not None
-                    else None
-                ),
-                "avg_cost_per_conversion": (
-                    round(data.avg_cost_per_conversion, 2)
-                    if data.avg_cost_per_conversion is not None
-                    else None
-                ),
-                "avg_click_through_rate": (
-                    round(data.avg_click_through_rate * 100, 2)
-                    if data.avg_click_through_rate is not None
-                    else None
-                ),
-                "avg_conversion_rate": (
-                    round(data.avg_conversion_rate * 100, 2)
-                    if data.avg_conversion_rate is not None
-                    else None
-                ),
-            }
-
-        # Calculate percentage change
-        def calculate_percentage_change(current, before):
-            if before in [0, None]:
-                return None
-            return (
-                round(((current - before) / before) * 100, 2)
-                if current is not None
-                else None
-            )
+@read_only
+def search(**kwargs):
+    """
+    Search campaigns and ad groups by name, for typeahead.
+    """
+    try:
+        params = parse_search_params(request.args)
+        logger.info(f"Searching {', '.join(params.types)} ({params.mode}): {params.query}")
+
+        return flask_response(run_steps(search_steps(params, db.engine.dialect.name)))
+
+    except ServiceError as e:
+        return jsonify(e.to_body()), e.status
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in search: {e}")
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
+    except Exception as e:
+        logger.exception(f"Unexpected error in search: {e}")
+        db.session.rollback()
+        return jsonify({"error": "An unexpected error occurred."}), 500
 
-        # Fetch performance data
-        current_data = round_metrics(get_performance_data(start_date_obj, end_date_obj))
-        before_data = round_metrics(
-            get_performance_data(before_start_date, before_end_date)
+
+@read_only
+def rankings(**kwargs):
+    """
+    Rank ad groups or campaigns by a metric over a date range.
+    """
+    try:
+        params = parse_ranking_params(request.args)
+        logger.info(
+            f"Ranking {params.level}s by {params.metric} ({params.order} {params.limit})."
         )
 
-        # Safely convert to float
-        def safe_float(value):
-            return float(value) if value is not None else None
-
-        # Construct the response
-        response = {
-            "date_range": {
-                "from_start_date": start_date_obj.strftime(date_format),
-                "from_end_date": end_date_obj.strftime(date_format),
-                "before_start_date": before_start_date.strftime(date_format),
-                "before_end_date": before_end_date.strftime(date_format),
-            },
-            "metrics": {
-                "total_cost": {
-                    "current": current_data["total_cost"],
-                    "before": before_data["total_cost"],
-                    "percentage_change": calculate_percentage_change(
-                        current_data["total_cost"], before_data["total_cost"]
-                    ),
-                },
-                "total_clicks": {
-                    "current": current_data["total_clicks"],
-                    "before": before_data["total_clicks"],
-                    "percentage_change": calculate_percentage_change(
-                        current_data["total_clicks"], before_data["total_clicks"]
-                    ),
-                },
-                "total_conversions": {
-                    "current": current_data["total_conversions"],
-                    "before": before_data["total_conversions"],
-                    "percentage_change": calculate_percentage_change(
-                        current_data["total_conversions"],
-                        before_data["total_conversions"],
-                    ),
-                },
-                "avg_cost_per_click": {
-                    "current": current_data["avg_cost_per_click"],
-                    "before": before_data["avg_cost_per_click"],
-                    "percentage_change": calculate_percentage_change(
-                        current_data["avg_cost_per_click"],
-                        before_data["avg_cost_per_click"],
-                    ),
-                },
-                "avg_cost_per_conversion": {
-                    "current": current_data["avg_cost_per_conversion"],
-                    "before": before_data["avg_cost_per_conversion"],
-                    "percentage_change": calculate_percentage_change(
-                        current_data["avg_cost_per_conversion"],
-                        before_data["avg_cost_per_conversion"],
-                    ),
-                },
-                "avg_click_through_rate": {
-                    "current": safe_float(current_data["avg_click_through_rate"]),
-                    "before": safe_float(before_data["avg_click_through_rate"]),
-                    "percentage_change": safe_float(
-                        calculate_percentage_change(
-                            current_data["avg_click_through_rate"],
-                            before_data["avg_click_through_rate"],
-                        )
-                    ),
-                },
-                "avg_conversion_rate": {
-                    "current": current_data["avg_conversion_rate"],
-                    "before": before_data["avg_conversion_rate"],
-                    "percentage_change": calculate_percentage_change(
-                        current_data["avg_conversion_rate"],
-                        before_data["avg_conversion_rate"],
-                    ),
-                },
-            },
-        }
+        reply = coalesce(("rankings", params), run_steps, rankings_steps(params))
+        return flask_response(reply)
 
-        logger.info("Successfully compared performance metrics.")
-        return jsonify(response), 200
+    except ServiceError as e:
+        return jsonify(e.to_body()), e.status
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in rankings: {e}")
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
+    except Exception as e:
+        logger.exception(f"Unexpected error in rankings: {e}")
+        db.session.rollback()
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+
+@read_only
+def anomalies(**kwargs):
+    """
+    Ad group days whose cost or CPA is far off the ad group's own baseline.
+    """
+    try:
+        max_days = current_app.config.get("ANOMALY_MAX_DAYS", 0)
+        params = parse_anomaly_params(request.args, max_days)
+        logger.info(f"Detecting {params.method} anomalies in {params.metrics}.")
+
+        reply = coalesce(
+            ("anomalies", params),
+            run_steps,
+            anomalies_steps(params, db.engine.dialect.name, max_days),
+        )
+        return flask_response(reply)
 
+    except ServiceError as e:
+        return jsonify(e.to_body()), e.status
     except SQLAlchemyError as e:
-        logger.error(f"Database error in compare_performance: {e}")
+        logger.error(f"Database error in anomalies: {e}")
         db.session.rollback()
         return jsonify({"error": "Database error occurred."}), 500
     except Exception as e:
-        logger.exception(f"Unexpected error in compare_performance: {e}")
+        logger.exception(f"Unexpected error in anomalies: {e}")
         db.session.rollback()
         return jsonify({"error": "An unexpected error occurred."}), 500
+
+
+def save_upload(upload, upload_dir):
+    """
+    Store an uploaded workbook under a unique name and return its path.
+    Only .xlsx files are accepted.
+    """
+    if upload is None or not upload.filename:
+        raise ServiceError("A workbook must be uploaded in the 'file' field.")
+    filename = secure_filename(upload.filename)
+    if not filename.lower().endswith(".xlsx"):
+        raise ServiceError("Only .xlsx workbooks can be imported.")
+
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, f"{uuid.uuid4().hex}_{filename}")
+    upload.save(path)
+    return filename, path
+
+
+def create_import_job(**kwargs):
+    """
+    Queue an uploaded workbook for import. The import runs in the import
+    workers (flask import-worker); poll the returned job for its progress.
+    """
+    try:
+        filename, path = save_upload(
+            request.files.get("file"), current_app.config["IMPORT_UPLOAD_DIR"]
+        )
+        reply = run_steps(create_import_steps(filename, path))
+        db.session.commit()
+        logger.info(f"Queued import job {reply.body['id']} for {filename}.")
+        return flask_response(reply)
+
+    except ServiceError as e:
+        return jsonify(e.to_body()), e.status
+    except SQLAlchemyError as e:
+        logger.error(f"Database error while queueing an import: {e}")
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
+    except Exception as e:
+        logger.exception(f"Unexpected error in create_import_job: {e}")
+        db.session.rollback()
+        return jsonify({"error": "An unexpected error occurred."}), 500
+
+
+def get_import_job(job_id, **kwargs):
+    """
+    Status of an import job: rows processed so far, throughput and the error
+    if it failed.
+    """
+    try:
+        return flask_response(run_steps(import_job_steps(job_id)))
+
+    except SQLAlchemyError as e:
+        logger.error(f"Database error while fetching import job {job_id}: {e}")
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
+
+
+def get_import_job_rejects(job_id, **kwargs):
+    """
+    The rows of an import job's workbook that failed validation, as CSV with
+    the sheet, row number and reasons of each.
+    """
+    try:
+        return flask_response(run_steps(import_rejects_steps(job_id)))
+
+    except SQLAlchemyError as e:
+        logger.error(f"Database error while fetching import job {job_id}: {e}")
+        db.session.rollback()
+        return jsonify({"error": "Database error occurred."}), 500
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import threading
+
+from flask import current_app
+
+from app.routing import pinned_to_primary
+
+logger = logging.getLogger(__name__)
+
+
+def init_single_flight(app):
+    """Attach a SingleFlight to the app when SINGLE_FLIGHT is enabled."""
+    if app.config.get("SINGLE_FLIGHT"):
+        app.extensions["single_flight"] = SingleFlight(
+            wait_timeout=app.config.get("SINGLE_FLIGHT_WAIT_SECONDS", 30)
+        )
+
+
+def coalesce(key, fn, *args):
+    """
+    ``fn(*args)``, shared with every concurrent call for the same ``key`` in
+    this process when single-flight is enabled. ``key`` must be hashable and
+    identify the result completely, e.g. the name of the computation plus its
+    parsed params namedtuple. The result may be handed to several requests, so
+    callers must not mutate it.
+
+    A client pinned to the primary after its own write computes alone: a
+    shared result may come from a replica, or from before that write.
+    """
+    flight = current_app.extensions.get("single_flight")
+    if flight is None or pinned_to_primary():
+        return fn(*args)
+    return flight.do(key, fn, *args)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    De-duplicates concurrent identical computations.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it runs wait for it and get the same result, or the same
+    exception. Nothing is cached: once the leader is done the key is free, and
+    the next caller computes afresh. A waiter that has waited
+    ``wait_timeout`` seconds stops waiting and computes on its own.
+    """
+
+    def __init__(self, wait_timeout=30):
+        self.wait_timeout = wait_timeout
+        self.computed = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                logger.warning(f"Gave up waiting for {key!r}, computing it again.")
+                return fn(*args)
+            with self._lock:
+                self.shared += 1
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.computed += 1
+            call.done.set()
+            if call.waiters:
+                logger.info(f"Shared {key!r} with {call.waiters} waiting requests.")
+        return call.value
+
+    def waiting(self, key):
+        """How many callers wait on the in-flight call for ``key`` (0 if none)."""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines sharing one event loop, as in the ASGI mode.
+
+    The leader's computation runs as a task that every caller for the same
+    key awaits, so it finishes even if the leader's request goes away. A
+    waiter that has waited ``wait_timeout`` seconds computes on its own.
+    """
+
+    def __init__(self, wait_timeout=30):
+        self.wait_timeout = wait_timeout
+        self.computed = 0
+        self.shared = 0
+        self._calls = {}
+
+    async def do(self, key, fn, *args):
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = call = [task, 0]
+            task.add_done_callback(lambda task: self._done(key, task))
+            return await asyncio.shield(task)
+
+        task = call[0]
+        call[1] += 1
+        # asyncio.wait() neither cancels the task on timeout nor on our cancel
+        done, _ = await asyncio.wait([task], timeout=self.wait_timeout)
+        if not done:
+            logger.warning(f"Gave up waiting for {key!r}, computing it again.")
+            return await fn(*args)
+        self.shared += 1
+        return task.result()
+
+    def _done(self, key, task):
+        task, waiters = self._calls.pop(key)
+        self.computed += 1
+        if not task.cancelled():
+            # Retrieved here in case nobody awaits it any more
+            task.exception()
+        if waiters:
+            logger.info(f"Shared {key!r} with {waiters} waiting requests.")
+
+    def waiting(self, key):
+        """How many callers wait on the in-flight call for ``key`` (0 if none)."""
+        call = self._calls.get(key)
+        return call[1] if call is not None else 0
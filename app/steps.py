@@ -0,0 +1,45 @@
+from collections import namedtuple
+
+from app import db
+from app.executor import run_parallel
+
+# One statement for a step function to run. ``fetch`` is what comes back: "all"
+# rows, the "first" row or None, exactly "one" row, a "scalar" or the
+# "rowcount". ``core`` runs it on the session's connection, for plain tuples
+# instead of ORM rows.
+Query = namedtuple("Query", ["statement", "fetch", "core"], defaults=["all", False])
+
+
+def fetch(result, how):
+    """The part of a buffered Result a Query asked for."""
+    if how == "rowcount":
+        return result.rowcount
+    return getattr(result, how)()
+
+
+def execute(query):
+    """Run a Query on db.session."""
+    if query.core:
+        return fetch(db.session.connection().execute(query.statement), query.fetch)
+    return fetch(db.session.execute(query.statement), query.fetch)
+
+
+def run_steps(steps):
+    """
+    Drive a step function on db.session and return what it returns.
+
+    Step functions hold an endpoint's logic without doing any I/O, so the
+    Flask views and the ASGI app (app/asgi.py) share it: they yield a Query
+    and get its result sent back, or yield a list of Queries, run here with
+    run_parallel(), and get the list of results.
+    """
+    result = None
+    while True:
+        try:
+            query = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+        if isinstance(query, list):
+            result = run_parallel([(execute, (q,)) for q in query])
+        else:
+            result = execute(query)
@@ -0,0 +1,171 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, text
+
+from app import db
+from app.importer import SHEET_COLUMNS, storage_frame, write_stats_frame
+from app.models import Campaign, AdGroup, AdGroupStats
+
+
+DEVICES = ["mobile", "desktop", "tablet", "connected_tv"]
+# Relative traffic share of each device, same order as DEVICES
+DEVICE_SHARE = np.array([0.55, 0.33, 0.09, 0.03])
+CAMPAIGN_TYPES = ["SEARCH", "DISPLAY", "VIDEO", "SHOPPING"]
+# Monday..Sunday traffic multipliers
+WEEKDAY_SEASONALITY = np.array([1.05, 1.08, 1.06, 1.02, 0.95, 0.90, 0.94])
+
+# Generated stats frames have the columns of an import workbook's stats sheet
+GENERATED_COLUMNS = SHEET_COLUMNS["ad_group_stats"]
+
+
+class SyntheticDataset:
+    """
+    Deterministic synthetic campaigns, ad groups and daily per-device stats.
+
+    Every ad group gets its own traffic level, click-through rate, conversion
+    rate and cost per click. Daily rows are drawn from those with weekday
+    seasonality and noise. Each day is drawn from its own seeded generator,
+    so the output does not depend on how the days are chunked.
+    """
+
+    def __init__(
+        self,
+        campaigns=50,
+        ad_groups_per_campaign=20,
+        days=365,
+        devices=3,
+        end_date=None,
+        seed=42,
+    ):
+        if not 1 <= devices <= len(DEVICES):
+            raise ValueError(f"devices must be between 1 and {len(DEVICES)}.")
+        self.campaigns = campaigns
+        self.ad_groups_per_campaign = ad_groups_per_campaign
+        self.days = days
+        self.devices = devices
+        self.end_date = end_date or date.today()
+        self.start_date = self.end_date - timedelta(days=days - 1)
+        self.seed = seed
+
+        n_ad_groups = campaigns * ad_groups_per_campaign
+        rng = np.random.default_rng([seed, 0])
+        self.ad_group_ids = np.arange(1, n_ad_groups + 1, dtype=np.int64)
+        self.ad_group_campaign_ids = np.repeat(
+            np.arange(1, campaigns + 1, dtype=np.int64), ad_groups_per_campaign
+        )
+        self.base_impressions = rng.lognormal(mean=6.0, sigma=1.2, size=n_ad_groups)
+        self.ctr = rng.beta(2.0, 40.0, size=n_ad_groups)
+        self.cvr = rng.beta(2.0, 25.0, size=n_ad_groups)
+        self.cpc = rng.lognormal(mean=0.0, sigma=0.6, size=n_ad_groups)
+
+        share = DEVICE_SHARE[:devices]
+        self.device_share = share / share.sum()
+
+    @property
+    def rows(self):
+        return len(self.ad_group_ids) * self.devices * self.days
+
+    def campaign_rows(self):
+        return [
+            {
+                "campaign_id": campaign_id,
+                "campaign_name": f"Campaign {campaign_id}",
+                "campaign_type": CAMPAIGN_TYPES[campaign_id % len(CAMPAIGN_TYPES)],
+            }
+            for campaign_id in range(1, self.campaigns + 1)
+        ]
+
+    def ad_group_rows(self):
+        return [
+            {
+                "ad_group_id": int(ad_group_id),
+                "ad_group_name": f"Ad Group {campaign_id}-{ad_group_id}",
+                "campaign_id": int(campaign_id),
+            }
+            for ad_group_id, campaign_id in zip(
+                self.ad_group_ids, self.ad_group_campaign_ids
+            )
+        ]
+
+    def day_frame(self, day_offset):
+        """All stats rows for one day as a DataFrame with GENERATED_COLUMNS."""
+        rng = np.random.default_rng([self.seed, 1, day_offset])
+        day = self.start_date + timedelta(days=day_offset)
+        n_ad_groups = len(self.ad_group_ids)
+        n = n_ad_groups * self.devices
+
+        # Row layout: ad group major, device minor
+        group_index = np.repeat(np.arange(n_ad_groups), self.devices)
+        device_index = np.tile(np.arange(self.devices), n_ad_groups)
+
+        expected = (
+            self.base_impressions[group_index]
+            * self.device_share[device_index]
+            * WEEKDAY_SEASONALITY[day.weekday()]
+            * self.devices
+        )
+        impressions = rng.poisson(expected)
+        clicks = rng.binomial(impressions, self.ctr[group_index])
+        conversions = rng.binomial(clicks, self.cvr[group_index]).astype(np.float64)
+        cost = np.round(
+            clicks * self.cpc[group_index] * rng.gamma(20.0, 1 / 20.0, size=n), 2
+        )
+
+        return pd.DataFrame(
+            {
+                "date": np.full(n, day),
+                "ad_group_id": self.ad_group_ids[group_index],
+                "device": np.array(DEVICES[: self.devices])[device_index],
+                "impressions": impressions,
+                "clicks": clicks,
+                "conversions": conversions,
+                "cost": cost,
+            },
+            columns=GENERATED_COLUMNS,
+        )
+
+    def stats_chunks(self, chunk_rows=500_000):
+        """Yield DataFrames of whole days, each roughly ``chunk_rows`` long."""
+        rows_per_day = len(self.ad_group_ids) * self.devices
+        days_per_chunk = max(1, chunk_rows // max(rows_per_day, 1))
+        for first in range(0, self.days, days_per_chunk):
+            last = min(first + days_per_chunk, self.days)
+            yield pd.concat(
+                [self.day_frame(offset) for offset in range(first, last)],
+                ignore_index=True,
+            )
+
+
+def truncate_ad_data():
+    """Remove all campaigns, ad groups and stats."""
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute(text("TRUNCATE ad_group_stats, ad_group, campaign"))
+    else:
+        db.session.query(AdGroupStats).delete()
+        db.session.query(AdGroup).delete()
+        db.session.query(Campaign).delete()
+    db.session.commit()
+
+
+def write_dataset(dataset, chunk_rows=500_000, progress=None):
+    """
+    Write ``dataset`` into the current app's database through the fastest bulk
+    path available: COPY on PostgreSQL/psycopg2, raw executemany elsewhere.
+    Returns the number of stats rows written.
+    """
+    db.session.execute(insert(Campaign), dataset.campaign_rows())
+    db.session.execute(insert(AdGroup), dataset.ad_group_rows())
+
+    connection = db.session.connection()
+    written = 0
+    for frame in dataset.stats_chunks(chunk_rows):
+        frame = storage_frame(frame)
+        write_stats_frame(connection, frame)
+        written += len(frame)
+        if progress:
+            progress(written)
+
+    db.session.commit()
+    return written
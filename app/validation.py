@@ -0,0 +1,208 @@
+import logging
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from app.models.ad_group_stats import MICROS
+
+logger = logging.getLogger(__name__)
+
+# Largest values the columns they end up in can hold
+INT32_MAX = 2**31 - 1
+# Ids are checked as float64, exact up to 2**53
+MAX_ID = 2**53
+# cost is stored in micros in a BigInteger
+MAX_COST = (2**63 - 1) // MICROS
+
+
+class RowChecks:
+    """
+    The reasons rows of one sheet are rejected, collected with whole-column
+    checks: every check is a boolean mask over the sheet, and the reasons of
+    the failing rows are put together once at the end.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.failed = {}
+
+    def add(self, reason, mask):
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            self.failed[reason] = self.failed.get(reason, False) | mask
+
+    def invalid(self):
+        mask = np.zeros(len(self.frame), dtype=bool)
+        for failed in self.failed.values():
+            mask |= failed
+        return mask
+
+    def rejects(self, sheet):
+        """
+        The failing rows as they were in the sheet, after a ``sheet`` column,
+        their Excel ``row`` number (1 is the header) and ``reason``, the
+        failed checks joined by '; '.
+        """
+        invalid = self.invalid()
+        reasons = pd.Series("", index=self.frame.index, dtype=object)
+        for reason, failed in self.failed.items():
+            reasons = reasons.where(~failed, reasons + reason + "; ")
+        rejects = self.frame[invalid].copy()
+        rejects.insert(0, "reason", reasons[invalid].str[:-2])
+        rejects.insert(0, "row", np.flatnonzero(invalid) + 2)
+        rejects.insert(0, "sheet", sheet)
+        return rejects
+
+    def number(self, column, integer=False, low=0, high=None):
+        """``column`` as float64 (NaN where invalid), checked to be in range."""
+        raw = self.frame[column]
+        missing = raw.isna().to_numpy()
+        values = pd.to_numeric(raw, errors="coerce").astype(np.float64).to_numpy()
+        not_number = ~np.isfinite(values) & ~missing
+        self.add(f"{column} is missing", missing)
+        self.add(f"{column} is not a number", not_number)
+
+        usable = np.isfinite(values)
+        if integer:
+            self.add(
+                f"{column} is not a whole number",
+                usable & (values != np.floor(np.where(usable, values, 0))),
+            )
+        with np.errstate(invalid="ignore"):
+            self.add(
+                f"{column} is negative" if low == 0 else f"{column} is below {low}",
+                usable & (values < low),
+            )
+            if high is not None:
+                self.add(f"{column} is above {high:,}", usable & (values > high))
+        return values
+
+    def text(self, column, max_length):
+        """``column`` as stripped strings, checked to be present and to fit."""
+        # Each distinct value is only stripped and measured once (a device
+        # column has a handful), then mapped back through the codes; missing
+        # values have code -1, which picks the None appended to the uniques
+        codes, uniques = pd.factorize(self.frame[column])
+        uniques = pd.Series(uniques, dtype=object).astype(str).str.strip()
+        values = np.append(uniques.to_numpy(dtype=object), None)
+        blank = np.append((uniques == "").to_numpy(), True)
+        too_long = np.append((uniques.str.len() > max_length).to_numpy(), False)
+        self.add(f"{column} is missing", blank[codes])
+        self.add(f"{column} is longer than {max_length} characters", too_long[codes])
+        return pd.Series(values[codes], index=self.frame.index)
+
+    def dates(self, column):
+        """
+        ``column`` as datetime64, checked to be valid dates and not in the
+        future (storage_frame() turns them into dates).
+        """
+        raw = self.frame[column]
+        parsed = pd.to_datetime(raw, errors="coerce")
+        missing = raw.isna().to_numpy()
+        self.add(f"{column} is missing", missing)
+        self.add(f"{column} is not a date", parsed.isna().to_numpy() & ~missing)
+        self.add(
+            f"{column} is in the future",
+            (parsed > pd.Timestamp(date.today())).to_numpy(),
+        )
+        return parsed
+
+    def known(self, column, values, ids):
+        """Check that the ``values`` of ``column`` are in the set ``ids``."""
+        usable = ~np.isnan(values)
+        # isin hashes ``ids`` once and looks every value up in it
+        unknown = usable & ~pd.Series(values).isin(ids).to_numpy()
+        self.add(f"unknown {column}", unknown)
+
+
+def validate_campaigns(frame):
+    checks = RowChecks(frame)
+    campaign_id = checks.number("campaign_id", integer=True, low=1, high=MAX_ID)
+    name = checks.text("campaign_name", 255)
+    campaign_type = checks.text("campaign_type", 50)
+    valid = ~checks.invalid()
+    clean = pd.DataFrame(
+        {
+            "campaign_id": campaign_id[valid].astype(np.int64),
+            "campaign_name": name[valid],
+            "campaign_type": campaign_type[valid],
+        }
+    )
+    return clean, checks.rejects("campaign")
+
+
+def validate_ad_groups(frame, campaign_ids):
+    checks = RowChecks(frame)
+    ad_group_id = checks.number("ad_group_id", integer=True, low=1, high=MAX_ID)
+    name = checks.text("ad_group_name", 255)
+    campaign_id = checks.number("campaign_id", integer=True, low=1, high=MAX_ID)
+    checks.known("campaign_id", campaign_id, campaign_ids)
+    valid = ~checks.invalid()
+    clean = pd.DataFrame(
+        {
+            "ad_group_id": ad_group_id[valid].astype(np.int64),
+            "ad_group_name": name[valid],
+            "campaign_id": campaign_id[valid].astype(np.int64),
+        }
+    )
+    return clean, checks.rejects("ad_group")
+
+
+def validate_stats(frame, ad_group_ids):
+    """
+    The valid stats rows, typed for storage_frame() and keeping their index
+    (the row's position in the sheet), and the rejected ones.
+    """
+    checks = RowChecks(frame)
+    dates = checks.dates("date")
+    ad_group_id = checks.number("ad_group_id", integer=True, low=1, high=MAX_ID)
+    checks.known("ad_group_id", ad_group_id, ad_group_ids)
+    device = checks.text("device", 50)
+    impressions = checks.number("impressions", integer=True, high=INT32_MAX)
+    clicks = checks.number("clicks", integer=True, high=INT32_MAX)
+    conversions = checks.number("conversions")
+    cost = checks.number("cost", high=MAX_COST)
+    valid = ~checks.invalid()
+    clean = pd.DataFrame(
+        {
+            "date": dates[valid],
+            "ad_group_id": ad_group_id[valid].astype(np.int64),
+            "device": device[valid],
+            "impressions": impressions[valid].astype(np.int64),
+            "clicks": clicks[valid].astype(np.int64),
+            "conversions": conversions[valid],
+            "cost": cost[valid],
+        },
+        index=frame.index[valid],
+    )
+    return clean, checks.rejects("ad_group_stats")
+
+
+def validate_workbook(sheets, campaign_ids, ad_group_ids):
+    """
+    Split the sheets of an import workbook into the rows that can be inserted
+    and the ones that cannot, without touching the database.
+
+    Types, missing values, ranges and signs are checked a column at a time.
+    Ad groups must belong to a campaign in ``campaign_ids`` (the ids already
+    stored) or in the valid rows of the campaign sheet, stats rows to an ad
+    group stored or valid in the ad group sheet; both are set lookups, so
+    foreign key errors never reach the database. Returns (the valid rows per
+    sheet, the rejected rows of all sheets with their reasons).
+    """
+    campaigns, campaign_rejects = validate_campaigns(sheets["campaign"])
+    ad_groups, ad_group_rejects = validate_ad_groups(
+        sheets["ad_group"], set(campaign_ids) | set(campaigns["campaign_id"])
+    )
+    stats, stats_rejects = validate_stats(
+        sheets["ad_group_stats"], set(ad_group_ids) | set(ad_groups["ad_group_id"])
+    )
+
+    rejects = pd.concat(
+        [campaign_rejects, ad_group_rejects, stats_rejects], ignore_index=True
+    )
+    if len(rejects):
+        logger.warning(f"Rejected {len(rejects):,} workbook rows.")
+    valid = {"campaign": campaigns, "ad_group": ad_groups, "ad_group_stats": stats}
+    return valid, rejects
@@ -0,0 +1,8 @@
+from app.asgi import create_asgi_app
+
+app = create_asgi_app("development")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app)
@@ -0,0 +1 @@
+# Benchmark and load-testing tooling. Not imported by the app itself.
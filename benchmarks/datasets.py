@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from app.synthetic import DEVICES, SyntheticDataset, write_dataset
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """Shape of a synthetic dataset: rows = campaigns * ad groups * days * devices."""
+
+    name: str
+    campaigns: int
+    ad_groups_per_campaign: int
+    days: int
+    devices: int
+    end_date: date = date(2024, 9, 30)
+    seed: int = 42
+
+    @property
+    def start_date(self):
+        return self.end_date - timedelta(days=self.days - 1)
+
+    @property
+    def rows(self):
+        return self.campaigns * self.ad_groups_per_campaign * self.days * self.devices
+
+
+PRESETS = {
+    "10k": DatasetSpec("10k", campaigns=10, ad_groups_per_campaign=10, days=50, devices=2),
+    "1m": DatasetSpec("1m", campaigns=50, ad_groups_per_campaign=20, days=250, devices=4),
+    "10m": DatasetSpec("10m", campaigns=100, ad_groups_per_campaign=40, days=625, devices=4),
+}
+
+
+def parse_spec(value):
+    """
+    Resolve a preset name ("10k") or an explicit
+    "campaigns x ad_groups x days x devices" shape ("5x4x30x2").
+    """
+    if value in PRESETS:
+        return PRESETS[value]
+    try:
+        campaigns, ad_groups, days, devices = (int(part) for part in value.split("x"))
+    except ValueError:
+        raise ValueError(
+            f"Unknown dataset '{value}'. Use one of {sorted(PRESETS)} or CxAxDxV."
+        )
+    return DatasetSpec(value, campaigns, ad_groups, days, min(devices, len(DEVICES)))
+
+
+def seed_dataset(spec):
+    """
+    Insert a synthetic dataset matching ``spec`` into the current app's database.
+    Tables are expected to exist and be empty.
+    """
+    dataset = SyntheticDataset(
+        campaigns=spec.campaigns,
+        ad_groups_per_campaign=spec.ad_groups_per_campaign,
+        days=spec.days,
+        devices=spec.devices,
+        end_date=spec.end_date,
+        seed=spec.seed,
+    )
+    return write_dataset(dataset)
@@ -0,0 +1,254 @@
+"""
+Endpoint benchmark suite.
+
+Seeds a synthetic dataset into SQLite (and optionally a local PostgreSQL),
+times every endpoint through the Flask test client, records how many SQL
+statements each request issues and its peak Python memory, and writes a JSON
+report that can be diffed between commits.
+
+Usage:
+    python -m benchmarks.endpoints --datasets 10k,1m --output bench_report.json
+    python -m benchmarks.endpoints --postgres-url postgresql://localhost/kaya_bench
+    python -m benchmarks.endpoints --baseline old_report.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+# The config module insists on DATABASE_URL; every run below overrides it.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import sqlalchemy
+from sqlalchemy import event
+
+from app import create_app, db
+from benchmarks.datasets import parse_spec, seed_dataset
+
+
+def endpoint_cases(spec):
+    """Requests to time for a dataset, as (name, method, url, json_body)."""
+    end = spec.end_date
+    start = end - timedelta(days=29)
+    campaigns = ",".join(str(c) for c in range(1, min(spec.campaigns, 3) + 1))
+    return [
+        ("test", "GET", "/test", None),
+        ("campaigns", "GET", "/campaigns", None),
+        ("time_series_day", "GET", "/performance-time-series?aggregate_by=day", None),
+        ("time_series_week", "GET", "/performance-time-series?aggregate_by=week", None),
+        ("time_series_month", "GET", "/performance-time-series?aggregate_by=month", None),
+        (
+            "time_series_day_campaigns",
+            "GET",
+            f"/performance-time-series?aggregate_by=day&campaigns={campaigns}",
+            None,
+        ),
+        (
+            "compare_preceding",
+            "GET",
+            f"/compare-performance?start_date={start}&end_date={end}&compare_mode=preceding",
+            None,
+        ),
+        (
+            "update_campaign_name",
+            "PUT",
+            "/campaign",
+            {"campaign_id": 1, "new_name": "Benchmark Campaign"},
+        ),
+    ]
+
+
+class QueryCounter:
+    """Counts statements sent to an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def _request(client, method, url, body):
+    if method == "GET":
+        return client.get(url)
+    return client.open(url, method=method, json=body)
+
+
+def time_endpoint(app, case, repeat):
+    """Time one endpoint: ``repeat`` timed runs plus one traced run for memory."""
+    name, method, url, body = case
+    client = app.test_client()
+
+    # Warm-up request, also used for the status code and query count
+    with QueryCounter(db.engine) as counter:
+        response = _request(client, method, url, body)
+    status = response.status_code
+    queries = counter.count
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _request(client, method, url, body)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    _request(client, method, url, body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "endpoint": name,
+        "method": method,
+        "url": url,
+        "status": status,
+        "queries": queries,
+        "peak_memory_kb": round(peak / 1024, 1),
+        "response_bytes": len(response.data),
+        "timings_ms": {
+            "min": round(min(timings), 3),
+            "median": round(statistics.median(timings), 3),
+            "mean": round(statistics.fmean(timings), 3),
+            "max": round(max(timings), 3),
+        },
+    }
+
+
+def run_backend(backend, database_url, specs, repeat, only=None):
+    results = []
+    app = create_app("testing", {"SQLALCHEMY_DATABASE_URI": database_url})
+    with app.app_context():
+        for spec in specs:
+            print(f"[{backend}] seeding {spec.name} ({spec.rows:,} rows)...")
+            db.drop_all()
+            db.create_all()
+            started = time.perf_counter()
+            seed_dataset(spec)
+            seed_seconds = time.perf_counter() - started
+
+            for case in endpoint_cases(spec):
+                if only and case[0] not in only:
+                    continue
+                result = time_endpoint(app, case, repeat)
+                result.update(
+                    {
+                        "backend": backend,
+                        "dataset": spec.name,
+                        "rows": spec.rows,
+                        "seed_seconds": round(seed_seconds, 2),
+                    }
+                )
+                print(
+                    f"[{backend}] {spec.name} {result['endpoint']}: "
+                    f"{result['timings_ms']['median']} ms, "
+                    f"{result['queries']} queries, status {result['status']}"
+                )
+                results.append(result)
+            db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(results):
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+        },
+        "results": sorted(
+            results, key=lambda r: (r["backend"], r["rows"], r["endpoint"])
+        ),
+    }
+
+
+def compare_reports(baseline, current):
+    """Print median latency and query count deltas against a previous report."""
+    key = lambda r: (r["backend"], r["dataset"], r["endpoint"])
+    before = {key(r): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline['meta'].get('commit')}:")
+    for result in current["results"]:
+        old = before.get(key(result))
+        if not old:
+            continue
+        old_ms = old["timings_ms"]["median"]
+        new_ms = result["timings_ms"]["median"]
+        change = ((new_ms - old_ms) / old_ms * 100) if old_ms else 0.0
+        print(
+            f"  {'/'.join(key(result))}: {old_ms} -> {new_ms} ms ({change:+.1f}%), "
+            f"queries {old['queries']} -> {result['queries']}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--datasets",
+        default="10k",
+        help="Comma-separated presets (10k, 1m, 10m) or CxAxDxV shapes.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--endpoints", help="Comma-separated subset of endpoint names to run."
+    )
+    parser.add_argument("--sqlite-path", help="SQLite file to use (default: temp).")
+    parser.add_argument("--skip-sqlite", action="store_true")
+    parser.add_argument(
+        "--postgres-url",
+        default=os.getenv("BENCH_POSTGRES_URL"),
+        help="Local PostgreSQL URL; its tables are dropped and recreated.",
+    )
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--baseline", help="Previous report to compare against.")
+    args = parser.parse_args(argv)
+
+    specs = [parse_spec(name.strip()) for name in args.datasets.split(",")]
+    only = set(args.endpoints.split(",")) if args.endpoints else None
+
+    results = []
+    if not args.skip_sqlite:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = args.sqlite_path or os.path.join(tmp, "bench.db")
+            results += run_backend("sqlite", f"sqlite:///{path}", specs, args.repeat, only)
+    if args.postgres_url:
+        results += run_backend("postgresql", args.postgres_url, specs, args.repeat, only)
+
+    report = build_report(results)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
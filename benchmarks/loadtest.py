@@ -0,0 +1,329 @@
+"""
+Concurrent load-testing harness.
+
+Starts the app on a local threaded WSGI server and drives a weighted mix of
+the routes from many client threads, then reports throughput, error counts
+and p50/p95/p99 latency per route. Runs fully offline against a temporary
+SQLite file (seeded with synthetic data) or any local database URL.
+
+With --server both, the same load is run against the Flask (WSGI) app and
+the async ASGI mode (served by uvicorn) one after the other.
+
+Usage:
+    python -m benchmarks.loadtest --clients 32 --duration 20
+    python -m benchmarks.loadtest --server both --mix time_series=1,compare=1
+    python -m benchmarks.loadtest --database-url postgresql://localhost/kaya_bench \\
+        --no-seed --mix time_series=6,compare=3,rename=1 --pool-size 5
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+# The config module insists on DATABASE_URL; the app below overrides it.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from werkzeug.serving import make_server
+
+from app import create_app, db
+from benchmarks.datasets import parse_spec, seed_dataset
+
+
+DEFAULT_MIX = "test=1,campaigns=1,time_series=4,compare=3,rename=1"
+
+
+def route_table(spec, rng):
+    """Route name -> factory returning (method, path, json_body) for one request."""
+    end = spec.end_date
+
+    def time_series():
+        aggregate_by = rng.choice(["day", "day", "week", "month"])
+        return "GET", f"/performance-time-series?aggregate_by={aggregate_by}", None
+
+    def compare():
+        days = rng.choice([7, 14, 30])
+        start = end - timedelta(days=days - 1)
+        return (
+            "GET",
+            f"/compare-performance?start_date={start}&end_date={end}&compare_mode=preceding",
+            None,
+        )
+
+    def rename():
+        # A few hot campaigns, so concurrent writes really contend
+        campaign_id = rng.randint(1, min(spec.campaigns, 3))
+        body = {"campaign_id": campaign_id, "new_name": f"Load {rng.randint(0, 10**6)}"}
+        return "PUT", "/campaign", body
+
+    return {
+        "test": lambda: ("GET", "/test", None),
+        "campaigns": lambda: ("GET", "/campaigns", None),
+        "time_series": time_series,
+        "compare": compare,
+        "rename": rename,
+    }
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    """Aggregate (route, status, latency_ms) samples into a report section."""
+    latencies = sorted(latency for _, _, latency in samples)
+    statuses = Counter(str(status) for _, status, _ in samples)
+    errors = sum(
+        count for status, count in statuses.items() if not status.startswith("2")
+    )
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else None,
+        "statuses": dict(sorted(statuses.items())),
+        "latency_ms": {
+            "p50": _round(percentile(latencies, 50)),
+            "p95": _round(percentile(latencies, 95)),
+            "p99": _round(percentile(latencies, 99)),
+            "max": _round(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+class ServerThread(threading.Thread):
+    """Serves a WSGI app on 127.0.0.1 with one thread per request."""
+
+    def __init__(self, app):
+        super().__init__(daemon=True)
+        # One access log line per request would dominate the output
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.port = self.server.server_port
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+class AsgiServerThread(threading.Thread):
+    """Serves an ASGI app on 127.0.0.1 with uvicorn's event loop."""
+
+    def __init__(self, asgi_app):
+        import uvicorn
+
+        super().__init__(daemon=True)
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.server = uvicorn.Server(
+            uvicorn.Config(asgi_app, host="127.0.0.1", port=self.port, log_level="warning")
+        )
+
+    def start(self):
+        super().start()
+        while not self.server.started and self.is_alive():
+            time.sleep(0.05)
+
+    def run(self):
+        self.server.run()
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join()
+
+
+def client_loop(port, routes, mix, deadline, rng, samples, lock):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    local = []
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, body = routes[name]()
+        payload = json.dumps(body) if body is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        started = time.perf_counter()
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            connection.close()
+        except OSError as e:
+            status = type(e).__name__
+        local.append((name, status, (time.perf_counter() - started) * 1000))
+    with lock:
+        samples.extend(local)
+
+
+def run_load(server, spec, mix, clients, duration, seed=0):
+    """
+    Drive ``clients`` concurrent clients for ``duration`` seconds against a
+    server thread, which is started here and stopped afterwards.
+    """
+    server.start()
+    samples = []
+    lock = threading.Lock()
+    try:
+        started = time.perf_counter()
+        deadline = started + duration
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            for i in range(clients):
+                rng = random.Random(seed * 10_000 + i)
+                pool.submit(
+                    client_loop,
+                    server.port,
+                    route_table(spec, rng),
+                    mix,
+                    deadline,
+                    rng,
+                    samples,
+                    lock,
+                )
+        elapsed = time.perf_counter() - started
+    finally:
+        server.stop()
+
+    by_route = defaultdict(list)
+    for sample in samples:
+        by_route[sample[0]].append(sample)
+
+    return {
+        "clients": clients,
+        "duration_s": round(elapsed, 2),
+        "overall": summarize(samples, elapsed),
+        "routes": {
+            name: summarize(route_samples, elapsed)
+            for name, route_samples in sorted(by_route.items())
+        },
+    }
+
+
+def print_report(report):
+    def line(name, section):
+        latency = section["latency_ms"]
+        print(
+            f"{name:<12} {section['requests']:>7} req {section['throughput_rps']:>8} rps "
+            f"{section['errors']:>5} err  p50 {latency['p50']} p95 {latency['p95']} "
+            f"p99 {latency['p99']} ms"
+        )
+
+    print(f"\n[{report['server']}] {report['clients']} clients for {report['duration_s']}s")
+    for name, section in report["routes"].items():
+        line(name, section)
+    line("overall", report["overall"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", help="Default: a temporary SQLite file.")
+    parser.add_argument("--dataset", default="10k", help="Preset or CxAxDxV shape.")
+    parser.add_argument("--no-seed", action="store_true", help="Use existing data.")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="route=weight,...")
+    parser.add_argument("--pool-size", type=int, help="SQLAlchemy pool_size.")
+    parser.add_argument("--max-overflow", type=int, help="SQLAlchemy max_overflow.")
+    parser.add_argument("--pool-timeout", type=float, help="SQLAlchemy pool_timeout.")
+    parser.add_argument(
+        "--server",
+        choices=["wsgi", "asgi", "both"],
+        default="wsgi",
+        help="asgi needs the packages of requirements-async.txt.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON here.")
+    args = parser.parse_args(argv)
+
+    spec = parse_spec(args.dataset)
+    mix = parse_mix(args.mix)
+
+    engine_options = {
+        key: value
+        for key, value in (
+            ("pool_size", args.pool_size),
+            ("max_overflow", args.max_overflow),
+            ("pool_timeout", args.pool_timeout),
+        )
+        if value is not None
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        app = create_app(
+            "testing",
+            {
+                "SQLALCHEMY_DATABASE_URI": database_url,
+                "SQLALCHEMY_ENGINE_OPTIONS": engine_options,
+                "DEBUG": False,
+                "TESTING": False,
+            },
+        )
+        with app.app_context():
+            if not args.no_seed:
+                print(f"Seeding {spec.rows:,} rows into {database_url}...")
+                db.drop_all()
+                db.create_all()
+                seed_dataset(spec)
+            db.session.remove()
+
+        runs = []
+        if args.server in ("wsgi", "both"):
+            runs.append(("wsgi", ServerThread(app)))
+        if args.server in ("asgi", "both"):
+            from app.asgi import AsgiApp
+
+            runs.append(("asgi", AsgiServerThread(AsgiApp(app))))
+
+        report = {
+            "database": app.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0],
+            "engine_options": engine_options,
+            "mix": mix,
+            "runs": {},
+        }
+        for mode, server in runs:
+            run = run_load(server, spec, mix, args.clients, args.duration, args.seed)
+            run["server"] = mode
+            report["runs"][mode] = run
+
+        with app.app_context():
+            db.engine.dispose()
+
+    for run in report["runs"].values():
+        print_report(run)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote report to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+ORM vs column-row serialization benchmark.
+
+Loads the same rows two ways - as mapped objects turned into dicts by their
+serialize() methods, and as plain column rows turned into dicts with
+row._asdict() - and reports CPU time and peak Python memory for each.
+
+Usage:
+    python -m benchmarks.serialization --dataset 1m --repeat 3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The config module insists on DATABASE_URL; the run below overrides it.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import select
+
+from app import create_app, db
+from app.models import AdGroup, AdGroupStats
+from app.services import ad_groups_statement, serialize_rows
+from benchmarks.datasets import parse_spec, seed_dataset
+
+
+def stats_columns_statement():
+    return select(*AdGroupStats.__table__.columns)
+
+
+def cases():
+    """(name, ORM loader, column-row loader) triples."""
+    return [
+        (
+            "ad_groups",
+            lambda: [
+                ad_group.serialize()
+                for ad_group in db.session.execute(select(AdGroup)).scalars()
+            ],
+            lambda: serialize_rows(db.session.execute(ad_groups_statement())),
+        ),
+        (
+            "ad_group_stats",
+            lambda: [
+                stat.serialize()
+                for stat in db.session.execute(select(AdGroupStats)).scalars()
+            ],
+            lambda: serialize_rows(db.session.execute(stats_columns_statement())),
+        ),
+    ]
+
+
+def measure(load, repeat):
+    cpu = []
+    for _ in range(repeat):
+        # A fresh session each time, as a request would get
+        db.session.remove()
+        started = time.process_time()
+        rows = load()
+        cpu.append((time.process_time() - started) * 1000)
+
+    db.session.remove()
+    tracemalloc.start()
+    load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.remove()
+    return {
+        "rows": len(rows),
+        "cpu_ms": round(statistics.median(cpu), 1),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dataset", default="10k", help="Preset or CxAxDxV shape.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    spec = parse_spec(args.dataset)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'serialization.db')}"
+        app = create_app("testing", {"SQLALCHEMY_DATABASE_URI": url})
+        with app.app_context():
+            db.create_all()
+            print(f"Seeding {spec.name} ({spec.rows:,} rows)...")
+            seed_dataset(spec)
+
+            for name, orm_load, rows_load in cases():
+                orm = measure(orm_load, args.repeat)
+                rows = measure(rows_load, args.repeat)
+                cpu_ratio = orm["cpu_ms"] / max(rows["cpu_ms"], 0.1)
+                memory_ratio = orm["peak_memory_kb"] / max(rows["peak_memory_kb"], 0.1)
+                print(
+                    f"{name} ({orm['rows']:,} rows): "
+                    f"ORM {orm['cpu_ms']} ms / {orm['peak_memory_kb']} KiB, "
+                    f"rows {rows['cpu_ms']} ms / {rows['peak_memory_kb']} KiB "
+                    f"({cpu_ratio:.1f}x CPU, {memory_ratio:.1f}x memory)"
+                )
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+ad_group_stats storage benchmark.
+
+Seeds a synthetic dataset, then reports the on-disk size of ad_group_stats
+(table and indexes, per row) and how long the main aggregations over it take.
+
+Usage:
+    python -m benchmarks.storage --dataset 1m --repeat 5
+    python -m benchmarks.storage --postgres-url postgresql://localhost/kaya_bench
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# The config module insists on DATABASE_URL; every run below overrides it.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import text
+
+from app import create_app, db
+from app.services import (
+    RankingParams,
+    TimeSeriesParams,
+    period_totals_statement,
+    ranking_statement,
+    time_series_statement,
+)
+from benchmarks.datasets import parse_spec, seed_dataset
+
+
+def table_size(connection):
+    """Bytes used by ad_group_stats, as (table, indexes)."""
+    if connection.dialect.name == "postgresql":
+        return connection.execute(
+            text(
+                "SELECT pg_table_size('ad_group_stats'), "
+                "pg_indexes_size('ad_group_stats')"
+            )
+        ).one()
+    sizes = dict(
+        connection.execute(
+            text(
+                "SELECT s.name, SUM(s.pgsize) FROM dbstat s "
+                "LEFT JOIN sqlite_schema m ON m.name = s.name "
+                "WHERE s.name = 'ad_group_stats' OR m.tbl_name = 'ad_group_stats' "
+                "GROUP BY s.name"
+            )
+        ).all()
+    )
+    table = sizes.pop("ad_group_stats", 0)
+    return table, sum(sizes.values())
+
+
+def aggregations(spec, dialect_name):
+    end = datetime.combine(spec.end_date, datetime.min.time())
+    start = end - timedelta(days=29)
+    return [
+        (
+            "time_series_month",
+            time_series_statement(TimeSeriesParams("month", (), None, None), dialect_name),
+        ),
+        (
+            "time_series_day_30d",
+            time_series_statement(TimeSeriesParams("day", (), start, end), dialect_name),
+        ),
+        ("period_totals_30d", period_totals_statement(start, end)),
+        (
+            "rankings_cost",
+            ranking_statement(
+                RankingParams("cost", "top", "ad_group", 10, None, None, None, False)
+            ),
+        ),
+    ]
+
+
+def run(database_url, spec, repeat):
+    app = create_app("testing", {"SQLALCHEMY_DATABASE_URI": database_url})
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print(f"Seeding {spec.name} ({spec.rows:,} rows)...")
+        seed_dataset(spec)
+        dialect_name = db.engine.dialect.name
+        if dialect_name == "postgresql":
+            db.session.commit()
+            with db.engine.connect() as autocommit:
+                autocommit.execution_options(isolation_level="AUTOCOMMIT").execute(
+                    text("VACUUM ANALYZE ad_group_stats")
+                )
+        else:
+            db.session.execute(text("ANALYZE"))
+
+        table, indexes = table_size(db.session.connection())
+        print(
+            f"{dialect_name}: ad_group_stats {table / 2**20:.1f} MiB "
+            f"({table / spec.rows:.1f} B/row), indexes {indexes / 2**20:.1f} MiB"
+        )
+        for name, statement in aggregations(spec, dialect_name):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                db.session.execute(statement).all()
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"  {name}: {statistics.median(timings):.1f} ms")
+
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dataset", default="10k", help="Preset or CxAxDxV shape.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--postgres-url",
+        default=os.getenv("BENCH_POSTGRES_URL"),
+        help="Local PostgreSQL URL; its tables are dropped and recreated.",
+    )
+    args = parser.parse_args(argv)
+    spec = parse_spec(args.dataset)
+
+    if args.postgres_url:
+        run(args.postgres_url, spec, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(f"sqlite:///{os.path.join(tmp, 'storage.db')}", spec, args.repeat)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,80 +1,51 @@
-from app import create_app, db
-from app.models import Campaign, AdGroup, AdGroupStats
-import pandas as pd
-from sqlalchemy.exc import IntegrityError
+import argparse
+
+from app import create_app
+from app.importer import ImportFailed, import_workbook, reject_path_for
 
 
 app = create_app()
 
-def import_data():
+def import_data(file_path='Kaya_data.xlsx', bulk=False):
+    """
+    Import a workbook right here, without going through the job queue.
+    To import in the background, POST it to /imports instead. With bulk the
+    stats go in through a staging table in one transaction (see
+    app.importer.bulk_load_stats), for big initial loads.
+    """
     with app.app_context():
-        try:
-            # Read data from the single Excel file with multiple sheets
-            file_path = 'Kaya_data.xlsx' 
-            excel_data = pd.ExcelFile(file_path)
-            print("Excel file loaded successfully.")
-            # Parse the specific sheets into DataFrames
-            df_campaign = excel_data.parse('campaign')
-            df_ad_group = excel_data.parse('ad_group')
-            df_ad_group_stats = excel_data.parse('ad_group_stats')
-
-            print("Starting to insert data into the database.")
-            # Insert campaigns
-            campaigns = []
-            for _, row in df_campaign.iterrows():
-                campaigns.append(
-                    Campaign(
-                        campaign_id=row['campaign_id'],
-                        campaign_name=row['campaign_name'],
-                        campaign_type=row['campaign_type']
-                    )
-                )
-            db.session.bulk_save_objects(campaigns)
-            db.session.commit()
-            print("Campaign data inserted successfully.")
+        def progress(done, total):
+            action = "staged" if bulk else "inserted"
+            print(f"  {done:,} of {total:,} stats rows {action}.")
 
-            # Insert ad groups
-            ad_groups = []
-            for _, row in df_ad_group.iterrows():
-                ad_groups.append(
-                    AdGroup(
-                        ad_group_id=row['ad_group_id'],
-                        ad_group_name=row['ad_group_name'],
-                        campaign_id=row['campaign_id']
-                    )
-                )
-            db.session.bulk_save_objects(ad_groups)
-            db.session.commit()
-            print("Ad group data inserted successfully.")
-
-            # Insert ad group stats
-            stats = []
-            for _, row in df_ad_group_stats.iterrows():
-                stats.append(
-                    AdGroupStats(
-                        date=row['date'],
-                        ad_group_id=row['ad_group_id'],
-                        device=row['device'],
-                        impressions=row['impressions'],
-                        clicks=row['clicks'],
-                        conversions=row['conversions'],
-                        cost=row['cost']
-                    )
+        try:
+            print(f"Importing {file_path}.")
+            # Also refreshes the derived aggregates at the end
+            rows, rejected = import_workbook(
+                file_path,
+                chunk_rows=app.config["IMPORT_CHUNK_ROWS"],
+                progress=progress,
+                bulk=bulk,
+            )
+            print(f"Inserted {rows:,} ad group stats rows.")
+            if rejected:
+                print(
+                    f"Skipped {rejected:,} invalid rows, see "
+                    f"{reject_path_for(file_path)} for the reasons."
                 )
-            db.session.bulk_save_objects(stats)
-            db.session.commit()
-            print("Ad group stats data inserted successfully.")
-
-        except IntegrityError as e:
-            db.session.rollback()
-            print(f"Integrity error occurred: {e}")
-        except Exception as e:
-            db.session.rollback()
-            print(f"An error occurred: {e}")
+        except ImportFailed as e:
+            print(f"Cannot import {file_path}: {e}")
+            raise
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import a Kaya workbook.")
+    parser.add_argument("file_path", nargs="?", default="Kaya_data.xlsx")
+    parser.add_argument(
+        "--bulk", action="store_true", help="load the stats through a staging table"
+    )
+    args = parser.parse_args()
     try:
-        import_data()
+        import_data(args.file_path, bulk=args.bulk)
         print("Data imported successfully.")
     except Exception as e:
-        print(f"An error occurred while running the import: {e}")
\ No newline at end of file
+        print(f"An error occurred while running the import: {e}")
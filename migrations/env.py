@@ -4,6 +4,9 @@ from logging.config import fileConfig
 from flask import current_app
 
 from alembic import context
+from alembic.runtime.migration import MigrationContext
+
+from app.migration_helpers import dry_run, is_dry_run
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -107,7 +110,31 @@ def run_migrations_online():
             context.run_migrations()
 
 
+def run_migrations_dry_run():
+    """Print the SQL of the pending migrations without running it.
+
+    MIGRATION_DRY_RUN=true flask db upgrade: like --sql, but starting from
+    the database's current revision, and with a connection the migration
+    helpers read row counts from to log their estimates.
+
+    """
+    with get_engine().connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+        context.configure(
+            url=config.get_main_option("sqlalchemy.url"),
+            target_metadata=get_metadata(),
+            literal_binds=True,
+            as_sql=True,
+            starting_rev=current,
+        )
+
+        with dry_run(connection), context.begin_transaction():
+            context.run_migrations()
+
+
 if context.is_offline_mode():
     run_migrations_offline()
+elif is_dry_run():
+    run_migrations_dry_run()
 else:
     run_migrations_online()
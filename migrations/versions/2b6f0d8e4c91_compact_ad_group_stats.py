@@ -0,0 +1,107 @@
+"""compact ad group stats: device lookup table, cost in micros, reordered columns
+
+Revision ID: 2b6f0d8e4c91
+Revises: e91a6d3b7f20
+Create Date: 2026-10-19 14:02:37.218554
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b6f0d8e4c91'
+down_revision = 'e91a6d3b7f20'
+branch_labels = None
+depends_on = None
+
+
+def _swap_in(dialect, new_table, foreign_keys):
+    """
+    Replace ad_group_stats by ``new_table`` and restore its index and names,
+    those of the foreign keys on the ``foreign_keys`` columns included.
+    """
+    op.drop_index('ix_ad_group_stats_date_ad_group_id', table_name='ad_group_stats')
+    op.drop_table('ad_group_stats')
+    op.rename_table(new_table, 'ad_group_stats')
+    if dialect == 'postgresql':
+        op.execute(f'ALTER TABLE ad_group_stats RENAME CONSTRAINT {new_table}_pkey TO ad_group_stats_pkey')
+        for column in foreign_keys:
+            op.execute(
+                f'ALTER TABLE ad_group_stats RENAME CONSTRAINT '
+                f'{new_table}_{column}_fkey TO ad_group_stats_{column}_fkey'
+            )
+        op.execute(f'ALTER SEQUENCE {new_table}_id_seq RENAME TO ad_group_stats_id_seq')
+        # The copied rows kept their ids; continue after the highest one
+        op.execute(
+            "SELECT setval('ad_group_stats_id_seq', COALESCE(MAX(id), 0) + 1, false) "
+            "FROM ad_group_stats"
+        )
+    op.create_index('ix_ad_group_stats_date_ad_group_id', 'ad_group_stats', ['date', 'ad_group_id'], unique=False)
+
+
+def upgrade():
+    dialect = op.get_context().dialect.name
+
+    op.create_table('device',
+    sa.Column('device_id', sa.SmallInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.PrimaryKeyConstraint('device_id'),
+    sa.UniqueConstraint('name')
+    )
+    op.execute('INSERT INTO device (name) SELECT DISTINCT device FROM ad_group_stats ORDER BY device')
+
+    # Widest columns first so PostgreSQL does not pad between them. Reordering
+    # means rewriting the table, which the type changes need anyway, so this
+    # copies it under an exclusive lock rather than going through the online
+    # helpers of app/migration_helpers.py: their shadow columns keep the old
+    # order, and the space of the dropped columns stays until a VACUUM FULL,
+    # which rewrites the table under the same lock. Run it in a maintenance
+    # window long enough to copy the table.
+    op.create_table('ad_group_stats_compact',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('ad_group_id', sa.BigInteger(), nullable=False),
+    sa.Column('cost_micros', sa.BigInteger(), nullable=False),
+    sa.Column('conversions', sa.Float(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('impressions', sa.Integer(), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.Column('device_id', sa.SmallInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['ad_group_id'], ['ad_group.ad_group_id'], ),
+    sa.ForeignKeyConstraint(['device_id'], ['device.device_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        'INSERT INTO ad_group_stats_compact '
+        '(id, ad_group_id, cost_micros, conversions, date, impressions, clicks, device_id) '
+        'SELECT s.id, s.ad_group_id, CAST(ROUND(s.cost * 1000000) AS BIGINT), '
+        's.conversions, s.date, s.impressions, s.clicks, d.device_id '
+        'FROM ad_group_stats s JOIN device d ON d.name = s.device'
+    )
+    _swap_in(dialect, 'ad_group_stats_compact', ['ad_group_id', 'device_id'])
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+
+    op.create_table('ad_group_stats_wide',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('ad_group_id', sa.BigInteger(), nullable=False),
+    sa.Column('device', sa.String(length=50), nullable=False),
+    sa.Column('impressions', sa.Integer(), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.Column('conversions', sa.Float(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['ad_group_id'], ['ad_group.ad_group_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        'INSERT INTO ad_group_stats_wide '
+        '(id, date, ad_group_id, device, impressions, clicks, conversions, cost) '
+        'SELECT s.id, s.date, s.ad_group_id, d.name, s.impressions, s.clicks, '
+        's.conversions, s.cost_micros / 1000000.0 '
+        'FROM ad_group_stats s JOIN device d ON d.device_id = s.device_id'
+    )
+    _swap_in(dialect, 'ad_group_stats_wide', ['ad_group_id'])
+    op.drop_table('device')
@@ -0,0 +1,26 @@
+"""campaign version column for optimistic concurrency
+
+Revision ID: 3a7c1e9d2b45
+Revises: 9b96a844270d
+Create Date: 2026-10-19 10:12:41.208315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7c1e9d2b45'
+down_revision = '9b96a844270d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('campaign', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('campaign', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,28 @@
+"""import job rejected rows
+
+Revision ID: 4f7a2c9e1d63
+Revises: 6e0b9c2d4a18
+Create Date: 2026-10-19 17:02:37.514209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f7a2c9e1d63'
+down_revision = '6e0b9c2d4a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('import_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rejected_rows', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('reject_path', sa.String(length=1024), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('import_job', schema=None) as batch_op:
+        batch_op.drop_column('reject_path')
+        batch_op.drop_column('rejected_rows')
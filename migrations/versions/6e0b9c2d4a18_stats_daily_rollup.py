@@ -0,0 +1,43 @@
+"""daily rollup of ad group stats
+
+Revision ID: 6e0b9c2d4a18
+Revises: 8a3d5f1c7b02
+Create Date: 2026-10-19 16:02:37.519046
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e0b9c2d4a18'
+down_revision = '8a3d5f1c7b02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stats_daily_rollup',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('ad_group_id', sa.BigInteger(), nullable=False),
+    sa.Column('campaign_id', sa.BigInteger(), nullable=False),
+    sa.Column('row_count', sa.BigInteger(), nullable=False),
+    sa.Column('cost_micros', sa.BigInteger(), nullable=False),
+    sa.Column('clicks', sa.BigInteger(), nullable=False),
+    sa.Column('conversions', sa.Float(), nullable=False),
+    sa.Column('impressions', sa.BigInteger(), nullable=False),
+    sa.Column('cost_per_click_sum', sa.Float(), nullable=False),
+    sa.Column('cost_per_click_count', sa.BigInteger(), nullable=False),
+    sa.Column('cost_per_conversion_sum', sa.Float(), nullable=False),
+    sa.Column('cost_per_conversion_count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('date', 'ad_group_id')
+    )
+    with op.batch_alter_table('stats_daily_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_stats_daily_rollup_campaign_id_date', ['campaign_id', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stats_daily_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_stats_daily_rollup_campaign_id_date')
+
+    op.drop_table('stats_daily_rollup')
@@ -0,0 +1,48 @@
+"""campaign and ad group name search indexes
+
+Revision ID: 7d2f4a9c6e18
+Revises: 3a7c1e9d2b45
+Create Date: 2026-10-19 11:02:17.534921
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2f4a9c6e18'
+down_revision = '3a7c1e9d2b45'
+branch_labels = None
+depends_on = None
+
+NAME_COLUMNS = [('campaign', 'campaign_name'), ('ad_group', 'ad_group_name')]
+
+
+def upgrade():
+    dialect = op.get_context().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for table, column in NAME_COLUMNS:
+        prefix = f'ix_{table}_{column}'
+        if dialect == 'postgresql':
+            op.create_index(
+                f'{prefix}_pattern', table, [sa.text(f'lower({column}) text_pattern_ops')]
+            )
+            op.create_index(
+                f'{prefix}_trgm', table, [column],
+                postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+            )
+        elif dialect == 'sqlite':
+            op.create_index(f'{prefix}_nocase', table, [sa.text(f'{column} COLLATE NOCASE')])
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+    for table, column in NAME_COLUMNS:
+        prefix = f'ix_{table}_{column}'
+        if dialect == 'postgresql':
+            op.drop_index(f'{prefix}_trgm', table_name=table)
+            op.drop_index(f'{prefix}_pattern', table_name=table)
+        elif dialect == 'sqlite':
+            op.drop_index(f'{prefix}_nocase', table_name=table)
@@ -0,0 +1,37 @@
+"""stats_prefix_sum cost in micros
+
+Revision ID: a8c3e5f7b219
+Revises: 4f7a2c9e1d63
+Create Date: 2026-10-19 18:41:09.227615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c3e5f7b219'
+down_revision = '4f7a2c9e1d63'
+branch_labels = None
+depends_on = None
+
+
+def clear_prefix_sums():
+    # Derived data: rebuilt by flask refresh-prefix-sums, compare-performance
+    # scans ad_group_stats until then
+    op.execute("DELETE FROM stats_prefix_sum")
+    op.execute("DELETE FROM aggregate_watermark WHERE name = 'prefix_sums'")
+
+
+def upgrade():
+    clear_prefix_sums()
+    with op.batch_alter_table('stats_prefix_sum', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cost_micros', sa.BigInteger(), nullable=False))
+        batch_op.drop_column('cost')
+
+
+def downgrade():
+    clear_prefix_sums()
+    with op.batch_alter_table('stats_prefix_sum', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cost', sa.Float(), nullable=False))
+        batch_op.drop_column('cost_micros')
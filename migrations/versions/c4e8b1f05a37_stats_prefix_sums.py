@@ -0,0 +1,44 @@
+"""prefix sums of ad group stats for compare_performance
+
+Revision ID: c4e8b1f05a37
+Revises: 7d2f4a9c6e18
+Create Date: 2026-10-19 12:20:48.871302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8b1f05a37'
+down_revision = '7d2f4a9c6e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('aggregate_watermark',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('max_stats_id', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('stats_prefix_sum',
+    sa.Column('campaign_id', sa.BigInteger(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('row_count', sa.BigInteger(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.Column('clicks', sa.BigInteger(), nullable=False),
+    sa.Column('conversions', sa.Float(), nullable=False),
+    sa.Column('impressions', sa.BigInteger(), nullable=False),
+    sa.Column('cost_per_click_sum', sa.Float(), nullable=False),
+    sa.Column('cost_per_click_count', sa.BigInteger(), nullable=False),
+    sa.Column('cost_per_conversion_sum', sa.Float(), nullable=False),
+    sa.Column('cost_per_conversion_count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('campaign_id', 'date')
+    )
+
+
+def downgrade():
+    op.drop_table('stats_prefix_sum')
+    op.drop_table('aggregate_watermark')
@@ -0,0 +1,30 @@
+"""aggregate_watermark window_rows
+
+Revision ID: d3b9e6a1c475
+Revises: a8c3e5f7b219
+Create Date: 2026-10-19 19:52:37.104281
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3b9e6a1c475'
+down_revision = 'a8c3e5f7b219'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing watermarks count 0 rows in their window, so the aggregates are
+    # stale until their next refresh, which re-reads the window once
+    with op.batch_alter_table('aggregate_watermark', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column('window_rows', sa.BigInteger(), server_default='0', nullable=False)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('aggregate_watermark', schema=None) as batch_op:
+        batch_op.drop_column('window_rows')
@@ -0,0 +1,26 @@
+"""index ad group stats on (date, ad_group_id)
+
+Revision ID: e91a6d3b7f20
+Revises: c4e8b1f05a37
+Create Date: 2026-10-19 13:05:12.640117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91a6d3b7f20'
+down_revision = 'c4e8b1f05a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ad_group_stats', schema=None) as batch_op:
+        batch_op.create_index('ix_ad_group_stats_date_ad_group_id', ['date', 'ad_group_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ad_group_stats', schema=None) as batch_op:
+        batch_op.drop_index('ix_ad_group_stats_date_ad_group_id')
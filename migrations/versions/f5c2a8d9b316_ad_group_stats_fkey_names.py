@@ -0,0 +1,37 @@
+"""ad_group_stats foreign key names left over from the compaction
+
+Revision ID: f5c2a8d9b316
+Revises: d3b9e6a1c475
+Create Date: 2026-10-19 20:41:12.530716
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5c2a8d9b316'
+down_revision = 'd3b9e6a1c475'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases compacted by 2b6f0d8e4c91 before it renamed its foreign keys
+    # still have them as ad_group_stats_compact_*_fkey. Checked in the db, so
+    # the SQL of a dry run is the same.
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    for column in ('ad_group_id', 'device_id'):
+        old = f'ad_group_stats_compact_{column}_fkey'
+        new = f'ad_group_stats_{column}_fkey'
+        op.execute(
+            'DO $$ BEGIN IF EXISTS '
+            f"(SELECT 1 FROM pg_constraint WHERE conname = '{old}') "
+            f'THEN ALTER TABLE ad_group_stats RENAME CONSTRAINT {old} TO {new}; '
+            'END IF; END $$'
+        )
+
+
+def downgrade():
+    # The names 2b6f0d8e4c91 gives now, nothing to undo
+    pass
@@ -0,0 +1,227 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date, datetime
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import postgresql
+
+from app import create_app, db
+from app.aggregates import daily_rollup_fresh, refresh_aggregates, refresh_daily_rollup
+from app.models import AdGroupStats, AggregateWatermark, StatsDailyRollup
+from app.prefix_sums import (
+    create_watermark_statement,
+    lock_watermark,
+    prefix_sums_fresh,
+)
+from app.services import (
+    TimeSeriesParams,
+    format_time_series,
+    rollup_time_series_statement,
+    time_series_statement,
+)
+from app.synthetic import SyntheticDataset, write_dataset
+
+
+class DailyRollupTestCase(unittest.TestCase):
+    """The rollup must give the same time series as scanning ad_group_stats."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.dataset = SyntheticDataset(
+            campaigns=3, ad_groups_per_campaign=2, days=40, devices=3, end_date=date(2024, 6, 30)
+        )
+        write_dataset(self.dataset)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_stats(self, day, ad_group_id=1, clicks=10, **kwargs):
+        db.session.execute(
+            insert(AdGroupStats),
+            [
+                {
+                    **kwargs,
+                    "date": day,
+                    "ad_group_id": ad_group_id,
+                    "device_id": 1,
+                    "impressions": 500,
+                    "clicks": clicks,
+                    "conversions": 1.0,
+                    "cost_micros": 12_500_000,
+                }
+            ],
+        )
+        db.session.commit()
+
+    def assertSameTimeSeries(self, **kwargs):
+        params = TimeSeriesParams(
+            **{"aggregate_by": "day", "start_date": None, "end_date": None, "campaigns": None, **kwargs}
+        )
+        expected = format_time_series(
+            db.session.execute(time_series_statement(params, "sqlite")).all(),
+            params.aggregate_by,
+        )
+        actual = format_time_series(
+            db.session.execute(rollup_time_series_statement(params, "sqlite")).all(),
+            params.aggregate_by,
+        )
+        self.assertEqual(len(actual), len(expected))
+        for row, expected_row in zip(actual, expected):
+            self.assertEqual(row["period"], expected_row["period"])
+            for key, value in expected_row.items():
+                if key != "period":
+                    self.assertAlmostEqual(row[key], value, delta=0.011, msg=key)
+
+    def test_full_refresh_matches_sql(self):
+        written = refresh_daily_rollup()
+        # One row per day and ad group, the devices are summed
+        self.assertEqual(written, 40 * 6)
+        self.assertTrue(daily_rollup_fresh())
+
+        for aggregate_by in ("day", "week", "month"):
+            self.assertSameTimeSeries(aggregate_by=aggregate_by)
+        self.assertSameTimeSeries(
+            aggregate_by="week",
+            campaigns=(2,),
+            start_date=datetime(2024, 6, 1),
+            end_date=datetime(2024, 6, 20),
+        )
+
+    def test_incremental_refresh_only_touches_new_keys(self):
+        refresh_daily_rollup()
+        self.add_stats(date(2024, 6, 10))
+        self.add_stats(date(2024, 6, 10), clicks=0)
+        self.add_stats(date(2024, 7, 1), ad_group_id=3)
+        self.assertFalse(daily_rollup_fresh())
+
+        # One existing key recomputed, one new
+        self.assertEqual(refresh_daily_rollup(), 2)
+        self.assertEqual(refresh_daily_rollup(), 0)
+        self.assertTrue(daily_rollup_fresh())
+
+        rollup = db.session.get(StatsDailyRollup, (date(2024, 6, 10), 1))
+        count, cost_micros = db.session.execute(
+            select(func.count(), func.sum(AdGroupStats.cost_micros)).where(
+                AdGroupStats.date == date(2024, 6, 10), AdGroupStats.ad_group_id == 1
+            )
+        ).one()
+        self.assertEqual((rollup.row_count, rollup.cost_micros), (count, cost_micros))
+        self.assertEqual(db.session.get(StatsDailyRollup, (date(2024, 7, 1), 3)).campaign_id, 2)
+        self.assertSameTimeSeries(aggregate_by="month")
+
+    def test_refresh_aggregates_and_endpoint(self):
+        results = refresh_aggregates()
+        self.assertEqual(list(results), ["prefix_sums", "daily_rollup"])
+        self.assertEqual(refresh_aggregates(["daily_rollup"])["daily_rollup"][0], 0)
+        with self.assertRaises(ValueError):
+            refresh_aggregates(["nope"])
+
+        fresh = self.client.get("/performance-time-series?aggregate_by=week").get_json()
+        self.add_stats(date(2024, 6, 30))
+        # Not fresh anymore, so answered from ad_group_stats until refreshed
+        stale = self.client.get("/performance-time-series?aggregate_by=week").get_json()
+        self.assertEqual(stale[:-1], fresh[:-1])
+        self.assertNotEqual(stale[-1], fresh[-1])
+
+        refresh_aggregates()
+        refreshed = self.client.get("/performance-time-series?aggregate_by=week").get_json()
+        self.assertEqual(refreshed, stale)
+
+    def test_rows_committed_late_below_the_watermark(self):
+        latest = db.session.execute(select(func.max(AdGroupStats.id))).scalar()
+        self.add_stats(date(2024, 6, 30), id=latest + 10)
+        refresh_aggregates()
+        # An import that got its ids before the last refresh commits after it
+        self.add_stats(date(2024, 6, 2), ad_group_id=4, id=latest + 5)
+        self.assertFalse(daily_rollup_fresh())
+        self.assertFalse(prefix_sums_fresh())
+
+        refresh_aggregates()
+        self.assertTrue(daily_rollup_fresh())
+        self.assertTrue(prefix_sums_fresh())
+        self.assertSameTimeSeries(aggregate_by="day")
+        url = (
+            "/compare-performance?start_date=2024-06-01&end_date=2024-06-30"
+            "&compare_mode=preceding"
+        )
+        from_prefix = self.client.get(url).get_json()
+        db.session.execute(db.delete(AggregateWatermark))
+        db.session.commit()
+        self.assertEqual(self.client.get(url).get_json(), from_prefix)
+
+    def test_watermark_is_locked_and_created_once(self):
+        self.assertIsNone(lock_watermark("daily_rollup"))
+        self.assertIsNone(lock_watermark("daily_rollup"))
+        db.session.rollback()
+        refresh_daily_rollup()
+        self.assertEqual(db.session.query(AggregateWatermark).count(), 1)
+
+        sql = str(
+            create_watermark_statement("daily_rollup", "postgresql").compile(
+                dialect=postgresql.dialect()
+            )
+        )
+        self.assertIn("ON CONFLICT (name) DO NOTHING", sql)
+
+class ConcurrentRefreshTestCase(unittest.TestCase):
+    """Refreshes finishing imports at the same time must not collide."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.tmp.name, 'refresh.db')}"
+        self.app = create_app("testing", {"SQLALCHEMY_DATABASE_URI": url})
+        with self.app.app_context():
+            db.create_all()
+            write_dataset(
+                SyntheticDataset(
+                    campaigns=2,
+                    ad_groups_per_campaign=2,
+                    days=30,
+                    end_date=date(2024, 6, 30),
+                )
+            )
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_concurrent_refreshes(self):
+        barrier = threading.Barrier(4)
+        errors, written = [], []
+
+        def refresh():
+            with self.app.app_context():
+                barrier.wait()
+                try:
+                    written.append(refresh_aggregates())
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=refresh) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        # Only the first refresh of each aggregate had anything to do
+        for name in ("prefix_sums", "daily_rollup"):
+            self.assertEqual(sum(1 for w in written if w[name][0]), 1, name)
+        with self.app.app_context():
+            self.assertEqual(db.session.query(AggregateWatermark).count(), 2)
+            self.assertEqual(db.session.query(StatsDailyRollup).count(), 30 * 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
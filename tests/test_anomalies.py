@@ -0,0 +1,137 @@
+import unittest
+from datetime import date
+
+import numpy as np
+from sqlalchemy import update
+
+from app import create_app, db
+from app.aggregates import refresh_daily_rollup
+from app.anomalies import detect_anomalies, ewma_scores, robust_scores
+from app.models import AdGroupStats
+from app.synthetic import SyntheticDataset, write_dataset
+
+
+class AnomalyScoresTestCase(unittest.TestCase):
+    def test_robust_scores(self):
+        values = np.array(
+            [
+                [10, 11, 9, 10, 12, 10, 9, 11, 50, 10],
+                [5, 5, 5, 5, 5, 5, 5, 5, 5, 5],
+                [1, 2, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, 90],
+            ],
+            dtype=float,
+        )
+        scores, baselines = robust_scores(values)
+        self.assertEqual(int(np.nanargmax(np.abs(scores[0]))), 8)
+        self.assertAlmostEqual(scores[0, 8], 0.6745 * 40 / 1)
+        self.assertEqual(baselines[0, 8], 10)
+        # No spread, and too few days
+        self.assertTrue(np.isnan(scores[1]).all())
+        self.assertTrue(np.isnan(scores[2]).all())
+
+    def test_ewma_scores_only_look_back(self):
+        values = np.array([[10, 11, 9, 10, 12, 10, 9, 11, 50, 10]], dtype=float)
+        scores, baselines = ewma_scores(values)
+        # Not scored before MIN_DAYS days were seen
+        self.assertTrue(np.isnan(scores[0, :7]).all())
+        self.assertGreater(scores[0, 8], 10)
+        self.assertLess(baselines[0, 8], 11)
+        # A missing day keeps the state as it was
+        with_gap = values.copy()
+        with_gap[0, 3] = np.nan
+        self.assertEqual(np.isnan(ewma_scores(with_gap)[0]).sum(), 8)
+
+
+class AnomaliesEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        write_dataset(
+            SyntheticDataset(
+                campaigns=3, ad_groups_per_campaign=4, days=60, devices=2, end_date=date(2024, 5, 31)
+            )
+        )
+        # Ad group 5 spends 30 times its usual on one day
+        db.session.execute(
+            update(AdGroupStats)
+            .where(AdGroupStats.ad_group_id == 5, AdGroupStats.date == date(2024, 5, 20))
+            .values(cost_micros=AdGroupStats.cost_micros * 30)
+        )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_flags_the_spike(self):
+        for method in ("robust", "ewma"):
+            response = self.client.get(f"/anomalies?metric=cost&method={method}")
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            self.assertEqual(data["start_date"], "2024-03-03")
+            self.assertEqual(data["end_date"], "2024-05-31")
+            self.assertEqual(data["ad_groups"], 12)
+            top = data["results"][0]
+            self.assertEqual(
+                (top["ad_group_id"], top["campaign_id"], top["date"], top["metric"]),
+                (5, 2, "2024-05-20", "cost"),
+            )
+            self.assertGreater(top["value"], 10 * top["baseline"])
+            self.assertTrue(all(r["metric"] == "cost" for r in data["results"]))
+
+        # Same results from the daily rollup
+        expected = detect_anomalies(date(2024, 3, 3), date(2024, 5, 31))
+        refresh_daily_rollup()
+        self.assertEqual(detect_anomalies(date(2024, 3, 3), date(2024, 5, 31)), expected)
+
+    def test_filters(self):
+        data = self.client.get(
+            "/anomalies?metric=cost&campaign_id=1&start_date=2024-05-01&limit=1"
+        ).get_json()
+        self.assertEqual(data["ad_groups"], 4)
+        self.assertLessEqual(len(data["results"]), 1)
+        self.assertNotIn(5, [r["ad_group_id"] for r in data["results"]])
+
+        data = self.client.get("/anomalies?threshold=1000").get_json()
+        self.assertEqual((data["flagged"], data["results"]), (0, []))
+
+    def test_invalid_params(self):
+        for query, error in (
+            ("metric=cpc", "metric must be one or both of: cost, cpa."),
+            ("method=iforest", "method must be one of: robust, ewma."),
+            ("threshold=-1", "threshold must be a positive number."),
+            ("threshold=abc", "threshold must be a positive number."),
+            ("threshold=inf", "threshold must be a positive number."),
+            ("threshold=1e999", "threshold must be a positive number."),
+            ("threshold=nan", "threshold must be a positive number."),
+            ("limit=0", "limit must be an integer between 1 and 1000."),
+            (
+                "start_date=2024-06-01&end_date=2024-05-01",
+                "start_date must be before or equal to end_date.",
+            ),
+            (
+                "start_date=2023-01-01&end_date=2024-05-01",
+                "The date range must not exceed 366 days.",
+            ),
+            # Up to the latest data, 2024-05-31
+            ("start_date=2023-05-31", "The date range must not exceed 366 days."),
+        ):
+            response = self.client.get(f"/anomalies?{query}")
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(response.get_json()["error"], error)
+
+    def test_cli(self):
+        result = self.app.test_cli_runner().invoke(
+            args=["detect-anomalies", "--metric", "cost", "--days", "30", "--limit", "1"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("from 2024-05-02 to 2024-05-31", result.output)
+        self.assertIn("2024-05-20  ad group        5  cost", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,9 @@
 import unittest
 from flask import json
+from sqlalchemy import select
 from datetime import datetime, timedelta
 from app import create_app, db
-from app.models import Campaign, AdGroup, AdGroupStats
+from app.models import Campaign, AdGroup, AdGroupStats, Device
 
 
 class ComparePerformanceEndpointTestCase(unittest.TestCase):
@@ -215,6 +216,20 @@ class PerformanceTimeSeriesEndpointTestCase(unittest.TestCase):
             self.assertEqual(first_stat.ad_group_id, 1)
             self.assertEqual(first_stat.device, "mobile")
 
+    def test_adgroupstats_compact_columns(self):
+        with self.app.app_context():
+            stat = AdGroupStats.query.first()
+            self.assertEqual(stat.cost_micros, 200_000_000)
+            self.assertEqual(stat.cost, 200.0)
+            # Every "mobile" row shares one device row
+            self.assertEqual(Device.query.count(), 1)
+            self.assertEqual(stat.device_id, Device.query.one().device_id)
+
+            stat.cost = 0.1 + 0.2
+            self.assertEqual(stat.cost_micros, 300_000)
+            total = db.session.execute(select(AdGroupStats.total_cost())).scalar()
+            self.assertEqual(total, 600.3)
+
     def test_performance_time_series_valid(self):
         response = self.client.get("/performance-time-series?aggregate_by=day")
         self.assertEqual(response.status_code, 200)
@@ -227,6 +242,20 @@ class PerformanceTimeSeriesEndpointTestCase(unittest.TestCase):
         self.assertIn("period", first_entry)
         self.assertIn("total_cost", first_entry)
 
+    def test_performance_time_series_week_and_month(self):
+        for aggregate_by, period_format in (("week", "%Y-%U"), ("month", "%Y-%m")):
+            response = self.client.get(
+                f"/performance-time-series?aggregate_by={aggregate_by}"
+            )
+            self.assertEqual(response.status_code, 200)
+
+            data = response.get_json()
+            self.assertGreater(len(data), 0)
+            self.assertEqual(sum(entry["total_clicks"] for entry in data), 400)
+            for entry in data:
+                datetime.strptime(entry["period"], period_format)
+                self.assertEqual(entry["avg_click_through_rate"], 10.0)
+
     def test_performance_time_series_invalid_aggregate_by(self):
         response = self.client.get("/performance-time-series?aggregate_by=invalid")
         self.assertEqual(response.status_code, 400)
@@ -234,7 +263,7 @@ class PerformanceTimeSeriesEndpointTestCase(unittest.TestCase):
         data = response.get_json()
         self.assertIn("error", data)
         self.assertEqual(
-            data["error"], "aggregate_by must be one of: day, week, month."
+            data["error"], "aggregate_by must be one of: day, week, month, quarter."
         )
 
 
@@ -0,0 +1,258 @@
+import asyncio
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+from app import create_app, db
+from app.aggregates import refresh_aggregates
+from app.models import Campaign, AdGroup, AdGroupStats, ImportJob
+from app.singleflight import AsyncSingleFlight
+
+
+async def asgi_request(app, method, path, query="", body=b"", headers=()):
+    """Drive one HTTP request through an ASGI app: (status, headers, body)."""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+    }
+    messages = [{"type": "http.request", "body": body}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    response_headers = {k.decode(): v.decode() for k, v in sent[0]["headers"]}
+    content = b"".join(m.get("body", b"") for m in sent[1:])
+    return sent[0]["status"], response_headers, content
+
+
+async def call_asgi(app, method, path, query="", body=None):
+    """Drive one JSON request through an ASGI app and return (status, json)."""
+    content = json.dumps(body).encode() if body else b""
+    status, _, content = await asgi_request(app, method, path, query, content)
+    return status, json.loads(content)
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec("aiosqlite"), "aiosqlite is needed for the ASGI mode"
+)
+class AsgiParityTestCase(unittest.TestCase):
+    """The ASGI mode must answer exactly like the Flask views."""
+
+    def setUp(self):
+        from app.asgi import AsgiApp
+
+        self.tmp = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.tmp.name, 'asgi.db')}"
+        self.app = create_app(
+            "testing",
+            {"SQLALCHEMY_DATABASE_URI": url, "IMPORT_UPLOAD_DIR": self.tmp.name},
+        )
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            self.insert_sample_data()
+        self.asgi_app = AsgiApp(self.app)
+
+    def tearDown(self):
+        asyncio.run(self.asgi_app.engine.dispose())
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def insert_sample_data(self):
+        db.session.add(
+            Campaign(campaign_id=1, campaign_name="Test Campaign", campaign_type="SEARCH")
+        )
+        db.session.add(AdGroup(ad_group_id=1, ad_group_name="Test Ad Group", campaign_id=1))
+        for i in range(40):
+            db.session.add(
+                AdGroupStats(
+                    date=date(2024, 9, 30) - timedelta(days=i),
+                    ad_group_id=1,
+                    device="mobile",
+                    impressions=1000 + i,
+                    clicks=100 - i,
+                    conversions=10 - i * 0.1,
+                    # One day far off the others, for /anomalies
+                    cost=2000.0 if i == 5 else 200.0 - i * 2,
+                )
+            )
+        db.session.commit()
+
+    def assert_same_response(self, method, path, query="", body=None):
+        url = f"{path}?{query}" if query else path
+        flask_response = self.client.open(url, method=method, json=body)
+        content = json.dumps(body).encode() if body else b""
+        status, headers, content = asyncio.run(
+            asgi_request(self.asgi_app, method, path, query, content)
+        )
+        self.assertEqual(status, flask_response.status_code, url)
+        self.assertEqual(json.loads(content), flask_response.get_json(), url)
+        self.assertEqual(
+            headers.get("x-aggregate-by"), flask_response.headers.get("X-Aggregate-By")
+        )
+
+    def test_read_endpoints(self):
+        self.assert_same_response("GET", "/test")
+        self.assert_same_response("GET", "/campaigns")
+        for aggregate_by in ("day", "week", "month", "invalid"):
+            self.assert_same_response(
+                "GET", "/performance-time-series", f"aggregate_by={aggregate_by}"
+            )
+        self.assert_same_response(
+            "GET", "/performance-time-series", "aggregate_by=day&split_by=campaign"
+        )
+        self.assert_same_response(
+            "GET",
+            "/compare-performance",
+            "start_date=2024-09-20&end_date=2024-09-30&compare_mode=preceding",
+        )
+        self.assert_same_response("GET", "/compare-performance", "compare_mode=preceding")
+        self.assert_same_response("GET", "/anomalies", "threshold=1.5")
+        self.assert_same_response("GET", "/anomalies", "method=invalid")
+        self.assert_same_response("GET", "/search", "q=test&type=campaign,ad_group")
+        self.assert_same_response("GET", "/rankings", "metric=cost&level=campaign")
+
+    def test_read_endpoints_on_the_aggregates(self):
+        with self.app.app_context():
+            refresh_aggregates()
+        for query in (
+            "aggregate_by=day&max_points=3",
+            "aggregate_by=day&rolling=7",
+            "aggregate_by=week&split_by=campaign",
+        ):
+            self.assert_same_response("GET", "/performance-time-series", query)
+        self.assert_same_response(
+            "GET",
+            "/compare-performance",
+            "start_date=2024-09-20&end_date=2024-09-30&compare_mode=preceding",
+        )
+        self.assert_same_response("GET", "/anomalies", "threshold=1.5")
+
+    def test_routes(self):
+        with self.app.app_context():
+            rules = {
+                rule.endpoint
+                for rule in self.app.url_map.iter_rules()
+                if rule.endpoint != "static"
+            }
+        self.assertEqual(rules, set(self.asgi_app.views))
+
+        status, _, _ = asyncio.run(asgi_request(self.asgi_app, "GET", "/nowhere"))
+        self.assertEqual(status, 404)
+        status, _, _ = asyncio.run(asgi_request(self.asgi_app, "POST", "/search"))
+        self.assertEqual(status, 405)
+
+    def test_imports(self):
+        boundary = "boundary"
+        body = (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="stats.xlsx"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+            f"not really a workbook\r\n--{boundary}--\r\n"
+        ).encode()
+        content_type = ("Content-Type", f"multipart/form-data; boundary={boundary}")
+        status, headers, content = asyncio.run(
+            asgi_request(
+                self.asgi_app, "POST", "/imports", body=body, headers=[content_type]
+            )
+        )
+        self.assertEqual(status, 202)
+        job = json.loads(content)
+        self.assertEqual((job["filename"], job["status"]), ("stats.xlsx", "queued"))
+        self.assertEqual(headers["location"], f"/imports/{job['id']}")
+
+        self.assert_same_response("POST", "/imports")
+        self.assert_same_response("GET", f"/imports/{job['id']}")
+        self.assert_same_response("GET", "/imports/99")
+        self.assert_same_response("GET", f"/imports/{job['id']}/rejects")
+
+        path = os.path.join(self.tmp.name, "rejects.csv")
+        with open(path, "w") as f:
+            f.write("sheet,row,reason\nad_group_stats,2,cost is negative\n")
+        with self.app.app_context():
+            db.session.get(ImportJob, job["id"]).reject_path = path
+            db.session.commit()
+        url = f"/imports/{job['id']}/rejects"
+        flask_response = self.client.get(url)
+        status, headers, content = asyncio.run(asgi_request(self.asgi_app, "GET", url))
+        self.assertEqual(status, 200)
+        self.assertEqual(content, flask_response.data)
+        for name in ("Content-Type", "Content-Disposition"):
+            self.assertEqual(headers[name.lower()], flask_response.headers[name])
+
+    def test_update_campaign_name(self):
+        status, data = asyncio.run(
+            call_asgi(
+                self.asgi_app, "PUT", "/campaign", body={"campaign_id": 1, "new_name": "Async"}
+            )
+        )
+        self.assertEqual(status, 200)
+        with self.app.app_context():
+            campaign = db.session.get(Campaign, 1)
+            self.assertEqual((campaign.campaign_name, campaign.version), ("Async", 2))
+
+        # Last writer wins, like the Flask view
+        self.assert_same_response(
+            "PUT", "/campaign", body={"campaign_id": 1, "new_name": "Flask"}
+        )
+
+        self.assert_same_response("PUT", "/campaign", body={"campaign_id": 99, "new_name": "x"})
+
+    def test_malformed_json_body(self):
+        for path in ("/campaign", "/campaigns"):
+            for body in (b"{not json", b""):
+                flask_response = self.client.put(
+                    path, data=body, content_type="application/json"
+                )
+                status, _, content = asyncio.run(
+                    asgi_request(
+                        self.asgi_app,
+                        "PUT",
+                        path,
+                        body=body,
+                        headers=[("Content-Type", "application/json")],
+                    )
+                )
+                self.assertEqual(flask_response.status_code, 400, path)
+                self.assertEqual(status, 400, path)
+                self.assertEqual(json.loads(content), flask_response.get_json())
+
+
+class AsyncSingleFlightTestCase(unittest.TestCase):
+    def test_concurrent_calls_share_one_computation(self):
+        flight = AsyncSingleFlight()
+        computed = []
+
+        async def compute(value):
+            computed.append(value)
+            await asyncio.sleep(0.01)
+            return value * 2
+
+        async def main():
+            calls = [flight.do("key", compute, 21) for _ in range(3)]
+            results = await asyncio.gather(*calls, flight.do("other", compute, 1))
+            return results, flight.waiting("key")
+
+        results, waiting = asyncio.run(main())
+        self.assertEqual(results, [42, 42, 42, 2])
+        self.assertEqual(waiting, 0)
+        self.assertEqual(computed, [21, 1])
+        self.assertEqual((flight.computed, flight.shared), (2, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
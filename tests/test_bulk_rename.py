@@ -0,0 +1,129 @@
+import unittest
+
+from app import create_app, db
+from app.models import Campaign
+
+
+class BulkUpdateCampaignNamesEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            self.insert_sample_data()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def insert_sample_data(self):
+        for campaign_id in (1, 2, 3):
+            db.session.add(
+                Campaign(
+                    campaign_id=campaign_id,
+                    campaign_name=f"Campaign {campaign_id}",
+                    campaign_type="SEARCH",
+                )
+            )
+        db.session.commit()
+
+    def campaign_names(self):
+        with self.app.app_context():
+            return {c.campaign_id: c.campaign_name for c in db.session.query(Campaign)}
+
+    def test_bulk_update_campaign_names(self):
+        response = self.client.put(
+            "/campaigns",
+            json={
+                "renames": [
+                    {"campaign_id": 1, "new_name": "First"},
+                    {"campaign_id": 2, "new_name": "Second", "version": 1},
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["updated"], 2)
+        self.assertEqual(
+            data["results"],
+            [
+                {"campaign_id": 1, "status": "updated", "version": 2},
+                {"campaign_id": 2, "status": "updated", "version": 2},
+            ],
+        )
+        self.assertEqual(
+            self.campaign_names(), {1: "First", 2: "Second", 3: "Campaign 3"}
+        )
+
+    def test_bulk_update_reports_conflicts_and_missing(self):
+        self.client.put("/campaign", json={"campaign_id": 1, "new_name": "Changed"})
+
+        response = self.client.put(
+            "/campaigns",
+            json={
+                "renames": [
+                    {"campaign_id": 1, "new_name": "Stale", "version": 1},
+                    {"campaign_id": 3, "new_name": "Third", "version": 1},
+                    {"campaign_id": 99, "new_name": "Missing"},
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["updated"], 1)
+        self.assertEqual(
+            data["results"],
+            [
+                {"campaign_id": 1, "status": "conflict", "version": 2},
+                {"campaign_id": 3, "status": "updated", "version": 2},
+                {"campaign_id": 99, "status": "not_found", "version": None},
+            ],
+        )
+        self.assertEqual(self.campaign_names()[1], "Changed")
+
+    def test_single_rename_is_last_writer_wins(self):
+        for name in ("Writer A", "Writer B"):
+            response = self.client.put(
+                "/campaign", json={"campaign_id": 2, "new_name": name}
+            )
+            self.assertEqual(response.status_code, 200)
+
+        with self.app.app_context():
+            campaign = db.session.get(Campaign, 2)
+            self.assertEqual(campaign.campaign_name, "Writer B")
+            self.assertEqual(campaign.version, 3)
+
+    def test_bulk_update_invalid_input(self):
+        for payload, message in (
+            ({}, "No input data provided."),
+            ({"renames": []}, "renames must be a non-empty list."),
+            ({"renames": [{"campaign_id": "1", "new_name": "x"}]}, None),
+            ({"renames": [{"campaign_id": 1, "new_name": "x", "version": "2"}]}, None),
+            (
+                {
+                    "renames": [
+                        {"campaign_id": 1, "new_name": "x"},
+                        {"campaign_id": 1, "new_name": "y"},
+                    ]
+                },
+                "Duplicate campaign_id in renames: 1.",
+            ),
+        ):
+            response = self.client.put("/campaigns", json=payload)
+            self.assertEqual(response.status_code, 400)
+            if message:
+                self.assertEqual(response.get_json()["message"], message)
+
+        self.assertEqual(self.campaign_names()[1], "Campaign 1")
+
+    def test_bulk_update_too_many_items(self):
+        self.app.config["BULK_RENAME_MAX_ITEMS"] = 2
+        renames = [{"campaign_id": i, "new_name": f"N{i}"} for i in (1, 2, 3)]
+        response = self.client.put("/campaigns", json={"renames": renames})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from datetime import date
+
+from app import create_app, db
+from app.models import Campaign, AdGroup, AdGroupStats
+
+
+class CampaignSeriesTestCase(unittest.TestCase):
+    """split_by=campaign: one series per campaign on a shared period axis."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        for campaign_id in (1, 2, 3):
+            db.session.add(
+                Campaign(
+                    campaign_id=campaign_id,
+                    campaign_name=f"C{campaign_id}",
+                    campaign_type="SEARCH",
+                )
+            )
+            db.session.add(
+                AdGroup(
+                    ad_group_id=campaign_id,
+                    ad_group_name=f"A{campaign_id}",
+                    campaign_id=campaign_id,
+                )
+            )
+        # Campaign 1 every day from 03-01 to 03-05, campaign 2 only on 03-03,
+        # campaign 3 never
+        days = [(1, day) for day in range(1, 6)] + [(2, 3)]
+        for ad_group_id, day in days:
+            db.session.add(
+                AdGroupStats(
+                    date=date(2024, 3, day),
+                    ad_group_id=ad_group_id,
+                    device="mobile",
+                    impressions=100,
+                    clicks=10,
+                    conversions=2.0,
+                    cost=float(day),
+                )
+            )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get(self, query):
+        response = self.client.get(
+            f"/performance-time-series?split_by=campaign&{query}"
+        )
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.get_json()
+
+    def test_shared_axis_zero_filled(self):
+        result = self.get("aggregate_by=day")
+        self.assertEqual(
+            result["periods"],
+            ["2024-03-01", "2024-03-02", "2024-03-03", "2024-03-04", "2024-03-05"],
+        )
+        first, second = result["series"]
+        self.assertEqual(first["campaign_id"], 1)
+        self.assertEqual(first["total_cost"], [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(first["avg_click_through_rate"], [10.0] * 5)
+        self.assertEqual(second["campaign_id"], 2)
+        self.assertEqual(second["total_clicks"], [0, 0, 10, 0, 0])
+        self.assertEqual(second["avg_cost_per_click"], [None, None, 0.3, None, None])
+
+    def test_matches_single_campaign_series(self):
+        result = self.get("aggregate_by=week&campaigns=1,2")
+        for series in result["series"]:
+            single = self.client.get(
+                "/performance-time-series?aggregate_by=week"
+                f"&campaigns={series['campaign_id']}"
+            ).get_json()
+            for row in single:
+                index = result["periods"].index(row["period"])
+                for key, value in row.items():
+                    if key != "period":
+                        self.assertEqual(series[key][index], value, key)
+
+    def test_requested_campaigns_without_rows(self):
+        result = self.get("aggregate_by=month&campaigns=2,3")
+        self.assertEqual(result["periods"], ["2024-03"])
+        self.assertEqual([s["campaign_id"] for s in result["series"]], [2, 3])
+        self.assertEqual(result["series"][1]["total_cost"], [0.0])
+        self.assertIsNone(result["series"][1]["avg_conversion_rate"][0])
+
+        empty = self.get("aggregate_by=day&start_date=2025-01-01")
+        self.assertEqual(empty["periods"], [])
+        self.assertEqual(empty["series"], [])
+
+    def test_invalid_split_by(self):
+        for query, message in (
+            ("split_by=ad_group", "split_by must be one of: campaign."),
+            ("split_by=campaign&rolling=3", "cannot be combined with split_by"),
+        ):
+            response = self.client.get(
+                f"/performance-time-series?aggregate_by=day&{query}"
+            )
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(message, response.get_json()["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
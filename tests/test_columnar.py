@@ -0,0 +1,269 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import event, insert
+
+from app import create_app, db
+from app.columnar import COLUMNS, ColumnarFrame, ColumnarStore, period_keys, day_numbers
+from app.models import AdGroup, AdGroupStats
+from app.services import (
+    TimeSeriesParams,
+    campaign_series_statement,
+    format_time_series,
+    pivot_campaign_series,
+    time_series_statement,
+    window_start,
+    windowed_time_series_statement,
+)
+from app.synthetic import SyntheticDataset, storage_frame, write_dataset
+
+
+class ColumnarStoreTestCase(unittest.TestCase):
+    """The columnar engine must return exactly what the SQL path returns."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        dataset = SyntheticDataset(
+            campaigns=3, ad_groups_per_campaign=2, days=75, devices=2, end_date=date(2024, 3, 15)
+        )
+        write_dataset(dataset, chunk_rows=250)
+        self.store = ColumnarStore(refresh_interval=3600)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def assertSameAsSql(self, params):
+        statement = windowed_time_series_statement(
+            time_series_statement, params, "sqlite", AdGroupStats.date
+        )
+        expected = format_time_series(
+            db.session.execute(statement).all(),
+            params.aggregate_by,
+            params.rolling,
+            params.lag,
+        )
+        actual = format_time_series(
+            self.store.time_series(params, window_start(params)),
+            params.aggregate_by,
+            params.rolling,
+            params.lag,
+        )
+
+        self.assertEqual([r["period"] for r in actual], [r["period"] for r in expected])
+        for actual_row, expected_row in zip(actual, expected):
+            for key, value in expected_row.items():
+                if isinstance(value, float):
+                    # Sums may add up in a different order, so allow a rounding step
+                    self.assertAlmostEqual(actual_row[key], value, delta=0.011, msg=key)
+                else:
+                    self.assertEqual(actual_row[key], value, msg=key)
+
+    def test_matches_sql_aggregations(self):
+        for aggregate_by in ("day", "week", "month", "quarter"):
+            for campaigns in ((), (2,), (1, 3)):
+                with self.subTest(aggregate_by=aggregate_by, campaigns=campaigns):
+                    self.assertSameAsSql(TimeSeriesParams(aggregate_by, campaigns, None, None))
+
+        start, end = datetime(2024, 1, 17), datetime(2024, 2, 20)
+        for aggregate_by in ("day", "week", "month", "quarter"):
+            self.assertSameAsSql(TimeSeriesParams(aggregate_by, (1,), start, end))
+
+    def test_rolling_windows_and_lags_match_sql(self):
+        # A day without rows inside the windows
+        db.session.query(AdGroupStats).filter(AdGroupStats.date == date(2024, 2, 7)).delete()
+        db.session.commit()
+
+        start, end = datetime(2024, 2, 8), datetime(2024, 3, 10)
+        for aggregate_by in ("day", "week", "month"):
+            for campaigns in ((), (2,)):
+                with self.subTest(aggregate_by=aggregate_by, campaigns=campaigns):
+                    self.assertSameAsSql(
+                        TimeSeriesParams(
+                            aggregate_by, campaigns, start, end, None, (3, 7), (1, 2)
+                        )
+                    )
+        self.assertSameAsSql(TimeSeriesParams("day", (), None, None, None, (7,), (7,)))
+
+    def test_campaign_series_match_sql(self):
+        start, end = datetime(2024, 1, 17), datetime(2024, 2, 20)
+        for aggregate_by in ("day", "week", "month", "quarter"):
+            for campaigns in ((), (1, 3)):
+                params = TimeSeriesParams(
+                    aggregate_by, campaigns, start, end, split_by="campaign"
+                )
+                with self.subTest(aggregate_by=aggregate_by, campaigns=campaigns):
+                    rows = db.session.execute(
+                        campaign_series_statement(params, "sqlite")
+                    ).all()
+                    expected = pivot_campaign_series(rows, params)
+                    actual = pivot_campaign_series(
+                        self.store.campaign_series(params), params
+                    )
+                    self.assertEqual(actual["periods"], expected["periods"])
+                    for got, want in zip(actual["series"], expected["series"]):
+                        self.assertEqual(got["campaign_id"], want["campaign_id"])
+                        self.assertEqual(got["total_clicks"], want["total_clicks"])
+                        np.testing.assert_allclose(
+                            np.array(got["avg_cost_per_click"], dtype=float),
+                            np.array(want["avg_cost_per_click"], dtype=float),
+                            atol=0.011,
+                        )
+
+    def test_zero_clicks_and_conversions_skipped_in_averages(self):
+        db.session.execute(
+            insert(AdGroupStats),
+            [
+                {
+                    "date": date(2024, 4, 1),
+                    "ad_group_id": 1,
+                    "device_id": 1,
+                    "impressions": 100,
+                    "clicks": 0,
+                    "conversions": 0.0,
+                    "cost_micros": 5_000_000,
+                }
+            ],
+        )
+        db.session.commit()
+        self.assertSameAsSql(
+            TimeSeriesParams("day", (), datetime(2024, 3, 14), datetime(2024, 4, 1))
+        )
+
+    def add_days(self, end_date):
+        new_days = SyntheticDataset(
+            campaigns=3,
+            ad_groups_per_campaign=2,
+            days=5,
+            devices=1,
+            end_date=end_date,
+            seed=7,
+        )
+        for frame in new_days.stats_chunks():
+            db.session.execute(insert(AdGroupStats), storage_frame(frame).to_dict("records"))
+        db.session.commit()
+
+    def test_incremental_refresh_only_reads_new_rows(self):
+        loaded = self.store.refresh()
+        self.assertEqual(loaded, 3 * 2 * 75 * 2)
+
+        self.add_days(date(2024, 3, 20))
+        self.assertEqual(self.store.refresh(), 3 * 2 * 5)
+        self.assertEqual(self.store.refresh(), 0)
+        self.assertSameAsSql(TimeSeriesParams("week", (), None, None))
+
+    def test_ad_group_created_during_a_refresh(self):
+        self.store.refresh()
+        added = []
+
+        # A new ad group and its first row are committed just before the
+        # refresh starts streaming the stats
+        def before_cursor_execute(conn, cursor, statement, *args):
+            if added or "FROM ad_group_stats" not in statement:
+                return
+            added.append(True)
+            conn.execute(
+                insert(AdGroup),
+                {"ad_group_id": 99, "ad_group_name": "New", "campaign_id": 3},
+            )
+            conn.execute(
+                insert(AdGroupStats),
+                {
+                    "date": date(2024, 3, 16),
+                    "ad_group_id": 99,
+                    "device_id": 1,
+                    "impressions": 100,
+                    "clicks": 10,
+                    "conversions": 1.0,
+                    "cost_micros": 5_000_000,
+                },
+            )
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            self.assertEqual(self.store.refresh(), 1)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(self.store.frame.column("campaign_id")[-1], 3)
+        self.assertSameAsSql(TimeSeriesParams("day", (3,), None, None))
+
+    def test_snapshot_is_memory_mapped_and_refreshed(self):
+        with tempfile.TemporaryDirectory() as path:
+            written = self.store.save_snapshot(path)
+
+            mapped = ColumnarStore(snapshot_path=path, refresh_interval=3600)
+            frame = mapped.ensure_fresh()
+            self.assertEqual(len(frame), written)
+            self.assertIsInstance(frame.base["cost_micros"], np.memmap)
+            self.assertEqual(os.path.getsize(os.path.join(path, "day.npy")) // written, 4)
+
+            self.store = mapped
+            self.assertSameAsSql(TimeSeriesParams("month", (2, 3), None, None))
+
+            # New rows go to the tail, the mapped base is not copied
+            self.add_days(date(2024, 3, 20))
+            mapped.refresh()
+            self.assertIsInstance(mapped.frame.base["cost_micros"], np.memmap)
+            self.assertEqual(mapped.frame.tail_rows, 3 * 2 * 5)
+            self.assertSameAsSql(TimeSeriesParams("month", (2, 3), None, None))
+
+    def test_appends_double_the_tail_capacity(self):
+        frame = ColumnarFrame.empty()
+        capacities = set()
+        for i in range(1, 101):
+            chunk = {name: np.full(3, i, dtype) for name, dtype in COLUMNS.items()}
+            previous, frame = frame, frame.append(chunk, i)
+            capacities.add(frame.tail.capacity)
+            # Earlier frames keep seeing only their own rows
+            self.assertEqual(len(previous), 3 * (i - 1))
+        self.assertEqual(len(frame), 300)
+        expected_days = np.repeat(np.arange(1, 101), 3)
+        self.assertEqual(frame.column("day").tolist(), expected_days.tolist())
+        self.assertEqual(sorted(capacities), [3 * 2**k for k in range(8)])
+
+    def test_period_keys(self):
+        days = day_numbers([date(2024, 3, 10), date(2024, 3, 11), date(2024, 2, 29)])
+        weeks = period_keys(days, "week").astype("datetime64[D]").tolist()
+        months = period_keys(days, "month").astype("datetime64[D]").tolist()
+        self.assertEqual(weeks, [date(2024, 3, 4), date(2024, 3, 11), date(2024, 2, 26)])
+        self.assertEqual(months, [date(2024, 3, 1), date(2024, 3, 1), date(2024, 2, 1)])
+
+
+class ColumnarEndpointTestCase(unittest.TestCase):
+    def test_endpoint_uses_columnar_engine(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'columnar.db')}"
+            sql_app = create_app("testing", {"SQLALCHEMY_DATABASE_URI": url})
+            columnar_app = create_app(
+                "testing", {"SQLALCHEMY_DATABASE_URI": url, "COLUMNAR_ENGINE": True}
+            )
+            with sql_app.app_context():
+                db.create_all()
+                write_dataset(
+                    SyntheticDataset(
+                        campaigns=2, ad_groups_per_campaign=2, days=20, end_date=date(2024, 5, 1)
+                    )
+                )
+
+            url = "/performance-time-series?aggregate_by=week&campaigns=1"
+            expected = sql_app.test_client().get(url)
+            actual = columnar_app.test_client().get(url)
+
+            self.assertEqual(actual.status_code, 200)
+            self.assertEqual(len(actual.get_json()), len(expected.get_json()))
+            self.assertGreater(len(columnar_app.extensions["columnar_store"].frame), 0)
+
+            for app in (sql_app, columnar_app):
+                with app.app_context():
+                    db.engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
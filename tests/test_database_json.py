@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import unittest
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from sqlalchemy import Float, cast, column, literal, select, update, values
+from sqlalchemy.dialects import postgresql
+
+from app import create_app, db
+from app.models import AdGroup, AdGroupStats
+from app.services import (
+    campaigns_json_statement,
+    format_time_series,
+    json_round,
+    parse_time_series_params,
+    time_series_json_statement,
+    time_series_rows_statement,
+)
+from app.synthetic import SyntheticDataset, write_dataset
+
+
+class DatabaseJsonTestCase(unittest.TestCase):
+    """
+    The PostgreSQL path building /campaigns and the time series as JSON in
+    the db. It can't run on SQLite, so the statements are compiled and the
+    view is checked to pass the db's text through untouched.
+    """
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        write_dataset(
+            SyntheticDataset(
+                campaigns=2, ad_groups_per_campaign=2, days=20, end_date=date(2024, 2, 10)
+            )
+        )
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def json_keys(self, statement):
+        sql = str(
+            statement.compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+        self.assertIn("json_agg(json_build_object(", sql)
+        fields = sql.split("json_build_object(", 1)[1].split("\nFROM", 1)[0]
+        return re.findall(r"'(\w+)', ", fields)
+
+    def test_statements_build_the_python_keys_sorted(self):
+        query = "aggregate_by=week&start_date=2024-01-25&rolling=2&lag=1"
+        expected = self.client.get(f"/performance-time-series?{query}").get_json()
+        params = parse_time_series_params(
+            {"aggregate_by": "week", "start_date": "2024-01-25", "rolling": "2", "lag": "1"}
+        )
+        statement = time_series_json_statement(
+            params, time_series_rows_statement(params, "postgresql")
+        )
+        self.assertEqual(self.json_keys(statement), sorted(expected[0]))
+
+        expected = self.client.get("/campaigns").get_json()
+        self.assertEqual(self.json_keys(campaigns_json_statement()), sorted(expected[0]))
+
+    def test_python_path_returns_numbers_for_numeric_sums(self):
+        Row = namedtuple(
+            "Row",
+            "period total_cost total_clicks total_conversions avg_cost_per_click "
+            "avg_cost_per_conversion avg_click_through_rate avg_conversion_rate "
+            "total_clicks_whole total_clicks_previous_1",
+        )
+        row = Row(
+            date(2024, 1, 1),
+            12.345,
+            Decimal("30"),
+            1.0,
+            Decimal("0.411666666666666667"),
+            None,
+            0.03,
+            0.1,
+            Decimal("30"),
+            Decimal("20"),
+        )
+        with mock.patch("app.services.WINDOW_METRICS", ["total_clicks"]):
+            record = format_time_series([row], "day", lag=(1,))[0]
+        self.assertEqual(record["total_clicks"], 30)
+        self.assertIs(type(record["total_clicks"]), int)
+        self.assertIs(type(record["avg_cost_per_click"]), float)
+        self.assertEqual(record["avg_cost_per_click"], 0.41)
+        self.assertEqual(record["avg_click_through_rate"], 3.0)
+        self.assertEqual(record["total_clicks_change_1"], 50.0)
+        self.assertIs(type(record["total_clicks_change_1"]), float)
+
+    def test_json_text_is_passed_through(self):
+        body = '[{"period" : "2024-01-01", "total_cost" : 1.5}]'
+        with mock.patch("app.services.database_json_enabled", return_value=True):
+            with mock.patch(
+                "app.services.time_series_json_statement",
+                return_value=select(literal(body)),
+            ):
+                response = self.client.get("/performance-time-series?aggregate_by=day")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, "application/json")
+            self.assertEqual(response.get_data(as_text=True), body + "\n")
+            self.assertEqual(response.headers["X-Aggregate-By"], "day")
+
+            with mock.patch(
+                "app.services.campaigns_json_statement",
+                return_value=select(literal('[{"campaign_id" : 1}]')),
+            ):
+                response = self.client.get("/campaigns")
+            self.assertEqual(response.get_data(as_text=True), '[{"campaign_id" : 1}]\n')
+
+            with mock.patch(
+                "app.services.campaigns_json_statement",
+                return_value=select(literal(None)),
+            ):
+                self.assertEqual(self.client.get("/campaigns").status_code, 404)
+
+
+@unittest.skipUnless(
+    os.getenv("DATABASE_URL", "").startswith("postgresql"),
+    "the JSON built by the db needs PostgreSQL (DATABASE_URL)",
+)
+class DatabaseJsonParityTestCase(unittest.TestCase):
+    """The JSON PostgreSQL builds must hold exactly the Python path's values."""
+
+    # Ties in decimal that are not ties in binary, and the other way round
+    HALF_WAY = [0.125, 0.375, 2.675, 1.005, 0.855, 0.005, 0.015, 1.115, 2.5, 10.245]
+
+    def setUp(self):
+        url = os.environ["DATABASE_URL"]
+        self.apps = {
+            enabled: create_app(
+                "testing", {"SQLALCHEMY_DATABASE_URI": url, "DATABASE_JSON": enabled}
+            )
+            for enabled in (True, False)
+        }
+        self.app_context = self.apps[True].app_context()
+        self.app_context.push()
+        db.create_all()
+        end_date = date(2024, 2, 10)
+        write_dataset(
+            SyntheticDataset(
+                campaigns=2,
+                ad_groups_per_campaign=1,
+                days=20,
+                devices=1,
+                end_date=end_date,
+            )
+        )
+        # Campaign 1 has one row a day: give its first days half-way costs
+        ad_group_id = db.session.execute(
+            select(AdGroup.ad_group_id).where(AdGroup.campaign_id == 1)
+        ).scalar_one()
+        for i, cost in enumerate(self.HALF_WAY):
+            db.session.execute(
+                update(AdGroupStats)
+                .where(
+                    AdGroupStats.ad_group_id == ad_group_id,
+                    AdGroupStats.date == end_date - timedelta(days=19 - i),
+                )
+                .values(cost_micros=round(cost * 1_000_000), clicks=1, conversions=8)
+            )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        for app in self.apps.values():
+            with app.app_context():
+                db.engine.dispose()
+
+    def test_json_round_rounds_like_python(self):
+        numbers = self.HALF_WAY + [-v for v in self.HALF_WAY]
+        numbers += [k / 1000 for k in range(3000)] + [k / 7 for k in range(200)]
+        table = values(column("v", Float), name="numbers").data(
+            [(v,) for v in numbers]
+        )
+        # The driver may send the numbers as numeric, so read them back as floats
+        rows = db.session.execute(
+            select(
+                cast(table.c.v, Float), json_round(table.c.v), json_round(table.c.v, 100)
+            )
+        ).all()
+        self.assertEqual(len(rows), len(numbers))
+        for value, rounded, percent in rows:
+            self.assertEqual(rounded, round(value, 2), value)
+            self.assertEqual(percent, round(value * 100, 2), value)
+
+    def test_responses_match_the_python_path(self):
+        clients = {enabled: app.test_client() for enabled, app in self.apps.items()}
+        for url in (
+            "/campaigns",
+            "/performance-time-series?aggregate_by=day&campaigns=1",
+            "/performance-time-series?aggregate_by=day",
+            "/performance-time-series?aggregate_by=week&rolling=2&lag=1",
+            "/performance-time-series?aggregate_by=month&campaigns=1,2&lag=1",
+        ):
+            in_db = clients[True].get(url)
+            in_python = clients[False].get(url)
+            self.assertEqual(in_db.status_code, 200, url)
+            self.assertEqual(in_python.status_code, 200, url)
+            self.assertEqual(json.loads(in_db.data), in_python.get_json(), url)
+
+
+if __name__ == "__main__":
+    unittest.main()
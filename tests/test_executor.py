@@ -0,0 +1,223 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import create_app, db
+from app.executor import run_parallel, start_executor
+from app.models import Campaign, AdGroup, AdGroupStats
+from app.routing import read_only
+
+
+def _whoami(value):
+    return value, threading.get_ident(), id(db.session()), current_app.name
+
+
+def _fail():
+    raise ValueError("boom")
+
+
+def _replica_name(value):
+    name = db.session.execute(select(Campaign.campaign_name)).scalar()
+    return name, db.session.info.get("replica")
+
+
+@read_only
+def _read_in_parallel():
+    return run_parallel([(_replica_name, (i,)) for i in range(6)])
+
+
+class RunParallelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.tmp.name, 'executor.db')}"
+        self.app = create_app(
+            "testing", {"SQLALCHEMY_DATABASE_URI": url, "PARALLEL_QUERY_WORKERS": 4}
+        )
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            self.insert_sample_data()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def insert_sample_data(self):
+        for campaign_id in (1, 2, 3):
+            db.session.add(
+                Campaign(
+                    campaign_id=campaign_id,
+                    campaign_name=f"Campaign {campaign_id}",
+                    campaign_type="SEARCH",
+                )
+            )
+            db.session.add(
+                AdGroup(
+                    ad_group_id=campaign_id,
+                    ad_group_name=f"Ad Group {campaign_id}",
+                    campaign_id=campaign_id,
+                )
+            )
+            for i in range(20):
+                db.session.add(
+                    AdGroupStats(
+                        date=date(2024, 9, 30) - timedelta(days=i),
+                        ad_group_id=campaign_id,
+                        device="mobile",
+                        impressions=1000,
+                        clicks=100 - i,
+                        conversions=5 * campaign_id,
+                        cost=20.0 * campaign_id + i,
+                    )
+                )
+        db.session.commit()
+
+    def test_results_in_order_on_separate_sessions(self):
+        # The default pool keeps 5 connections: the caller's and 4 for workers
+        with self.app.app_context():
+            results = run_parallel([(_whoami, (i,)) for i in range(4)])
+
+        self.assertEqual([r[0] for r in results], list(range(4)))
+        self.assertTrue(all(r[3] == self.app.name for r in results))
+        caller_thread = threading.get_ident()
+        self.assertTrue(all(r[1] != caller_thread for r in results))
+
+    def test_calls_without_a_connection_slot_run_in_the_caller(self):
+        with self.app.app_context():
+            results = run_parallel([(_whoami, (i,)) for i in range(8)])
+            slots = self.app.extensions["query_connection_slots"]
+            # Every slot was given back
+            self.assertEqual(
+                [slots.acquire(blocking=False) for _ in range(6)], [True] * 5 + [False]
+            )
+
+        self.assertEqual([r[0] for r in results], list(range(8)))
+        caller_thread = threading.get_ident()
+        in_caller = [r[1] == caller_thread for r in results]
+        self.assertEqual(in_caller, [False] * 4 + [True] * 4)
+
+    def test_concurrent_fan_outs_do_not_exhaust_the_pool(self):
+        # Every caller holds one of the pool's connections while it fans out;
+        # without the slots the workers would wait for one until pool_timeout
+        app = create_app(
+            "testing",
+            {
+                "SQLALCHEMY_DATABASE_URI": self.app.config["SQLALCHEMY_DATABASE_URI"],
+                "SQLALCHEMY_ENGINE_OPTIONS": {
+                    "pool_size": 3,
+                    "max_overflow": 0,
+                    "pool_timeout": 2,
+                },
+                "PARALLEL_QUERY_WORKERS": 2,
+            },
+        )
+        with app.app_context():
+            start_executor(app)
+        barrier = threading.Barrier(3)
+        results, errors = [], []
+
+        def fan_out():
+            try:
+                with app.app_context():
+                    db.session.execute(select(Campaign.campaign_id)).all()
+                    barrier.wait()
+                    calls = [(_replica_name, (i,)) for i in range(3)]
+                    results.append(run_parallel(calls))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=fan_out) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with app.app_context():
+            db.engine.dispose()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 3)
+
+    def test_errors_are_raised_in_caller(self):
+        with self.app.app_context():
+            with self.assertRaises(ValueError):
+                run_parallel([(_whoami, (1,)), (_fail, ())])
+
+    def test_in_memory_sqlite_runs_inline(self):
+        app = create_app("testing")
+        with app.app_context():
+            results = run_parallel([(_whoami, (i,)) for i in range(3)])
+        self.assertTrue(all(r[1] == threading.get_ident() for r in results))
+
+    def test_workers_leave_the_callers_connection(self):
+        url = self.app.config["SQLALCHEMY_DATABASE_URI"]
+        for pool_size, workers in ((5, 4), (3, 2), (2, 1)):
+            app = create_app(
+                "testing",
+                {
+                    "SQLALCHEMY_DATABASE_URI": url,
+                    "SQLALCHEMY_ENGINE_OPTIONS": {"pool_size": pool_size},
+                    "PARALLEL_QUERY_WORKERS": 8,
+                },
+            )
+            with app.app_context():
+                self.assertEqual(start_executor(app), workers)
+                db.engine.dispose()
+
+    def test_tasks_read_from_the_callers_replica(self):
+        replicas = [
+            f"sqlite:///{os.path.join(self.tmp.name, f'replica{i}.db')}" for i in (0, 1)
+        ]
+        app = create_app(
+            "testing",
+            {
+                "SQLALCHEMY_DATABASE_URI": self.app.config["SQLALCHEMY_DATABASE_URI"],
+                "REPLICA_DATABASE_URLS": replicas,
+                "PARALLEL_QUERY_WORKERS": 4,
+            },
+        )
+        router = app.extensions["replica_router"]
+        for key, engine in router.engines.items():
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(
+                    Campaign.__table__.insert(),
+                    {"campaign_id": 1, "campaign_name": key, "campaign_type": "SEARCH"},
+                )
+
+        for _ in range(2):
+            with app.app_context():
+                results = _read_in_parallel()
+                self.assertEqual(len(set(results)), 1)
+                self.assertEqual(results[0], (results[0][1], results[0][1]))
+                db.session.remove()
+        for engine in router.engines.values():
+            engine.dispose()
+
+    def test_endpoints_match_sequential_execution(self):
+        sequential = create_app(
+            "testing",
+            {
+                "SQLALCHEMY_DATABASE_URI": self.app.config["SQLALCHEMY_DATABASE_URI"],
+                "PARALLEL_QUERY_WORKERS": 0,
+            },
+        ).test_client()
+
+        for url in (
+            "/campaigns",
+            "/compare-performance?start_date=2024-09-25&end_date=2024-09-30&compare_mode=preceding",
+        ):
+            parallel_response = self.client.get(url)
+            self.assertEqual(parallel_response.status_code, 200)
+            self.assertEqual(parallel_response.get_json(), sequential.get(url).get_json())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from app import create_app, db
+from app.health import warm_up
+
+
+class HealthEndpointsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.tmp.name, 'health.db')}"
+        self.app = create_app(
+            "testing", {"SQLALCHEMY_DATABASE_URI": url, "PARALLEL_QUERY_WORKERS": 3}
+        )
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_health(self):
+        response = self.client.get("/health")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"status": "ok"})
+
+    def test_ready_reports_pool(self):
+        response = self.client.get("/ready")
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["status"], "ready")
+        self.assertEqual(data["database"]["pool"]["class"], "QueuePool")
+        self.assertEqual(data["database"]["pool"]["checked_out"], 0)
+        self.assertEqual(data["replicas"], {})
+
+    def test_ready_unavailable(self):
+        app = create_app(
+            "testing",
+            {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{self.tmp.name}/missing/db.sqlite"},
+        )
+        response = app.test_client().get("/ready")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json()["status"], "unavailable")
+
+    def test_warm_up_opens_pooled_connections(self):
+        result = warm_up(self.app)
+
+        self.assertEqual(result["connections"], 3)
+        with self.app.app_context():
+            pool = db.engine.pool
+            self.assertEqual(pool.checkedin(), 3)
+            self.assertEqual(pool.checkedout(), 0)
+            self.assertIsNotNone(self.app.extensions["query_executor"])
+
+
+if __name__ == "__main__":
+    unittest.main()
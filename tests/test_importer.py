@@ -0,0 +1,273 @@
+import io
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+import pandas as pd
+from sqlalchemy import inspect, select
+
+from app import create_app, db
+from app.aggregates import daily_rollup_fresh
+from app.importer import (
+    ImportFailed,
+    bulk_load_stats,
+    claim_next_job,
+    enqueue_import,
+    import_workbook,
+    requeue_stale_jobs,
+    work,
+)
+from app.models import AdGroup, AdGroupStats, Campaign, ImportJob
+from app.prefix_sums import prefix_sums_fresh
+from app.synthetic import SyntheticDataset
+
+
+def write_workbook(path, dataset, drop_stats_column=None):
+    stats = pd.concat(dataset.stats_chunks(), ignore_index=True)
+    if drop_stats_column:
+        stats = stats.drop(columns=[drop_stats_column])
+    with pd.ExcelWriter(path) as writer:
+        sheets = {
+            "campaign": pd.DataFrame(dataset.campaign_rows()),
+            "ad_group": pd.DataFrame(dataset.ad_group_rows()),
+            "ad_group_stats": stats,
+        }
+        for name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=name, index=False)
+    return stats
+
+
+class ImportJobTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app = create_app(
+            "testing", {"IMPORT_UPLOAD_DIR": self.tmp.name, "IMPORT_CHUNK_ROWS": 25}
+        )
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.dataset = SyntheticDataset(
+            campaigns=2, ad_groups_per_campaign=2, days=10, devices=2, end_date=date(2024, 1, 31)
+        )
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.tmp.cleanup()
+
+    def upload(self, path, filename="stats.xlsx"):
+        with open(path, "rb") as f:
+            return self.client.post(
+                "/imports",
+                data={"file": (f, filename)},
+                content_type="multipart/form-data",
+            )
+
+    def test_upload_import_and_status(self):
+        path = os.path.join(self.tmp.name, "upload.xlsx")
+        stats = write_workbook(path, self.dataset)
+
+        response = self.upload(path)
+        self.assertEqual(response.status_code, 202)
+        job = response.get_json()
+        self.assertEqual(job["status"], "queued")
+        self.assertEqual(response.headers["Location"], f"/imports/{job['id']}")
+
+        self.assertEqual(work(self.app, worker="test", once=True), 1)
+
+        status = self.client.get(f"/imports/{job['id']}").get_json()
+        self.assertEqual(status["status"], "done", status["error"])
+        self.assertEqual(status["total_rows"], len(stats))
+        self.assertEqual(status["rows_processed"], len(stats))
+        self.assertGreater(status["rows_per_second"], 0)
+
+        self.assertEqual(db.session.query(Campaign).count(), 2)
+        self.assertEqual(db.session.query(AdGroup).count(), 4)
+        self.assertEqual(db.session.query(AdGroupStats).count(), len(stats))
+        total_cost = db.session.execute(select(AdGroupStats.total_cost())).scalar()
+        self.assertAlmostEqual(total_cost, stats["cost"].sum(), places=6)
+        self.assertTrue(prefix_sums_fresh())
+        self.assertTrue(daily_rollup_fresh())
+        # The upload is removed once imported
+        self.assertEqual(
+            [f for f in os.listdir(self.tmp.name) if f != "upload.xlsx"], []
+        )
+
+    def test_invalid_workbook_fails_job(self):
+        path = os.path.join(self.tmp.name, "upload.xlsx")
+        write_workbook(path, self.dataset, drop_stats_column="cost")
+        job_id = self.upload(path).get_json()["id"]
+
+        work(self.app, once=True)
+
+        status = self.client.get(f"/imports/{job_id}").get_json()
+        self.assertEqual(status["status"], "failed")
+        self.assertIn("missing columns: cost", status["error"])
+        self.assertEqual(db.session.query(AdGroupStats).count(), 0)
+
+    def test_failed_refresh_does_not_fail_the_job(self):
+        path = os.path.join(self.tmp.name, "upload.xlsx")
+        stats = write_workbook(path, self.dataset)
+        job_id = self.upload(path).get_json()["id"]
+
+        with mock.patch(
+            "app.importer.refresh_aggregates", side_effect=RuntimeError("boom")
+        ):
+            work(self.app, once=True)
+
+        job = db.session.get(ImportJob, job_id)
+        self.assertEqual(job.status, "done")
+        self.assertIsNone(job.error)
+        self.assertEqual(job.rows_processed, len(stats))
+        self.assertEqual(db.session.query(AdGroupStats).count(), len(stats))
+        # Stale until the next refresh, so the endpoints scan the stats
+        self.assertFalse(daily_rollup_fresh())
+
+    def test_resumes_after_last_committed_chunk(self):
+        path = os.path.join(self.tmp.name, "upload.xlsx")
+        stats = write_workbook(path, self.dataset)
+        job_id = enqueue_import("upload.xlsx", path).id
+
+        # A worker committed the first 50 rows, then stopped reporting
+        job = claim_next_job("dead-worker")
+        job.rows_processed = 50
+        job.updated_at = datetime.utcnow() - timedelta(minutes=5)
+        db.session.commit()
+        # Not stale yet for IMPORT_JOB_STALE_SECONDS (600), so nothing to do
+        self.assertEqual(work(self.app, once=True), 0)
+
+        self.assertEqual(requeue_stale_jobs(60), 1)
+        self.assertEqual(work(self.app, once=True), 1)
+
+        job = db.session.get(ImportJob, job_id)
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.rows_processed, len(stats))
+        # Only the rows after the first 50 were inserted
+        self.assertEqual(db.session.query(AdGroupStats).count(), len(stats) - 50)
+
+    def test_invalid_rows_are_rejected_with_reasons(self):
+        path = os.path.join(self.tmp.name, "upload.xlsx")
+        stats = pd.concat(self.dataset.stats_chunks(), ignore_index=True)
+        stats = stats.astype({"date": object, "impressions": float, "clicks": float})
+        stats.loc[0, "cost"] = -1.5
+        stats.loc[1, "clicks"] = 2.5
+        stats.loc[2, "ad_group_id"] = 999
+        stats.loc[3, "date"] = "not a date"
+        stats.loc[4, ["impressions", "device"]] = [None, None]
+        ad_groups = pd.DataFrame(self.dataset.ad_group_rows())
+        # An ad group of an unknown campaign, and a stats row of it
+        ad_groups.loc[len(ad_groups)] = [77, "Orphan", 42]
+        stats.loc[5, "ad_group_id"] = 77
+        with pd.ExcelWriter(path) as writer:
+            pd.DataFrame(self.dataset.campaign_rows()).to_excel(
+                writer, sheet_name="campaign", index=False
+            )
+            ad_groups.to_excel(writer, sheet_name="ad_group", index=False)
+            stats.to_excel(writer, sheet_name="ad_group_stats", index=False)
+        job_id = self.upload(path).get_json()["id"]
+
+        work(self.app, once=True)
+
+        status = self.client.get(f"/imports/{job_id}").get_json()
+        self.assertEqual(status["status"], "done", status["error"])
+        self.assertEqual(status["rows_processed"], len(stats))
+        self.assertEqual(status["rejected_rows"], 7)
+        self.assertEqual(db.session.query(AdGroupStats).count(), len(stats) - 6)
+        self.assertEqual(db.session.query(AdGroup).count(), 4)
+
+        response = self.client.get(f"/imports/{job_id}/rejects")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/csv")
+        rejects = pd.read_csv(io.BytesIO(response.data))
+        reasons = dict(zip(zip(rejects["sheet"], rejects["row"]), rejects["reason"]))
+        self.assertEqual(reasons[("ad_group", 6)], "unknown campaign_id")
+        self.assertEqual(reasons[("ad_group_stats", 2)], "cost is negative")
+        self.assertEqual(reasons[("ad_group_stats", 3)], "clicks is not a whole number")
+        self.assertEqual(reasons[("ad_group_stats", 4)], "unknown ad_group_id")
+        self.assertEqual(reasons[("ad_group_stats", 5)], "date is not a date")
+        self.assertEqual(
+            reasons[("ad_group_stats", 6)], "device is missing; impressions is missing"
+        )
+        self.assertEqual(reasons[("ad_group_stats", 7)], "unknown ad_group_id")
+
+    def test_rejects_other_files(self):
+        path = os.path.join(self.tmp.name, "notes.txt")
+        with open(path, "w") as f:
+            f.write("hello")
+        self.assertEqual(self.upload(path, "notes.txt").status_code, 400)
+        self.assertEqual(self.client.post("/imports").status_code, 400)
+        self.assertEqual(self.client.get("/imports/999").status_code, 404)
+        self.assertEqual(self.client.get("/imports/999/rejects").status_code, 404)
+
+
+class BulkLoadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.dataset = SyntheticDataset(
+            campaigns=2, ad_groups_per_campaign=2, days=10, devices=2, end_date=date(2024, 1, 31)
+        )
+        self.path = os.path.join(self.tmp.name, "bulk.xlsx")
+        self.stats = write_workbook(self.path, self.dataset)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.tmp.cleanup()
+
+    def stats_indexes(self):
+        return {
+            index["name"]
+            for index in inspect(db.engine).get_indexes(AdGroupStats.__tablename__)
+        }
+
+    def test_bulk_import(self):
+        indexes = self.stats_indexes()
+        self.assertIn("ix_ad_group_stats_date_ad_group_id", indexes)
+
+        inserted, rejected = import_workbook(self.path, chunk_rows=25, bulk=True)
+
+        self.assertEqual((inserted, rejected), (len(self.stats), 0))
+        self.assertEqual(db.session.query(AdGroupStats).count(), len(self.stats))
+        total_cost = db.session.execute(select(AdGroupStats.total_cost())).scalar()
+        self.assertAlmostEqual(total_cost, self.stats["cost"].sum(), places=6)
+        self.assertEqual(self.stats_indexes(), indexes)
+        self.assertTrue(daily_rollup_fresh())
+        # The staging table is gone
+        tables = inspect(db.session.connection()).get_temp_table_names()
+        self.assertEqual([t for t in tables if "staging" in t], [])
+
+    def test_missing_ad_groups_roll_everything_back(self):
+        stats = self.stats.assign(ad_group_id=12345)
+        with self.assertRaises(ImportFailed):
+            bulk_load_stats(stats)
+        db.session.rollback()
+        self.assertEqual(db.session.query(AdGroupStats).count(), 0)
+
+    def test_interrupted_load_leaves_table_as_it_was(self):
+        import_workbook(self.path, bulk=True)
+        indexes = self.stats_indexes()
+
+        # Interrupted after the INSERT, with the indexes dropped
+        with mock.patch(
+            "app.importer.restore_stats_indexes", side_effect=KeyboardInterrupt
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                import_workbook(self.path, bulk=True)
+
+        self.assertEqual(db.session.query(AdGroupStats).count(), len(self.stats))
+        self.assertEqual(self.stats_indexes(), indexes)
+        tables = inspect(db.session.connection()).get_temp_table_names()
+        self.assertEqual([t for t in tables if "staging" in t], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
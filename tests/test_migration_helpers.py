@@ -0,0 +1,121 @@
+import io
+import os
+import unittest
+from unittest import mock
+
+import sqlalchemy as sa
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+
+from app.migration_helpers import (
+    add_column_with_backfill,
+    change_column_type,
+    create_index_concurrently,
+    dry_run,
+)
+
+
+class MigrationHelpersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = sa.create_engine("sqlite://")
+        self.connection = self.engine.connect()
+        self.connection.exec_driver_sql(
+            "CREATE TABLE stats (id INTEGER PRIMARY KEY, clicks INTEGER NOT NULL)"
+        )
+        self.connection.execute(
+            sa.text("INSERT INTO stats (id, clicks) VALUES (:id, :clicks)"),
+            [{"id": i, "clicks": i * 10} for i in range(1, 26)],
+        )
+
+    def tearDown(self):
+        self.connection.close()
+        self.engine.dispose()
+
+    def scalar(self, sql):
+        return self.connection.exec_driver_sql(sql).scalar()
+
+    def test_helpers_run_on_sqlite(self):
+        context = MigrationContext.configure(self.connection)
+        with Operations.context(context):
+            plan = create_index_concurrently("ix_stats_clicks", "stats", ["clicks"])
+            self.assertEqual(plan.rows, 25)
+            plan = add_column_with_backfill(
+                "stats",
+                sa.Column("cost", sa.Float()),
+                "clicks * 0.5",
+                nullable=False,
+                batch_size=4,
+                pause=0,
+            )
+            self.assertEqual((plan.rows, plan.batches), (25, 7))
+            change_column_type("stats", "clicks", sa.BigInteger())
+
+        self.assertIn(
+            "ix_stats_clicks",
+            {i["name"] for i in sa.inspect(self.connection).get_indexes("stats")},
+        )
+        self.assertEqual(self.scalar("SELECT sum(cost) FROM stats"), 1625)
+        columns = sa.inspect(self.connection).get_columns("stats")
+        columns = {c["name"]: c for c in columns}
+        self.assertFalse(columns["cost"]["nullable"])
+        self.assertIsInstance(columns["clicks"]["type"], sa.BigInteger)
+
+    def test_dry_run_prints_postgresql_sql_and_changes_nothing(self):
+        buffer = io.StringIO()
+        context = MigrationContext.configure(
+            dialect_name="postgresql", opts={"as_sql": True, "output_buffer": buffer}
+        )
+        with mock.patch.dict(os.environ, {"MIGRATION_DRY_RUN": "true"}):
+            with dry_run(self.connection), Operations.context(context):
+                create_index_concurrently("ix_stats_clicks", "stats", ["clicks"])
+                plan = add_column_with_backfill(
+                    "stats",
+                    sa.Column("cost", sa.Float()),
+                    "clicks * 0.5",
+                    batch_size=10,
+                )
+                self.assertEqual((plan.rows, plan.batches), (25, 3))
+
+        sql = buffer.getvalue()
+        self.assertIn("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_stats_clicks", sql)
+        self.assertIn("ALTER TABLE stats ADD COLUMN cost FLOAT", sql)
+        # Only the first batch of the backfill
+        self.assertIn("WHERE id >= 1 AND id < 11 AND cost IS NULL", sql)
+        self.assertNotIn("id >= 11", sql)
+
+        self.assertEqual(sa.inspect(self.connection).get_indexes("stats"), [])
+        columns = [c["name"] for c in sa.inspect(self.connection).get_columns("stats")]
+        self.assertEqual(columns, ["id", "clicks"])
+
+    def test_shadow_column_type_change_on_postgresql(self):
+        buffer = io.StringIO()
+        context = MigrationContext.configure(
+            dialect_name="postgresql", opts={"as_sql": True, "output_buffer": buffer}
+        )
+        self.connection.exec_driver_sql(
+            "CREATE INDEX ix_stats_clicks ON stats (clicks)"
+        )
+        with mock.patch.dict(os.environ, {"MIGRATION_DRY_RUN": "true"}):
+            with dry_run(self.connection), Operations.context(context):
+                change_column_type("stats", "clicks", sa.BigInteger())
+
+        sql = buffer.getvalue()
+        for statement in [
+            "ALTER TABLE stats ADD COLUMN clicks_new BIGINT",
+            "NEW.clicks_new := CAST(NEW.clicks AS BIGINT)",
+            "UPDATE stats SET clicks_new = CAST(clicks AS BIGINT)",
+            "CHECK (clicks_new IS NOT NULL) NOT VALID",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_stats_clicks_new "
+            "ON stats (clicks_new)",
+            "ALTER TABLE stats DROP COLUMN clicks",
+            "ALTER TABLE stats RENAME clicks_new TO clicks",
+            "ALTER INDEX ix_stats_clicks_new RENAME TO ix_stats_clicks",
+        ]:
+            self.assertIn(statement, sql)
+        # The swap waits for its lock only so long
+        swap = sql.index("DROP TRIGGER")
+        self.assertIn("SET lock_timeout = '5s'", sql[sql.rindex("CONCURRENTLY"):swap])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+import unittest
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+
+from app import create_app, db
+from app.models import AdGroupStats, StatsPrefixSum
+from app.prefix_sums import period_totals_from_prefix, prefix_sums_fresh, refresh_prefix_sums
+from app.services import period_totals_statement, round_metrics
+from app.synthetic import SyntheticDataset, write_dataset
+
+
+class PrefixSumTestCase(unittest.TestCase):
+    """Range totals from the prefix sums must match scanning the rows."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        write_dataset(
+            SyntheticDataset(
+                campaigns=3, ad_groups_per_campaign=2, days=40, devices=2, end_date=date(2024, 6, 30)
+            )
+        )
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_stats(self, day, clicks=10, conversions=1.0, ad_group_id=1):
+        db.session.execute(
+            insert(AdGroupStats),
+            [
+                {
+                    "date": day,
+                    "ad_group_id": ad_group_id,
+                    "device_id": 1,
+                    "impressions": 500,
+                    "clicks": clicks,
+                    "conversions": conversions,
+                    "cost_micros": 12_500_000,
+                }
+            ],
+        )
+        db.session.commit()
+
+    def prefix_rows(self):
+        return {
+            (p.campaign_id, p.date): (p.row_count, p.cost_micros)
+            for p in db.session.execute(select(StatsPrefixSum)).scalars()
+        }
+
+    def assertMatchesSql(self, start, end, campaign_id=None):
+        expected = db.session.execute(
+            period_totals_statement(
+                datetime.combine(start, datetime.min.time()),
+                datetime.combine(end, datetime.min.time()),
+                campaign_id,
+            )
+        ).first()
+        actual = period_totals_from_prefix(start, end, campaign_id)
+
+        expected, actual = round_metrics(expected), round_metrics(actual)
+        for key, value in expected.items():
+            if value is None:
+                self.assertIsNone(actual[key], msg=key)
+            else:
+                self.assertAlmostEqual(actual[key], value, delta=0.011, msg=key)
+
+    def test_ranges_match_sql(self):
+        refresh_prefix_sums()
+        ranges = [
+            (date(2024, 5, 22), date(2024, 6, 30)),
+            (date(2024, 6, 1), date(2024, 6, 1)),
+            (date(2024, 6, 10), date(2024, 6, 20)),
+            (date(2024, 5, 1), date(2024, 5, 25)),
+            (date(2024, 7, 1), date(2024, 7, 31)),
+        ]
+        for start, end in ranges:
+            for campaign_id in (None, 1, 3, 99):
+                with self.subTest(start=start, end=end, campaign_id=campaign_id):
+                    self.assertMatchesSql(start, end, campaign_id)
+
+    def test_ratio_metrics_skip_zero_denominators(self):
+        self.add_stats(date(2024, 6, 15), clicks=0, conversions=0.0)
+        refresh_prefix_sums()
+        self.assertMatchesSql(date(2024, 6, 15), date(2024, 6, 15))
+        self.assertMatchesSql(date(2024, 6, 10), date(2024, 6, 20), campaign_id=1)
+
+    def test_incremental_refresh_matches_full_rebuild(self):
+        refresh_prefix_sums()
+        # A late row for an old day and a row for a new day
+        self.add_stats(date(2024, 6, 3))
+        self.add_stats(date(2024, 7, 2), ad_group_id=5)
+        self.assertFalse(prefix_sums_fresh())
+
+        refresh_prefix_sums()
+        self.assertTrue(prefix_sums_fresh())
+        incremental = self.prefix_rows()
+
+        refresh_prefix_sums(full=True)
+        full = self.prefix_rows()
+        self.assertEqual(incremental, full)
+        self.assertMatchesSql(date(2024, 6, 1), date(2024, 7, 2), campaign_id=3)
+        self.assertEqual(refresh_prefix_sums(), 0)
+
+    def test_cents_are_exact_over_large_totals(self):
+        # A huge old day, then small amounts with cents that a running total
+        # kept as a float would lose when the two are subtracted
+        db.session.execute(
+            insert(AdGroupStats),
+            [
+                {
+                    "date": date(2024, 6, 1),
+                    "ad_group_id": 1,
+                    "device_id": 1,
+                    "impressions": 1,
+                    "clicks": 1,
+                    "conversions": 1.0,
+                    "cost_micros": 9_000_000_000_000_010_000,
+                },
+                *(
+                    {
+                        "date": date(2024, 7, 1 + i % 3),
+                        "ad_group_id": 1,
+                        "device_id": 1,
+                        "impressions": 100,
+                        "clicks": 3,
+                        "conversions": 1.0,
+                        "cost_micros": 1_230_000 + 10_000 * i,
+                    }
+                    for i in range(30)
+                ),
+            ],
+        )
+        db.session.commit()
+        refresh_prefix_sums()
+
+        for start, end in (
+            (date(2024, 7, 1), date(2024, 7, 2)),
+            (date(2024, 7, 3), date(2024, 7, 3)),
+        ):
+            expected = db.session.execute(
+                period_totals_statement(
+                    datetime.combine(start, datetime.min.time()),
+                    datetime.combine(end, datetime.min.time()),
+                    1,
+                )
+            ).first()
+            actual = period_totals_from_prefix(start, end, 1)
+            self.assertEqual(actual.total_cost, expected.total_cost)
+            self.assertMatchesSql(start, end, 1)
+
+    def test_endpoint_same_with_and_without_prefix_sums(self):
+        url = (
+            "/compare-performance?start_date=2024-06-16&end_date=2024-06-30"
+            "&compare_mode=preceding"
+        )
+        scanned = self.client.get(url).get_json()
+        scanned_campaign = self.client.get(url + "&campaign_id=2").get_json()
+
+        refresh_prefix_sums()
+        self.assertEqual(self.client.get(url).get_json(), scanned)
+        self.assertEqual(self.client.get(url + "&campaign_id=2").get_json(), scanned_campaign)
+        self.assertNotEqual(scanned, scanned_campaign)
+
+        # Stale prefix sums are not used
+        self.add_stats(date(2024, 6, 20))
+        self.assertNotEqual(self.client.get(url).get_json(), scanned)
+
+    def test_invalid_campaign_id(self):
+        response = self.client.get(
+            "/compare-performance?start_date=2024-06-16&end_date=2024-06-30"
+            "&compare_mode=preceding&campaign_id=abc"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_refresh_command(self):
+        result = self.app.test_cli_runner().invoke(args=["refresh-prefix-sums", "--full"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        # 40 days for each of 3 campaigns and for all of them together
+        self.assertEqual(db.session.query(StatsPrefixSum).count(), 40 * 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+from datetime import datetime
+
+from app import create_app, db
+from app.models import Campaign, AdGroup, AdGroupStats
+
+
+class RankingsEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            self.insert_sample_data()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def insert_sample_data(self):
+        # ad_group_id: (campaign_id, daily cost, daily clicks, daily conversions)
+        ad_groups = {
+            1: (1, 10.0, 10, 2.0),
+            2: (1, 30.0, 10, 0.0),
+            3: (2, 20.0, 40, 4.0),
+            4: (2, 20.0, 5, 1.0),
+        }
+        for campaign_id in (1, 2):
+            db.session.add(
+                Campaign(
+                    campaign_id=campaign_id,
+                    campaign_name=f"Campaign {campaign_id}",
+                    campaign_type="SEARCH",
+                )
+            )
+        for ad_group_id, (campaign_id, cost, clicks, conversions) in ad_groups.items():
+            db.session.add(
+                AdGroup(
+                    ad_group_id=ad_group_id,
+                    ad_group_name=f"Ad Group {ad_group_id}",
+                    campaign_id=campaign_id,
+                )
+            )
+            for day in (1, 2, 3):
+                db.session.add(
+                    AdGroupStats(
+                        date=datetime(2024, 9, day).date(),
+                        ad_group_id=ad_group_id,
+                        device="mobile",
+                        impressions=100,
+                        clicks=clicks,
+                        conversions=conversions,
+                        cost=cost,
+                    )
+                )
+        db.session.commit()
+
+    def rank(self, query_string):
+        response = self.client.get(f"/rankings?{query_string}")
+        return response.status_code, response.get_json()
+
+    def test_top_cost(self):
+        status, data = self.rank("metric=cost&limit=2")
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            data["results"][0],
+            {
+                "rank": 1,
+                "ad_group_id": 2,
+                "ad_group_name": "Ad Group 2",
+                "campaign_id": 1,
+                "value": 90.0,
+                "total_cost": 90.0,
+                "total_clicks": 30,
+                "total_conversions": 0.0,
+                "total_impressions": 300,
+            },
+        )
+        # Ad groups 3 and 4 tie for rank 2, the lower id comes first
+        self.assertEqual([r["rank"] for r in data["results"]], [1, 2])
+        self.assertEqual(data["results"][1]["ad_group_id"], 3)
+
+    def test_worst_cpa_ranks_undefined_last(self):
+        status, data = self.rank("metric=cpa&order=bottom")
+        self.assertEqual(
+            [(r["ad_group_id"], r["value"]) for r in data["results"]],
+            [(1, 5.0), (3, 5.0), (4, 20.0), (2, None)],
+        )
+
+        status, data = self.rank("metric=cpa&order=top&limit=1")
+        self.assertEqual([r["ad_group_id"] for r in data["results"]], [4])
+
+    def test_ctr_per_campaign_and_date_range(self):
+        status, data = self.rank(
+            "metric=ctr&per_campaign=true&limit=1&start_date=2024-09-02&end_date=2024-09-02"
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [(r["campaign_id"], r["ad_group_id"], r["value"]) for r in data["results"]],
+            [(1, 1, 10.0), (2, 3, 40.0)],
+        )
+        self.assertEqual(data["start_date"], "2024-09-02")
+
+    def test_campaign_level_and_filter(self):
+        status, data = self.rank("metric=conversions&level=campaign")
+        self.assertEqual(
+            [(r["campaign_id"], r["value"]) for r in data["results"]],
+            [(2, 15.0), (1, 6.0)],
+        )
+
+        status, data = self.rank("metric=cpc&campaign_id=2")
+        self.assertEqual([r["ad_group_id"] for r in data["results"]], [4, 3])
+
+    def test_rankings_invalid_params(self):
+        for query_string in (
+            "",
+            "metric=roas",
+            "metric=cost&order=middle",
+            "metric=cost&limit=500",
+            "metric=cost&level=campaign&per_campaign=true",
+            "metric=cost&start_date=2024-09-05&end_date=2024-09-01",
+            "metric=cost&campaign_id=x",
+        ):
+            status, data = self.rank(query_string)
+            self.assertEqual(status, 400, query_string)
+            self.assertIn("error", data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from datetime import date
+
+from app import create_app, db
+from app.models import Campaign, AdGroup
+from app.models.ad_group_stats import MICROS
+from app.synthetic import SyntheticDataset, write_dataset
+
+
+class ReadOnlyRowsTestCase(unittest.TestCase):
+    """The column-row read path must return what the ORM objects serialize to."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        write_dataset(
+            SyntheticDataset(
+                campaigns=3, ad_groups_per_campaign=2, days=45, end_date=date(2024, 2, 10)
+            )
+        )
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_test_endpoint_matches_serialize(self):
+        expected = [ad_group.serialize() for ad_group in AdGroup.query.all()]
+        self.assertEqual(self.client.get("/test").get_json(), expected)
+
+    def orm_summary(self, campaign):
+        stats = [stat for ag in campaign.ad_groups for stat in ag.stats]
+        cost = sum(stat.cost_micros for stat in stats) / MICROS
+        conversions = sum(stat.conversions for stat in stats)
+        months = {stat.date.strftime("%Y-%m") for stat in stats}
+        return {
+            **campaign.serialize(),
+            "ad_group_count": len(campaign.ad_groups),
+            "ad_group_names": [ag.ad_group_name for ag in campaign.ad_groups],
+            "average_monthly_cost": round(cost / len(months), 2) if months else 0,
+            "average_cost_per_conversion": (
+                round(cost / conversions, 2) if conversions > 0 else 0
+            ),
+        }
+
+    def test_campaigns_match_orm_summary(self):
+        expected = [self.orm_summary(campaign) for campaign in Campaign.query.all()]
+        db.session.expunge_all()
+
+        actual = self.client.get("/campaigns").get_json()
+        self.assertEqual(actual, expected)
+        self.assertGreater(actual[0]["average_monthly_cost"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from sqlalchemy import insert, select
+
+from app import create_app, db
+from app import services
+from app.models import Campaign, AdGroup
+from app.services import Reply
+from app.steps import Query
+
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+    """Primary and replica are two SQLite files holding different names."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.primary_url = f"sqlite:///{os.path.join(self.tmp.name, 'primary.db')}"
+        self.replica_urls = [
+            f"sqlite:///{os.path.join(self.tmp.name, f'replica{i}.db')}" for i in (0, 1)
+        ]
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            for engine in self.engines().values():
+                engine.dispose()
+        self.tmp.cleanup()
+
+    def engines(self):
+        return {None: db.engine, **self.app.extensions["replica_router"].engines}
+
+    def make_app(self, replica_urls, read_after_write=0):
+        self.app = create_app(
+            "testing",
+            {
+                "SQLALCHEMY_DATABASE_URI": self.primary_url,
+                "REPLICA_DATABASE_URLS": replica_urls,
+                "REPLICA_READ_AFTER_WRITE_SECONDS": read_after_write,
+            },
+        )
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            for key, engine in self.engines().items():
+                if key is None or os.path.isdir(os.path.dirname(engine.url.database)):
+                    db.metadata.create_all(engine)
+                    self.insert_campaign(engine, "Primary" if key is None else key)
+
+    def insert_campaign(self, engine, name):
+        with engine.begin() as connection:
+            connection.execute(
+                insert(Campaign),
+                {"campaign_id": 1, "campaign_name": name, "campaign_type": "SEARCH"},
+            )
+            connection.execute(
+                insert(AdGroup),
+                {"ad_group_id": 1, "ad_group_name": "Ad Group", "campaign_id": 1},
+            )
+
+    def campaign_name(self, key):
+        with self.app.app_context():
+            with self.engines()[key].connect() as connection:
+                return connection.execute(select(Campaign.campaign_name)).scalar()
+
+    def test_reads_round_robin_over_replicas(self):
+        self.make_app(self.replica_urls)
+
+        names = {self.client.get("/campaigns").get_json()[0]["campaign_name"] for _ in range(4)}
+        self.assertEqual(names, {"replica_0", "replica_1"})
+
+    def test_writes_go_to_primary(self):
+        self.make_app(self.replica_urls[:1])
+
+        response = self.client.put("/campaign", json={"campaign_id": 1, "new_name": "Renamed"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.campaign_name(None), "Renamed")
+        self.assertEqual(self.campaign_name("replica_0"), "replica_0")
+
+    def test_read_after_write_uses_primary(self):
+        self.make_app(self.replica_urls[:1], read_after_write=60)
+
+        self.client.put("/campaign", json={"campaign_id": 1, "new_name": "Renamed"})
+        data = self.client.get("/campaigns").get_json()
+        self.assertEqual(data[0]["campaign_name"], "Renamed")
+
+    def test_read_after_write_only_pins_the_writing_client(self):
+        self.make_app(self.replica_urls[:1], read_after_write=60)
+
+        self.client.put("/campaign", json={"campaign_id": 1, "new_name": "Renamed"})
+        other_client = self.app.test_client()
+        data = other_client.get("/campaigns").get_json()
+        self.assertEqual(data[0]["campaign_name"], "replica_0")
+
+    def test_read_after_write_is_not_coalesced(self):
+        self.make_app(self.replica_urls[:1], read_after_write=60)
+        flight = self.app.extensions["single_flight"]
+        started, release = threading.Event(), threading.Event()
+
+        def blocking_steps(params):
+            started.set()
+            release.wait(5)
+            name = yield Query(select(Campaign.campaign_name), "scalar")
+            return Reply({"campaign_name": name})
+
+        responses = []
+        with mock.patch.object(services, "rankings_steps", blocking_steps):
+            # Another client's identical read is in flight on the replica
+            other = threading.Thread(
+                target=lambda: responses.append(
+                    self.app.test_client().get("/rankings?metric=cost").get_json()
+                )
+            )
+            other.start()
+            started.wait(5)
+            self.client.put("/campaign", json={"campaign_id": 1, "new_name": "Renamed"})
+            # Without the fix this joins the other read and only returns once
+            # it is released, with the replica's name
+            threading.Timer(0.5, release.set).start()
+            data = self.client.get("/rankings?metric=cost").get_json()
+            other.join()
+
+        self.assertEqual(data["campaign_name"], "Renamed")
+        self.assertEqual(responses, [{"campaign_name": "replica_0"}])
+        self.assertEqual(flight.shared, 0)
+
+    def test_failed_replica_read_is_retried_on_primary(self):
+        self.make_app(self.replica_urls[:1])
+        router = self.app.extensions["replica_router"]
+        with self.app.app_context():
+            db.metadata.drop_all(router.engines["replica_0"])
+
+        response = self.client.get("/campaigns")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()[0]["campaign_name"], "Primary")
+        self.assertFalse(router.status()["replica_0"]["healthy"])
+
+    def test_requests_do_not_ping_replicas(self):
+        self.make_app(self.replica_urls[:1])
+        router = self.app.extensions["replica_router"]
+        router.mark_unhealthy("replica_0")
+        with self.app.app_context():
+            with mock.patch.object(router, "check") as check:
+                data = self.client.get("/campaigns").get_json()
+        self.assertEqual(data[0]["campaign_name"], "Primary")
+        check.assert_not_called()
+
+        # Once the interval has passed the replica is simply tried again
+        router.health_check_interval = 0
+        data = self.client.get("/campaigns").get_json()
+        self.assertEqual(data[0]["campaign_name"], "replica_0")
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        broken = f"sqlite:///{os.path.join(self.tmp.name, 'missing', 'replica.db')}"
+        self.make_app([broken])
+
+        response = self.client.get("/campaigns")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()[0]["campaign_name"], "Primary")
+        self.assertFalse(self.app.extensions["replica_router"].status()["replica_0"]["healthy"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+
+from sqlalchemy import text
+
+from app import create_app, db
+from app.models import Campaign, AdGroup
+
+
+class SearchEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            self.insert_sample_data()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def insert_sample_data(self):
+        names = ["Summer Sale", "Summer", "Winter Summer Promo", "Brand_Search", "Brandy"]
+        for campaign_id, name in enumerate(names, start=1):
+            db.session.add(
+                Campaign(campaign_id=campaign_id, campaign_name=name, campaign_type="SEARCH")
+            )
+            db.session.add(
+                AdGroup(
+                    ad_group_id=campaign_id,
+                    ad_group_name=f"{name} Ad Group",
+                    campaign_id=campaign_id,
+                )
+            )
+        db.session.commit()
+
+    def search(self, query_string):
+        response = self.client.get(f"/search?{query_string}")
+        return response.status_code, response.get_json()
+
+    def test_prefix_search_ranks_shortest_first(self):
+        status, data = self.search("q=summ")
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [c["campaign_name"] for c in data["campaigns"]], ["Summer", "Summer Sale"]
+        )
+        self.assertEqual(
+            data["campaigns"][0],
+            {"campaign_id": 2, "campaign_name": "Summer", "campaign_type": "SEARCH"},
+        )
+        self.assertEqual(
+            [a["ad_group_name"] for a in data["ad_groups"]],
+            ["Summer Ad Group", "Summer Sale Ad Group"],
+        )
+
+    def test_prefix_search_escapes_wildcards(self):
+        status, data = self.search("q=Brand_&type=campaign")
+        self.assertEqual(status, 200)
+        self.assertEqual([c["campaign_id"] for c in data["campaigns"]], [4])
+        self.assertNotIn("ad_groups", data)
+
+    def test_fuzzy_search_and_limit(self):
+        status, data = self.search("q=summer&mode=fuzzy&type=campaign")
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [c["campaign_name"] for c in data["campaigns"]],
+            ["Summer", "Summer Sale", "Winter Summer Promo"],
+        )
+
+        status, data = self.search("q=summer&mode=fuzzy&type=campaign&limit=1")
+        self.assertEqual([c["campaign_name"] for c in data["campaigns"]], ["Summer"])
+
+    def test_prefix_search_uses_index(self):
+        from app.services import parse_search_params, search_statement
+
+        params = parse_search_params({"q": "summ"})
+        with self.app.app_context():
+            statement = search_statement("campaign", params, "sqlite")
+            compiled = statement.compile(
+                db.engine, compile_kwargs={"literal_binds": True}
+            )
+            plan = db.session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+        self.assertIn("ix_campaign_campaign_name_nocase", " ".join(row[-1] for row in plan))
+
+    def test_search_invalid_params(self):
+        for query_string in (
+            "",
+            "q=a&mode=regex",
+            "q=a&type=keyword",
+            "q=a&limit=0",
+            "q=a&limit=1000",
+        ):
+            status, data = self.search(query_string)
+            self.assertEqual(status, 400)
+            self.assertIn("error", data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date
+from unittest import mock
+
+from app import create_app, db
+from app import services
+from app.singleflight import SingleFlight
+from app.synthetic import SyntheticDataset, write_dataset
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition.")
+        time.sleep(0.005)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight(wait_timeout=5)
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow(self, value):
+        self.calls += 1
+        self.release.wait(5)
+        if isinstance(value, Exception):
+            raise value
+        return {"value": value}
+
+    def run_concurrently(self, key, value, count):
+        results = [None] * count
+
+        def call(i):
+            try:
+                results[i] = self.flight.do(key, self.slow, value)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        wait_for(lambda: self.flight.waiting(key) == count - 1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_result(self):
+        results = self.run_concurrently("key", 42, 5)
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(self.flight.shared, 4)
+
+        # Nothing is cached once the call is done
+        self.assertEqual(self.flight.do("key", self.slow, 7), {"value": 7})
+        self.assertEqual(self.calls, 2)
+
+    def test_error_is_raised_in_every_caller(self):
+        error = ValueError("boom")
+        results = self.run_concurrently("key", error, 3)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [error] * 3)
+        self.assertEqual(self.flight.waiting("key"), 0)
+
+    def test_different_keys_are_not_shared(self):
+        self.release.set()
+        self.flight.do(("a", 1), self.slow, 1)
+        self.flight.do(("a", 2), self.slow, 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_waiter_computes_alone_after_timeout(self):
+        self.flight.wait_timeout = 0.05
+        leader = threading.Thread(target=self.flight.do, args=("key", self.slow, 1))
+        leader.start()
+        wait_for(lambda: self.calls == 1)
+        threading.Timer(0.3, self.release.set).start()
+        # Gives up on the leader, which is still blocked, and runs slow() itself
+        self.assertEqual(self.flight.do("key", self.slow, 2), {"value": 2})
+        self.assertEqual(self.calls, 2)
+        leader.join()
+
+
+class SingleFlightEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.tmp.name, 'singleflight.db')}"
+        self.app = create_app("testing", {"SQLALCHEMY_DATABASE_URI": url})
+        with self.app.app_context():
+            db.create_all()
+            write_dataset(
+                SyntheticDataset(
+                    campaigns=2, ad_groups_per_campaign=2, days=20, end_date=date(2024, 5, 1)
+                )
+            )
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_identical_time_series_requests_aggregate_once(self):
+        flight = self.app.extensions["single_flight"]
+        release = threading.Event()
+        steps = services.time_series_steps
+        computed = []
+
+        def blocking_steps(params, *args):
+            computed.append(params)
+            release.wait(5)
+            return (yield from steps(params, *args))
+
+        # Same filter written two ways, so both normalize to the same params
+        urls = [
+            "/performance-time-series?aggregate_by=day&campaigns=2,1",
+            "/performance-time-series?aggregate_by=day&campaigns=1,2,2",
+        ] * 2
+        responses = [None] * len(urls)
+
+        def get(i):
+            responses[i] = self.app.test_client().get(urls[i])
+
+        with mock.patch.object(services, "time_series_steps", blocking_steps):
+            threads = [threading.Thread(target=get, args=(i,)) for i in range(len(urls))]
+            for thread in threads:
+                thread.start()
+            wait_for(lambda: len(computed) == 1)
+            key = ("time_series", computed[0])
+            wait_for(lambda: flight.waiting(key) == len(urls) - 1)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(computed), 1)
+        self.assertEqual(computed[0].campaigns, (1, 2))
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertTrue(all(r.get_json() == responses[0].get_json() for r in responses))
+        self.assertGreater(len(responses[0].get_json()), 0)
+
+    def test_disabled(self):
+        url = self.app.config["SQLALCHEMY_DATABASE_URI"]
+        app = create_app("testing", {"SQLALCHEMY_DATABASE_URI": url, "SINGLE_FLIGHT": False})
+        self.assertNotIn("single_flight", app.extensions)
+        response = app.test_client().get("/rankings?metric=cost")
+        self.assertEqual(response.status_code, 200)
+        with app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import date
+
+import pandas as pd
+
+from app import create_app, db
+from app.models import Campaign, AdGroup, AdGroupStats
+from app.synthetic import SyntheticDataset
+
+
+class SyntheticDatasetTestCase(unittest.TestCase):
+    def test_same_seed_same_data_regardless_of_chunking(self):
+        kwargs = dict(
+            campaigns=2, ad_groups_per_campaign=3, days=10, devices=2, end_date=date(2024, 1, 31)
+        )
+        one_chunk = pd.concat(SyntheticDataset(**kwargs).stats_chunks(chunk_rows=10_000))
+        small_chunks = pd.concat(SyntheticDataset(**kwargs).stats_chunks(chunk_rows=1))
+
+        self.assertEqual(len(one_chunk), 2 * 3 * 10 * 2)
+        pd.testing.assert_frame_equal(
+            one_chunk.reset_index(drop=True), small_chunks.reset_index(drop=True)
+        )
+        self.assertTrue((one_chunk["clicks"] <= one_chunk["impressions"]).all())
+        self.assertTrue((one_chunk["conversions"] <= one_chunk["clicks"]).all())
+
+
+class SeedSyntheticCommandTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app("testing")
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_seed_synthetic(self):
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(
+            args=[
+                "seed-synthetic",
+                "--campaigns", "2",
+                "--ad-groups-per-campaign", "3",
+                "--days", "5",
+                "--devices", "2",
+                "--end-date", "2024-01-31",
+            ]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+
+        with self.app.app_context():
+            self.assertEqual(db.session.query(Campaign).count(), 2)
+            self.assertEqual(db.session.query(AdGroup).count(), 6)
+            self.assertEqual(db.session.query(AdGroupStats).count(), 60)
+            first_day = db.session.query(db.func.min(AdGroupStats.date)).scalar()
+            self.assertEqual(first_day, date(2024, 1, 27))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+from datetime import date
+
+from unittest import mock
+
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.aggregates import refresh_daily_rollup
+from app.models import AdGroupStats
+from app.services import count_periods, time_series_bounds
+from app.synthetic import SyntheticDataset, write_dataset
+
+
+class TimeSeriesPlanningTestCase(unittest.TestCase):
+    """max_points picks the bucket, the scan budget refuses big scans."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        # 2023-06-01 to 2024-07-03: 399 days, 58 weeks, 14 months, 6 quarters
+        write_dataset(
+            SyntheticDataset(
+                campaigns=2, ad_groups_per_campaign=1, days=399, devices=1, end_date=date(2024, 7, 3)
+            )
+        )
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get_series(self, query):
+        response = self.client.get(f"/performance-time-series?{query}")
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return response.headers["X-Aggregate-By"], response.get_json()
+
+    def test_count_periods(self):
+        start, end = date(2023, 6, 1), date(2024, 7, 3)
+        self.assertEqual(count_periods(start, end, "day"), 399)
+        self.assertEqual(count_periods(start, end, "week"), 58)
+        self.assertEqual(count_periods(start, end, "month"), 14)
+        self.assertEqual(count_periods(start, end, "quarter"), 6)
+        self.assertEqual(count_periods(date(2024, 7, 7), date(2024, 7, 8), "week"), 2)
+
+    def test_max_points_coarsens_to_finest_bucket_that_fits(self):
+        aggregate_by, days = self.get_series("aggregate_by=day")
+        self.assertEqual((aggregate_by, len(days)), ("day", 399))
+
+        self.assertEqual(self.get_series("aggregate_by=day&max_points=400")[0], "day")
+        aggregate_by, weeks = self.get_series("aggregate_by=day&max_points=60")
+        self.assertEqual((aggregate_by, len(weeks)), ("week", 58))
+        aggregate_by, months = self.get_series("aggregate_by=day&max_points=20")
+        self.assertEqual((aggregate_by, len(months)), ("month", 14))
+        self.assertEqual(months[0]["period"], "2023-06")
+        # Never finer than asked for
+        self.assertEqual(self.get_series("aggregate_by=month&max_points=400")[0], "month")
+        # Quarter is the coarsest, even when it still gives too many
+        aggregate_by, quarters = self.get_series("aggregate_by=day&max_points=3")
+        self.assertEqual(aggregate_by, "quarter")
+        self.assertEqual(
+            [q["period"] for q in quarters],
+            ["2023-Q2", "2023-Q3", "2023-Q4", "2024-Q1", "2024-Q2", "2024-Q3"],
+        )
+        self.assertEqual(
+            [q["total_clicks"] for q in quarters[:2]],
+            [
+                sum(d["total_clicks"] for d in days if d["period"] < "2023-07-01"),
+                sum(
+                    d["total_clicks"]
+                    for d in days
+                    if "2023-07-01" <= d["period"] < "2023-10-01"
+                ),
+            ],
+        )
+
+        # Only the requested range counts
+        aggregate_by, _ = self.get_series(
+            "aggregate_by=day&max_points=31&start_date=2024-01-01&end_date=2024-01-31"
+        )
+        self.assertEqual(aggregate_by, "day")
+
+    def test_invalid_max_points(self):
+        for value in ("0", "-1", "abc"):
+            response = self.client.get(
+                f"/performance-time-series?aggregate_by=day&max_points={value}"
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(
+                response.get_json()["error"], "max_points must be a positive integer."
+            )
+
+    def test_scan_budget(self):
+        # 2 rows per day
+        self.app.config["TIME_SERIES_SCAN_BUDGET_ROWS"] = 100
+        response = self.client.get("/performance-time-series?aggregate_by=month")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("would scan about 798 rows", response.get_json()["error"])
+
+        self.get_series("aggregate_by=day&start_date=2024-06-04&end_date=2024-07-03")
+        # One campaign of two: half the rows
+        self.get_series("aggregate_by=week&campaigns=1&start_date=2024-05-01")
+        response = self.client.get(
+            "/performance-time-series?aggregate_by=week&start_date=2024-05-01"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_bounds_from_rollup_are_cached_until_refresh(self):
+        # An id gap, as left by deleted rows or skipped sequence values, makes
+        # the estimate from ids far too high
+        db.session.execute(
+            insert(AdGroupStats),
+            {
+                "id": 1_000_000,
+                "date": date(2024, 7, 3),
+                "ad_group_id": 1,
+                "device_id": 1,
+                "impressions": 1,
+                "clicks": 1,
+                "conversions": 0.0,
+                "cost_micros": 1,
+            },
+        )
+        db.session.commit()
+        self.assertGreater(time_series_bounds().rows_per_day, 2000)
+
+        refresh_daily_rollup()
+        # Two ad groups per day in the rollup
+        self.assertEqual(time_series_bounds().rows_per_day, 2)
+        with mock.patch("app.services.rollup_bounds_statement") as statement:
+            self.assertEqual(time_series_bounds().rows_per_day, 2)
+            statement.assert_not_called()
+
+        self.app.config["TIME_SERIES_SCAN_BUDGET_ROWS"] = 100
+        self.get_series("aggregate_by=day&start_date=2024-06-04&end_date=2024-07-03")
+
+        db.session.execute(
+            insert(AdGroupStats),
+            {
+                "date": date(2024, 7, 4),
+                "ad_group_id": 1,
+                "device_id": 1,
+                "impressions": 1,
+                "clicks": 1,
+                "conversions": 0.0,
+                "cost_micros": 1,
+            },
+        )
+        db.session.commit()
+        refresh_daily_rollup()
+        self.assertEqual(time_series_bounds().last_date, date(2024, 7, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
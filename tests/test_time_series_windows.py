@@ -0,0 +1,89 @@
+import unittest
+from datetime import date
+
+from app import create_app, db
+from app.models import Campaign, AdGroup, AdGroupStats
+
+
+class TimeSeriesWindowTestCase(unittest.TestCase):
+    """rolling and lag are computed over whole periods, also before start_date."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Campaign(campaign_id=1, campaign_name="C", campaign_type="SEARCH"))
+        db.session.add(AdGroup(ad_group_id=1, ad_group_name="A", campaign_id=1))
+        # 10 clicks on 2024-03-01, 20 on 03-02, ... 200 on 03-20, none on 03-15
+        for day in range(1, 21):
+            if day != 15:
+                db.session.add(
+                    AdGroupStats(
+                        date=date(2024, 3, day),
+                        ad_group_id=1,
+                        device="mobile",
+                        impressions=1000,
+                        clicks=10 * day,
+                        conversions=1.0,
+                        cost=float(day),
+                    )
+                )
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get_series(self, query):
+        response = self.client.get(f"/performance-time-series?{query}")
+        self.assertEqual(response.status_code, 200, response.get_json())
+        return {row["period"]: row for row in response.get_json()}
+
+    def test_rolling_average_and_change(self):
+        series = self.get_series(
+            "aggregate_by=day&start_date=2024-03-10&rolling=3&lag=1,7"
+        )
+        self.assertEqual(len(series), 10)
+        # Looks back before start_date: (80 + 90 + 100) / 3
+        self.assertEqual(series["2024-03-10"]["total_clicks_rolling_3"], 90.0)
+        self.assertEqual(series["2024-03-10"]["total_clicks_change_1"], 11.11)
+        self.assertEqual(series["2024-03-10"]["total_clicks_change_7"], 233.33)
+        # A day without rows counts as 0 in the window, and has no change
+        self.assertEqual(series["2024-03-16"]["total_clicks_rolling_3"], 100.0)
+        self.assertIsNone(series["2024-03-16"]["total_clicks_change_1"])
+        self.assertEqual(series["2024-03-17"]["total_cost_rolling_3"], 11.0)
+        # Without windows nothing changes
+        plain = self.get_series("aggregate_by=day&start_date=2024-03-10")
+        for period, row in plain.items():
+            self.assertEqual(
+                {k: v for k, v in series[period].items() if k in row}, row
+            )
+
+    def test_partial_first_period(self):
+        # The first week (Monday 03-04 to 03-10) only has 03-09 and 03-10 in range
+        series = self.get_series(
+            "aggregate_by=week&start_date=2024-03-09&rolling=2&lag=1"
+        )
+        first = series["2024-09"]
+        self.assertEqual(first["total_clicks"], 90 + 100)
+        # The windows use the whole week: 40 + ... + 100 = 490, and the week
+        # before it (03-01 to 03-03, from Friday): 60
+        self.assertEqual(first["total_clicks_rolling_2"], (490 + 60) / 2)
+        self.assertEqual(first["total_clicks_change_1"], round((490 - 60) / 60 * 100, 2))
+
+    def test_invalid_windows(self):
+        for query in ("rolling=0", "rolling=abc", "lag=7,x", "lag=1000"):
+            response = self.client.get(
+                f"/performance-time-series?aggregate_by=day&{query}"
+            )
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(
+                "comma-separated integers from 1 to 366", response.get_json()["error"]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()